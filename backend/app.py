@@ -3,380 +3,2854 @@ Brandsetu Digital Chatbot Backend - Fixed Version
 Improved FAQ matching and response generation
 """
 
-from flask import Flask, request, jsonify # type: ignore
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify # type: ignore
+import click # type: ignore
 from flask_cors import CORS # type: ignore
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import sqlite3
+import atexit
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import itertools
 import json
+import os
+import pickle
 import re
-from typing import Dict, List, Optional, Tuple
+import queue
+import secrets
+import sys
+import threading
+import time
+import types
+import weakref
+import zlib
+import heapq
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import cached_property, partial, wraps
+import math
+from collections import Counter, OrderedDict, defaultdict, deque
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import logging
 from difflib import SequenceMatcher
 
-app = Flask(__name__)
-CORS(app)
+IMPORT_STARTED = time.perf_counter()
+
+_vector_modules = None
+
+
+def vector_modules():
+    """``(numpy, scipy.sparse)``, imported on first use; ``(None, None)`` without them
+
+    Only the vector matchers need them, and importing them costs as much as
+    the rest of this module, so a worker using the additive matcher never does.
+    """
+    global _vector_modules
+    if _vector_modules is None:
+        try:
+            import numpy as np # type: ignore
+            from scipy import sparse # type: ignore
+            _vector_modules = (np, sparse)
+        except ImportError:  # pure-Python CSR fallback in VectorMatcher
+            _vector_modules = (None, None)
+    return _vector_modules
+
+
+_source_version = None
+
+
+def source_version() -> str:
+    """Hash of this module's source, so snapshots never outlive the code that built them"""
+    global _source_version
+    if _source_version is None:
+        with open(os.path.abspath(__file__), 'rb') as source_file:
+            _source_version = hashlib.sha256(source_file.read()).hexdigest()[:12]
+    return _source_version
+
+
+def __getattr__(name: str):
+    # ``from app import np, sparse`` keeps working without an eager import
+    if name in ('np', 'sparse'):
+        return vector_modules()[name == 'sparse']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Routes, request hooks and CLI commands; create_app() builds the Flask app around them
+api = Blueprint('api', __name__, cli_group=None)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SQLite connection pool and pragmas
+DB_POOL_SIZE = int(os.environ.get('CHATBOT_DB_POOL_SIZE', '8'))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('CHATBOT_DB_BUSY_TIMEOUT_MS', '5000'))
+DB_SYNCHRONOUS = os.environ.get('CHATBOT_DB_SYNCHRONOUS', 'NORMAL')
+DB_CACHE_KB = int(os.environ.get('CHATBOT_DB_CACHE_KB', '8192'))
+
+# Most items /api/chat/batch accepts in one request
+CHAT_BATCH_MAX = int(os.environ.get('CHATBOT_CHAT_BATCH_MAX', '500'))
+# Largest page /api/conversation/<session_id>?limit= will serve
+CONVERSATION_PAGE_MAX = int(os.environ.get('CHATBOT_CONVERSATION_PAGE_MAX', '500'))
+
+# Write-behind batching: "sync" commits inside the request, "write_behind"
+# queues inserts for a background writer. CHATBOT_WRITE_FLUSH_MS bounds how
+# long an acknowledged write can sit in memory (the loss window on a crash);
+# together with CHATBOT_DB_SYNCHRONOUS it sets the durability trade-off.
+WRITE_MODE = os.environ.get('CHATBOT_WRITE_MODE', 'sync')
+WRITE_BATCH_SIZE = int(os.environ.get('CHATBOT_WRITE_BATCH_SIZE', '200'))
+WRITE_FLUSH_MS = float(os.environ.get('CHATBOT_WRITE_FLUSH_MS', '50'))
+WRITE_QUEUE_SIZE = int(os.environ.get('CHATBOT_WRITE_QUEUE_SIZE', '10000'))
+# When the queue is full: block the request, drop the write, or write inline
+WRITE_BACKPRESSURE = os.environ.get('CHATBOT_WRITE_BACKPRESSURE', 'block')
+
+FAQ_PATH = os.environ.get(
+    'CHATBOT_FAQ_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faqs.json'))
+FAQ_RELOAD_INTERVAL = float(os.environ.get('CHATBOT_FAQ_RELOAD_INTERVAL', '2'))
+# additive (hand-tuned keyword scoring), tfidf or bm25
+MATCHER = os.environ.get('CHATBOT_MATCHER', 'additive')
+# Points the additive matcher gives a keyword reached through a misspelled
+# word ("instgram" -> "instagram"); 0 disables the fuzzy layer
+FUZZY_WEIGHT = int(os.environ.get('CHATBOT_FUZZY_WEIGHT', '8'))
+# auto (SciPy when installed), scipy or python
+VECTOR_BACKEND = os.environ.get('CHATBOT_VECTOR_BACKEND', 'auto')
+# Compiled corpora are pickled here and loaded instead of rebuilt while the
+# corpus, matcher settings and this module are unchanged. Empty means the
+# service user's cache ($XDG_CACHE_HOME or ~/.cache)/brandsetu-chatbot/index;
+# "off" disables snapshots. Never point it at a directory others can write.
+INDEX_SNAPSHOT_DIR = os.environ.get('CHATBOT_INDEX_SNAPSHOT_DIR', '')
+# HMAC key snapshots are signed with; unset, a random key is kept in the
+# snapshot directory (readable by the service user only)
+INDEX_SNAPSHOT_KEY = os.environ.get('CHATBOT_INDEX_SNAPSHOT_KEY')
+# Load the corpus, migrate the database and run the FAQ questions once before
+# /api/health reports ready: off, sync (inside create_app) or background
+WARMUP = os.environ.get('CHATBOT_WARMUP', 'off')
+# Normalized-message cache for generate_response; size 0 disables it
+CACHE_SIZE = int(os.environ.get('CHATBOT_CACHE_SIZE', '1024'))
+CACHE_TTL = float(os.environ.get('CHATBOT_CACHE_TTL', '300'))
+
+# Session-sharded storage: with N > 1, sessions are spread over N SQLite
+# files (chatbot.shard0of4.db, ...) by a stable hash of the session id, so
+# writes to different shards never wait on each other's lock
+DB_SHARDS = int(os.environ.get('CHATBOT_DB_SHARDS', '1'))
+
+# Retention: sessions idle longer than this many days (and analytics events
+# older than it) move from chatbot.db to gzip NDJSON files in the archive dir
+RETENTION_DAYS = float(os.environ.get('CHATBOT_RETENTION_DAYS', '90'))
+ARCHIVE_DIR = os.environ.get('CHATBOT_ARCHIVE_DIR')
+
+# Bearer token guarding GET /api/export/* (the endpoint is off when unset);
+# the export-db CLI command needs no token
+EXPORT_TOKEN = os.environ.get('CHATBOT_EXPORT_TOKEN')
+
+# Multi-tenant serving: each subdirectory <tenant>/ holding a faqs.json is a
+# tenant with its own database beside it, picked per request by the
+# X-Tenant-ID header or a /t/<tenant>/ path prefix. Tenants load on first
+# use; idle ones are evicted once their footprint (compiled corpus, SQLite
+# page caches and response cache) exceeds the budget, or once more than
+# CHATBOT_TENANT_MAX_LOADED are loaded (each holds open database files).
+TENANTS_DIR = os.environ.get('CHATBOT_TENANTS_DIR')
+TENANT_MEMORY_MB = float(os.environ.get('CHATBOT_TENANT_MEMORY_MB', '256'))
+TENANT_MAX_LOADED = int(os.environ.get('CHATBOT_TENANT_MAX_LOADED', '64'))
+TENANT_DB_POOL_SIZE = int(os.environ.get('CHATBOT_TENANT_DB_POOL_SIZE', '2'))
+TENANT_DB_CACHE_KB = int(os.environ.get('CHATBOT_TENANT_DB_CACHE_KB', '1024'))
+TENANT_CACHE_SIZE = int(os.environ.get('CHATBOT_TENANT_CACHE_SIZE', '256'))
+
+# Default lookback of the /api/analytics/* reports
+REPORT_WINDOW_DAYS = float(os.environ.get('CHATBOT_REPORT_WINDOW_DAYS', '30'))
+
+# Per-stage latency metrics. With several gunicorn workers, point
+# CHATBOT_METRICS_DIR at a shared directory so /api/metrics merges them all.
+METRICS_DIR = os.environ.get('CHATBOT_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('CHATBOT_METRICS_FLUSH_INTERVAL', '1'))
+# Log a per-stage breakdown for requests slower than this (unset disables)
+SLOW_REQUEST_MS = float(os.environ['CHATBOT_SLOW_REQUEST_MS']) if os.environ.get('CHATBOT_SLOW_REQUEST_MS') else None
+
+
+class StageMetrics:
+    """In-process latency histograms, exported in Prometheus text format.
+    
+    ``stage()`` times a block into the ``chatbot_stage_duration_seconds``
+    histogram and into the current request's breakdown. When ``directory``
+    is set, each process writes its histograms to ``metrics-<pid>.json``
+    there at most every ``flush_interval`` seconds (a timer writes the last
+    observations of an idle process, and exit writes whatever is left) and
+    ``render()`` sums every file, which merges the workers of a gunicorn pool.
+    """
+    
+    BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+               0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    FAMILIES = {
+        'chatbot_stage_duration_seconds': ('stage', 'Time spent in each processing stage'),
+        'chatbot_request_duration_seconds': ('endpoint', 'Time spent serving each endpoint'),
+    }
+    
+    def __init__(self, directory: Optional[str] = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 slow_request_ms: Optional[float] = SLOW_REQUEST_MS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.slow_request_ms = slow_request_ms
+        # (family, label) -> [bucket counts..., sum, count]
+        self.histograms: Dict[Tuple[str, str], List[float]] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.last_flush = 0.0
+        self.dirty = False
+        self._timer = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush_pending)
+    
+    def observe(self, family: str, label: str, seconds: float):
+        with self.lock:
+            values = self.histograms.get((family, label))
+            if values is None:
+                values = self.histograms[(family, label)] = [0] * (len(self.BUCKETS) + 2)
+            position = bisect_left(self.BUCKETS, seconds)
+            if position < len(self.BUCKETS):
+                values[position] += 1
+            values[-2] += seconds
+            values[-1] += 1
+            self.dirty = True
+        if self.directory:
+            self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Flush now if the interval has passed, else make sure a timer will"""
+        due = self.last_flush + self.flush_interval - time.monotonic()
+        if due <= 0:
+            self.flush()
+            return
+        with self.lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(due, self._flush_due)
+            self._timer.daemon = True
+        self._timer.start()
+    
+    def _flush_due(self):
+        with self.lock:
+            self._timer = None
+        self.flush_pending()
+    
+    def flush_pending(self):
+        """Write observations not flushed yet (gunicorn's worker_exit and interpreter exit call this)"""
+        if self.directory and self.dirty:
+            self.flush()
+    
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('chatbot_stage_duration_seconds', name, elapsed)
+            trace = getattr(self.local, 'trace', None)
+            if trace is not None:
+                trace[name] += elapsed
+    
+    def timed(self, name: str):
+        """Decorator form of ``stage``"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def begin_request(self):
+        self.local.trace = defaultdict(float)
+        self.local.started = time.perf_counter()
+    
+    def end_request(self, endpoint: str, description: str):
+        trace = getattr(self.local, 'trace', None)
+        if trace is None:
+            return
+        elapsed = time.perf_counter() - self.local.started
+        self.local.trace = None
+        self.observe('chatbot_request_duration_seconds', endpoint, elapsed)
+        if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+            breakdown = ", ".join(f"{name}={seconds * 1000:.2f}ms" for name, seconds in
+                                  sorted(trace.items(), key=lambda item: -item[1]))
+            logger.warning(f"Slow request {description} took {elapsed * 1000:.1f}ms: {breakdown or 'no stages'}")
+    
+    def after_fork(self):
+        """Start a forked worker from empty histograms instead of the parent's"""
+        with self.lock:
+            self.histograms = {}
+            self.dirty = False
+            # The parent's timer thread did not survive the fork
+            self._timer = None
+        self.local = threading.local()
+        self.last_flush = 0.0
+    
+    def snapshot(self) -> Dict[str, List[float]]:
+        with self.lock:
+            return {f"{family}|{label}": list(values) for (family, label), values in self.histograms.items()}
+    
+    def flush(self):
+        """Write this process's histograms for other workers to merge"""
+        self.last_flush = time.monotonic()
+        with self.lock:
+            self.dirty = False
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json") # type: ignore
+        with open(path + '.tmp', 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(path + '.tmp', path)
+    
+    def merged(self) -> Dict[str, List[float]]:
+        merged = self.snapshot()
+        if not self.directory:
+            return merged
+        own = f"metrics-{os.getpid()}.json"
+        for name in os.listdir(self.directory):
+            if not name.startswith('metrics-') or not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as snapshot_file:
+                    other = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+            for key, values in other.items():
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], values)]
+                else:
+                    merged[key] = values
+        return merged
+    
+    def render(self) -> str:
+        """Prometheus text exposition of all merged histograms"""
+        by_family = defaultdict(list)
+        for key, values in sorted(self.merged().items()):
+            family, label = key.split('|', 1)
+            by_family[family].append((label, values))
+        
+        lines = []
+        for family, (label_name, help_text) in self.FAMILIES.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} histogram")
+            for label, values in by_family.get(family, []):
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS, values):
+                    cumulative += count
+                    lines.append(f'{family}_bucket{{{label_name}="{label}",le="{bound}"}} {int(cumulative)}')
+                lines.append(f'{family}_bucket{{{label_name}="{label}",le="+Inf"}} {int(values[-1])}')
+                lines.append(f'{family}_sum{{{label_name}="{label}"}} {values[-2]:.6f}')
+                lines.append(f'{family}_count{{{label_name}="{label}"}} {int(values[-1])}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
+
+
+# Rollups behind /api/analytics. Triggers keep them current on every insert,
+# from any worker and in either write mode, so reads never scan history.
+ROLLUP_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS rollup_totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS rollup_sessions (session_id TEXT PRIMARY KEY, first_seen DATETIME) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS rollup_faq_hits (matched_faq TEXT PRIMARY KEY, hits INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS idx_rollup_faq_hits_hits ON rollup_faq_hits (hits DESC, matched_faq)',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_daily (
+        day TEXT PRIMARY KEY,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        user_messages INTEGER NOT NULL DEFAULT 0,
+        bot_messages INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS rollup_conversations_insert AFTER INSERT ON conversations
+    BEGIN
+        INSERT OR IGNORE INTO rollup_sessions (session_id, first_seen) VALUES (NEW.session_id, NEW.timestamp);
+        UPDATE rollup_totals SET value = value + 1 WHERE name = 'user_messages' AND NEW.message_type = 'user';
+        INSERT INTO rollup_faq_hits (matched_faq, hits) SELECT NEW.matched_faq, 1 WHERE NEW.matched_faq IS NOT NULL
+            ON CONFLICT (matched_faq) DO UPDATE SET hits = hits + 1;
+        INSERT INTO rollup_daily (day, user_messages, bot_messages)
+            VALUES (date(NEW.timestamp), NEW.message_type = 'user', NEW.message_type != 'user')
+            ON CONFLICT (day) DO UPDATE SET user_messages = user_messages + excluded.user_messages,
+                                            bot_messages = bot_messages + excluded.bot_messages;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS rollup_sessions_insert AFTER INSERT ON rollup_sessions
+    BEGIN
+        UPDATE rollup_totals SET value = value + 1 WHERE name = 'sessions';
+        INSERT INTO rollup_daily (day, sessions) VALUES (date(NEW.first_seen), 1)
+            ON CONFLICT (day) DO UPDATE SET sessions = sessions + 1;
+    END
+    ''',
+]
+
+
+# Typed copy of each message_processed analytics event, filled by a trigger so
+# every write path (sync, batched, write-behind) keeps it current. Clustered
+# on (timestamp, id): time-window reports read one contiguous key range.
+MESSAGE_EVENTS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS message_events (
+        timestamp DATETIME NOT NULL,
+        id INTEGER NOT NULL,
+        session_id TEXT NOT NULL,
+        intent TEXT,
+        matched_faq TEXT,
+        confidence REAL,
+        has_contact INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (timestamp, id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS message_events_insert AFTER INSERT ON analytics
+    WHEN NEW.event_type = 'message_processed' AND json_valid(NEW.event_data)
+    BEGIN
+        INSERT INTO message_events (timestamp, id, session_id, intent, matched_faq, confidence, has_contact)
+        VALUES (NEW.timestamp, NEW.id, NEW.session_id,
+                json_extract(NEW.event_data, '$.intent'),
+                json_extract(NEW.event_data, '$.matched_faq'),
+                json_extract(NEW.event_data, '$.confidence'),
+                json_extract(NEW.event_data, '$.entities.email') IS NOT NULL
+                    OR json_extract(NEW.event_data, '$.entities.phone') IS NOT NULL);
+    END
+    ''',
+]
+
+
+_live_writers: 'weakref.WeakSet[WriteBehindWriter]' = weakref.WeakSet()
+
+
+@atexit.register
+def _stop_writers():
+    """Flush every write-behind writer still alive at interpreter exit"""
+    for writer in list(_live_writers):
+        writer.stop()
+
+
+class WriteBehindWriter:
+    """Background writer that commits queued inserts in batched transactions.
+    
+    A batch is committed once it holds ``batch_size`` writes or its oldest
+    write has waited ``flush_ms``. The queue is bounded; ``backpressure``
+    decides what a full queue does to the caller. Writes submitted together
+    (``submit_many``) are queued as one item, so they are committed, dropped
+    or retried as a unit. Pending writes are flushed at interpreter exit. A
+    write that cannot be committed is logged, counted as failed and dropped;
+    it never takes the writer thread down with it.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, db: 'DatabaseManager', batch_size: int = WRITE_BATCH_SIZE,
+                 flush_ms: float = WRITE_FLUSH_MS, queue_size: int = WRITE_QUEUE_SIZE,
+                 backpressure: str = WRITE_BACKPRESSURE):
+        if backpressure not in ('block', 'drop', 'inline'):
+            raise ValueError(f"Unknown backpressure policy '{backpressure}'")
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._queue = None
+        # Weakly held: an evicted tenant's stopped writer (and its database) can go
+        _live_writers.add(self)
+    
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each process starts its own writer
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._thread = threading.Thread(target=self._run, name='db-write-behind', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+    
+    def submit(self, sql: str, params: Tuple):
+        """Queue one write according to the backpressure policy"""
+        self.submit_many([(sql, params)])
+    
+    def submit_many(self, writes: List[Tuple[str, Tuple]]):
+        """Queue writes that must commit together, according to the backpressure policy
+        
+        Raises RuntimeError if this process's writer thread has died, rather
+        than queueing writes nobody will commit (or blocking on a full queue).
+        """
+        self._ensure_started()
+        if not self._thread.is_alive():
+            raise RuntimeError("The write-behind writer thread is not running")
+        item = tuple(writes)
+        if self.backpressure == 'block':
+            self._queue.put(item)
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                if self.backpressure == 'drop':
+                    self.counters['dropped'] += len(item)
+                    return
+                self.counters['inline'] += len(item)
+                self._commit([item])
+                return
+        self.counters['queued'] += len(item)
+    
+    def _run(self):
+        work = self._queue
+        while True:
+            item = work.get()
+            if item is self._STOP:
+                work.task_done()
+                return
+            batch = [item]
+            size = len(item)
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while size < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = work.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                size += len(item)
+            try:
+                self._commit(batch)
+            finally:
+                for _ in batch:
+                    work.task_done()
+            if stop:
+                work.task_done()
+                return
+    
+    def _commit(self, batch: List[Tuple[Tuple[str, Tuple], ...]]):
+        """Commit queued items (each a tuple of writes) in one transaction"""
+        try:
+            with self.db.connection() as conn:
+                for writes in batch:
+                    for sql, params in writes:
+                        conn.execute(sql, params)
+                conn.commit()
+            self.counters['committed'] += sum(len(writes) for writes in batch)
+            self.counters['batches'] += 1
+        except Exception as e:
+            if len(batch) == 1:
+                self.counters['failed'] += len(batch[0])
+                logger.error(f"Write-behind dropped {len(batch[0])} write(s) that failed: {str(e)}")
+                return
+            # The batch rolled back; retry each item so one bad one drops alone
+            logger.warning(f"Write-behind batch of {len(batch)} failed, retrying one by one: {str(e)}")
+            for item in batch:
+                self._commit([item])
+    
+    def flush(self):
+        """Block until every write queued so far is committed"""
+        if self._pid == os.getpid():
+            self._queue.join()
+    
+    def stop(self):
+        """Flush pending writes and stop the writer thread"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._pid = None
+    
+    def stats(self) -> Dict:
+        stats = {name: self.counters[name] for name in
+                 ('queued', 'committed', 'batches', 'dropped', 'inline', 'failed')}
+        stats['pending'] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return stats
+
+
+class ArchiveStore:
+    """Append-only gzip NDJSON files holding rows moved out of the hot database.
+    
+    Rows are partitioned by table and month (``conversations-2024-05.ndjson.gz``).
+    Each archive run appends complete gzip members, so a file is still a
+    valid gzip stream, and records where each member starts and ends; one
+    archived session is read back by decompressing only its members.
+    """
+    
+    # Rows per gzip member; a session is never split across members of a run
+    MEMBER_ROWS = 1000
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+    
+    def append(self, table: str, month: str, rows: List[Dict]) -> Tuple[str, int, int]:
+        """Write ``rows`` as one member; returns (file name, offset, length)"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{table}-{month}.ndjson.gz"
+        payload = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        member = gzip.compress(payload.encode('utf-8'))
+        with open(os.path.join(self.directory, name), 'ab') as archive_file:
+            offset = archive_file.tell()
+            archive_file.write(member)
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+        return name, offset, len(member)
+    
+    def read_member(self, name: str, offset: int, length: int) -> List[Dict]:
+        with open(os.path.join(self.directory, name), 'rb') as archive_file:
+            archive_file.seek(offset)
+            payload = gzip.decompress(archive_file.read(length))
+        return [json.loads(line) for line in payload.decode('utf-8').splitlines()]
+    
+    def files(self, table: str) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith(f"{table}-") and name.endswith('.ndjson.gz'))
+
+
+class DatabaseManager:
+    """Manage SQLite database for conversations and analytics
+    
+    Connections are pooled per process and configured for concurrent use:
+    WAL journaling lets readers proceed while one writer commits, and
+    busy_timeout makes writers from other threads or gunicorn workers wait
+    for the lock instead of failing with "database is locked".
+    """
+    
+    INSERT_MESSAGE = '''
+        INSERT INTO conversations (session_id, message_type, message, response, matched_faq)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    INSERT_ANALYTICS = '''
+        INSERT INTO analytics (session_id, event_type, event_data)
+        VALUES (?, ?, ?)
+    '''
+    # A bot turn whose text lives in the responses table
+    INSERT_BOT_MESSAGE = '''
+        INSERT INTO conversations (session_id, message_type, message, response, matched_faq, response_id)
+        VALUES (?, ?, '', NULL, ?, ?)
+    '''
+    # Storing a new response text in the transaction of the turn that uses it.
+    # ?1 is the session id, which every write leads with so that
+    # ShardedDatabase can route it; the statement itself does not need it.
+    INSERT_RESPONSE = '''
+        INSERT INTO responses (digest, body) VALUES (?2, ?3) ON CONFLICT (digest) DO NOTHING
+    '''
+    INSERT_BOT_MESSAGE_BY_DIGEST = '''
+        INSERT INTO conversations (session_id, message_type, message, response, matched_faq, response_id)
+        VALUES (?, ?, '', NULL, ?, (SELECT id FROM responses WHERE digest = ?))
+    '''
+    # Response digests -> ids remembered per process
+    RESPONSE_ID_CACHE = 4096
+    
+    def __init__(self, db_path=None, pool_size: int = DB_POOL_SIZE, write_mode: str = WRITE_MODE,
+                 archive_dir: str = None, id_floor: int = 0, lazy: bool = False, # type: ignore
+                 cache_kb: int = DB_CACHE_KB):
+        if write_mode not in ('sync', 'write_behind'):
+            raise ValueError(f"Unknown write mode '{write_mode}'")
+        self.db_path = db_path or os.environ.get('CHATBOT_DB_PATH', 'chatbot.db')
+        self.pool_size = pool_size
+        self.cache_kb = cache_kb
+        self._pool: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._pool_pid = os.getpid()
+        self.writer = WriteBehindWriter(self) if write_mode == 'write_behind' else None
+        self._response_ids: OrderedDict = OrderedDict()
+        self._response_lock = threading.Lock()
+        self.archive = ArchiveStore(
+            archive_dir or ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'archive'))
+        self.id_floor = id_floor
+        self._initialized = False
+        self._initializing = False
+        self._init_lock = threading.RLock()
+        if not lazy:
+            self.initialize()
+    
+    def initialize(self):
+        """Apply pending migrations (and reserve ``id_floor``) once
+        
+        Runs from the constructor, or with ``lazy=True`` when the first
+        connection is borrowed, so opening a database costs no I/O until it
+        is used. Other threads wait for it to finish; the connections the
+        migrations themselves borrow pass straight through.
+        """
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized or self._initializing:
+                return
+            self._initializing = True
+            try:
+                self.init_database()
+                if self.id_floor:
+                    self.reserve_ids(self.id_floor)
+                self._initialized = True
+            finally:
+                self._initializing = False
+    
+    def get_connection(self):
+        """Get a new database connection; the caller closes it"""
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        # Only takes effect on a brand-new file (before WAL writes its header);
+        # lets compact() release pages without a full VACUUM
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA synchronous = {DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size = -{self.cache_kb}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for one unit of work
+        
+        An exception rolls back any open transaction before the connection
+        goes back to the pool. Connections inherited across a fork are
+        dropped, never reused, since SQLite handles must not cross processes.
+        """
+        if not self._initialized:
+            self.initialize()
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                # Left referenced, never closed: closing a parent's connection touches its SQLite state
+                self._inherited_pool = self._pool
+                self._pool = []
+                self._pool_pid = os.getpid()
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self.get_connection()
+        
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            with self._pool_lock:
+                if self._pool_pid == os.getpid() and len(self._pool) < self.pool_size:
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+    
+    def close(self):
+        """Close every idle pooled connection"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+    
+    # Ordered schema migrations; PRAGMA user_version records the last one
+    # applied. A step is a SQL statement or a callable taking the connection.
+    MIGRATIONS = [
+        (1, "baseline tables", [
+            '''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_type TEXT NOT NULL,
+                message TEXT NOT NULL,
+                response TEXT,
+                matched_faq TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS analytics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                event_data TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_id INTEGER,
+                rating INTEGER,
+                comment TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+        ]),
+        (2, "secondary indexes for history, FAQ and event lookups", [
+            'CREATE INDEX IF NOT EXISTS idx_conversations_session_timestamp ON conversations (session_id, timestamp)',
+            'CREATE INDEX IF NOT EXISTS idx_conversations_matched_faq ON conversations (matched_faq)',
+            'CREATE INDEX IF NOT EXISTS idx_analytics_event_timestamp ON analytics (event_type, timestamp)',
+            'CREATE INDEX IF NOT EXISTS idx_analytics_session ON analytics (session_id)',
+            'CREATE INDEX IF NOT EXISTS idx_feedback_session ON feedback (session_id)',
+            'ANALYZE',
+        ]),
+        (3, "analytics rollups maintained by triggers", ROLLUP_SCHEMA + [
+            lambda conn: DatabaseManager.rebuild_rollup_tables(conn, archived=False),
+        ]),
+        (4, "bookkeeping for archived sessions", [
+            # One row per archived session per gzip member holding its rows
+            '''
+            CREATE TABLE IF NOT EXISTS archive_sessions (
+                session_id TEXT NOT NULL,
+                first_seen DATETIME NOT NULL,
+                messages INTEGER NOT NULL,
+                archive_file TEXT NOT NULL,
+                member_offset INTEGER NOT NULL,
+                member_length INTEGER NOT NULL,
+                archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (session_id, archive_file, member_offset)
+            ) WITHOUT ROWID
+            ''',
+            # What archived rows contributed to the rollups, so a rebuild from
+            # the hot rows can add it back
+            '''
+            CREATE TABLE IF NOT EXISTS archive_daily (
+                day TEXT PRIMARY KEY,
+                user_messages INTEGER NOT NULL DEFAULT 0,
+                bot_messages INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            ''',
+            'CREATE TABLE IF NOT EXISTS archive_faq_hits (matched_faq TEXT PRIMARY KEY, hits INTEGER NOT NULL) WITHOUT ROWID',
+        ]),
+        (5, "typed message events backfilled from analytics JSON", MESSAGE_EVENTS_SCHEMA + [
+            '''
+            INSERT OR IGNORE INTO message_events 
+                (timestamp, id, session_id, intent, matched_faq, confidence, has_contact)
+            SELECT timestamp, id, session_id,
+                   json_extract(event_data, '$.intent'),
+                   json_extract(event_data, '$.matched_faq'),
+                   json_extract(event_data, '$.confidence'),
+                   json_extract(event_data, '$.entities.email') IS NOT NULL
+                       OR json_extract(event_data, '$.entities.phone') IS NOT NULL
+            FROM analytics 
+            WHERE event_type = 'message_processed' AND json_valid(event_data)
+            ''',
+        ]),
+        (6, "content-addressed bot responses", [
+            '''
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                digest BLOB NOT NULL UNIQUE,
+                body TEXT NOT NULL
+            )
+            ''',
+            'ALTER TABLE conversations ADD COLUMN response_id INTEGER REFERENCES responses (id)',
+            # Rows as they were before normalization; every history read goes through it
+            '''
+            CREATE VIEW IF NOT EXISTS conversation_history AS 
+            SELECT c.id, c.session_id, c.message_type, 
+                   CASE WHEN c.response_id IS NULL THEN c.message ELSE r.body END AS message, 
+                   CASE WHEN c.response_id IS NULL THEN c.response ELSE r.body END AS response, 
+                   c.matched_faq, c.timestamp 
+            FROM conversations c LEFT JOIN responses r ON r.id = c.response_id
+            ''',
+            lambda conn: DatabaseManager.normalize_responses(conn),
+        ]),
+    ]
+    
+    @property
+    def schema_version(self) -> int:
+        """Last migration applied to the database file"""
+        with self.connection() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+    
+    def init_database(self):
+        """Initialize database tables and apply pending migrations"""
+        with self.connection() as conn:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            for version, description, steps in self.MIGRATIONS:
+                if version <= current:
+                    continue
+                
+                # Take the write lock, then re-check: another worker may have
+                # applied this migration while we waited for it
+                conn.execute('BEGIN IMMEDIATE')
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version <= current:
+                    conn.rollback()
+                    continue
+                
+                started = time.perf_counter()
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+                current = version
+                logger.info(f"Applied migration {version} ({description}) to {self.db_path} "
+                            f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+    
+    @metrics.timed('db.write')
+    def _write(self, sql: str, params: Tuple) -> Optional[int]:
+        """Insert a row now, or hand it to the write-behind writer (no id)"""
+        if self.writer is not None:
+            self.writer.submit(sql, params)
+            return None
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+    
+    def flush(self):
+        """Make queued writes visible to readers"""
+        if self.writer is not None:
+            self.writer.flush()
+    
+    def stats(self) -> Dict:
+        stats = {
+            "write_mode": "write_behind" if self.writer else "sync",
+            "pool_size": self.pool_size,
+            "schema_version": self.schema_version
+        }
+        if self.writer is not None:
+            stats["writer"] = self.writer.stats()
+        return stats
+    
+    @metrics.timed('db.write_many')
+    def write_many(self, writes: List[Tuple[str, Tuple]]) -> Optional[int]:
+        """Persist several writes in one transaction (or queue them)
+        
+        Returns the row id of the last write, or None when queued.
+        """
+        if self.writer is not None:
+            self.writer.submit_many(writes)
+            return None
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for sql, params in writes:
+                cursor.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+    
+    def write_groups(self, groups: List[List[Tuple[str, Tuple]]]) -> List[Optional[Exception]]:
+        """Persist groups of writes (say, one per chat message) in one transaction
+        
+        If that transaction fails, each group is retried in a transaction of
+        its own, so only the groups that fail by themselves are lost. Returns,
+        per group, None or the exception that kept it from being saved.
+        """
+        try:
+            self.write_many([write for group in groups for write in group])
+            return [None] * len(groups)
+        except Exception as e:
+            if len(groups) == 1:
+                return [e]
+            logger.warning(f"Batched write of {len(groups)} groups failed, retrying one by one: {str(e)}")
+        errors: List[Optional[Exception]] = []
+        for group in groups:
+            try:
+                self.write_many(group)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+    
+    def message_writes(self, session_id: str, message_type: str, message: str, 
+                       response: str = None, matched_faq: str = None) -> List[Tuple[str, Tuple]]: # type: ignore
+        """Statements and parameters that save one message
+        
+        A bot turn (``message`` and ``response`` the same text) references
+        its text in the responses table instead of storing it twice. A text
+        not stored yet is inserted by the same writes; save them with
+        ``write_many`` so it commits (or rolls back, or is dropped by the
+        write-behind writer) together with the turn.
+        """
+        if not self.is_bot_turn(message_type, message, response):
+            return [(self.INSERT_MESSAGE, (session_id, message_type, message, response, matched_faq))]
+        digest = self.response_digest(response)
+        response_id = self.known_response_id(digest)
+        if response_id is not None:
+            return [(self.INSERT_BOT_MESSAGE, (session_id, message_type, matched_faq, response_id))]
+        return [(self.INSERT_RESPONSE, (session_id, digest, response)),
+                (self.INSERT_BOT_MESSAGE_BY_DIGEST, (session_id, message_type, matched_faq, digest))]
+    
+    @staticmethod
+    def is_bot_turn(message_type: str, message: str, response: Optional[str]) -> bool:
+        return message_type == 'bot' and response is not None and message == response
+    
+    @staticmethod
+    def response_digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def known_response_id(self, digest: bytes) -> Optional[int]:
+        """Id of an already stored response text, or None
+        
+        The few distinct FAQ answers are cached, so a bot turn normally
+        costs no extra statement.
+        """
+        with self._response_lock:
+            if digest in self._response_ids:
+                self._response_ids.move_to_end(digest)
+                return self._response_ids[digest]
+        with self.connection() as conn:
+            row = conn.execute('SELECT id FROM responses WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            return None
+        with self._response_lock:
+            self._response_ids[digest] = row[0]
+            if len(self._response_ids) > self.RESPONSE_ID_CACHE:
+                self._response_ids.popitem(last=False)
+        return row[0]
+    
+    def response_id(self, text: str) -> int:
+        """Id of ``text`` in the responses table, committing it on first sight"""
+        digest = self.response_digest(text)
+        response_id = self.known_response_id(digest)
+        if response_id is None:
+            with self.connection() as conn:
+                conn.execute(self.INSERT_RESPONSE, (None, digest, text))
+                conn.commit()
+            response_id = self.known_response_id(digest)
+        return response_id # type: ignore
+    
+    @classmethod
+    def normalize_responses(cls, conn):
+        """Move the text of stored bot turns into the responses table"""
+        bot_turns = "message_type = 'bot' AND response IS NOT NULL AND message = response AND response_id IS NULL"
+        texts = conn.execute(f'SELECT DISTINCT response FROM conversations WHERE {bot_turns}')
+        conn.executemany('INSERT INTO responses (digest, body) VALUES (?, ?) ON CONFLICT (digest) DO NOTHING',
+                         ((cls.response_digest(text), text) for (text,) in texts.fetchall()))
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_body_backfill ON responses (body)')
+        conn.execute(f'''
+            UPDATE conversations 
+            SET response_id = (SELECT id FROM responses WHERE body = conversations.response), 
+                message = '', response = NULL 
+            WHERE {bot_turns}
+        ''')
+        conn.execute('DROP INDEX idx_responses_body_backfill')
+    
+    def analytics_write(self, session_id: str, event_type: str, event_data: Dict = None) -> Tuple[str, Tuple]: # type: ignore
+        """Statement and parameters that save one analytics event"""
+        return self.INSERT_ANALYTICS, (session_id, event_type, json.dumps(event_data) if event_data else None)
+    
+    def save_message(self, session_id: str, message_type: str, message: str, 
+                     response: str = None, matched_faq: str = None): # type: ignore
+        """Save a message to database"""
+        writes = self.message_writes(session_id, message_type, message, response, matched_faq)
+        if len(writes) == 1:
+            return self._write(*writes[0])
+        return self.write_many(writes)
+    
+    def _conversation_query(self, conn, session_id: str, after_id: Optional[int]) -> Tuple[str, List]:
+        """History query in (timestamp, id) order, resuming after ``after_id``
+        
+        The keyset predicate rides the (session_id, timestamp) index, so a
+        page costs the same wherever it starts in a long history.
+        """
+        sql = 'SELECT * FROM conversation_history WHERE session_id = ?'
+        params: List = [session_id]
+        if after_id is not None:
+            cursor_row = conn.execute(
+                'SELECT timestamp FROM conversations WHERE id = ? AND session_id = ?',
+                (after_id, session_id)
+            ).fetchone()
+            if cursor_row is None:
+                raise ValueError(f"after_id {after_id} is not part of session {session_id}")
+            sql += ' AND (timestamp, id) > (?, ?)'
+            params += [cursor_row['timestamp'], after_id]
+        return sql + ' ORDER BY timestamp ASC, id ASC', params
+    
+    def _archived_rows(self, conn, session_id: str, after_id: Optional[int]) -> Tuple[List[Dict], Optional[int]]:
+        """Archived history of a session after ``after_id``, read from its
+        gzip members on demand, plus the cursor left for the hot rows
+        
+        Archiving moves whole idle sessions, so archived rows always precede
+        the session's hot rows; a cursor found among them is used up.
+        """
+        members = conn.execute('''
+            SELECT archive_file, member_offset, member_length FROM archive_sessions 
+            WHERE session_id = ? ORDER BY first_seen, archive_file, member_offset
+        ''', (session_id,)).fetchall()
+        if not members:
+            return [], after_id
+        
+        rows = [row for member in members for row in self.archive.read_member(*member)
+                if row['session_id'] == session_id]
+        rows.sort(key=lambda row: (row['timestamp'], row['id']))
+        if after_id is None:
+            return rows, None
+        for position, row in enumerate(rows):
+            if row['id'] == after_id:
+                return rows[position + 1:], None
+        return [], after_id
+    
+    @metrics.timed('db.get_conversation')
+    def get_conversation(self, session_id: str, after_id: int = None, limit: int = None) -> List[Dict]: # type: ignore
+        """Get conversation history, optionally one page after a cursor"""
+        self.flush()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            archived, after_id = self._archived_rows(conn, session_id, after_id)
+            if limit is not None:
+                archived = archived[:limit]
+                limit -= len(archived)
+                if limit == 0:
+                    return archived
+            
+            sql, params = self._conversation_query(conn, session_id, after_id)
+            if limit is not None:
+                sql += ' LIMIT ?'
+                params.append(limit)
+            cursor.execute(sql, params)
+            
+            rows = cursor.fetchall()
+        
+        return archived + [dict(row) for row in rows]
+    
+    def iter_conversation(self, session_id: str, after_id: int = None, chunk_size: int = 200): # type: ignore
+        """Yield history rows one at a time, fetching ``chunk_size`` at once
+        
+        Memory stays bounded by the chunk size however long the hot history
+        is (an archived session is read back whole first). Raises ValueError
+        for an unknown cursor before yielding anything.
+        """
+        self.flush()
+        with self.connection() as conn:
+            archived, after_id = self._archived_rows(conn, session_id, after_id)
+            sql, params = self._conversation_query(conn, session_id, after_id)
+            yield from archived
+            cursor = conn.execute(sql, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield dict(row)
+            finally:
+                cursor.close()
+    
+    # Exportable tables and their columns, in output order
+    EXPORT_COLUMNS = {
+        'conversations': ('id', 'session_id', 'message_type', 'message', 'response', 'matched_faq', 'timestamp'),
+        'analytics': ('id', 'session_id', 'event_type', 'event_data', 'timestamp'),
+        'feedback': ('id', 'session_id', 'message_id', 'rating', 'comment', 'timestamp'),
+    }
+    
+    def export_rows(self, table: str, since: str = None, until: str = None, session_id: str = None, # type: ignore
+                    event_type: str = None, after_id: int = None, chunk_size: int = 500): # type: ignore
+        """Rows of ``table`` in id order as a generator, ``chunk_size`` fetched at once
+        
+        ``since``/``until`` bound the timestamp (``until`` exclusive),
+        ``after_id`` resumes after the last row an earlier export returned.
+        ``leads`` is shorthand for the ``contact_captured`` analytics events.
+        Arguments are checked here, so a ValueError comes before any row.
+        Only hot rows are exported; the archive already is NDJSON.
+        """
+        if table == 'leads':
+            table, event_type = 'analytics', 'contact_captured'
+        if table not in self.EXPORT_COLUMNS:
+            raise ValueError(f"table must be one of {', '.join(self.EXPORT_COLUMNS)} or leads")
+        if event_type is not None and table != 'analytics':
+            raise ValueError("event_type only applies to analytics")
+        
+        conditions, params = [], []
+        for column, operator, value in (('timestamp', '>=', since), ('timestamp', '<', until),
+                                        ('session_id', '=', session_id), ('event_type', '=', event_type),
+                                        ('id', '>', after_id)):
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        source = 'conversation_history' if table == 'conversations' else table
+        sql = f"SELECT {', '.join(self.EXPORT_COLUMNS[table])} FROM {source} {where} ORDER BY id"
+        self.flush()
+        return self._stream_rows(sql, params, chunk_size)
+    
+    def _stream_rows(self, sql: str, params: List, chunk_size: int):
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    for row in rows:
+                        yield dict(row)
+            finally:
+                cursor.close()
+    
+    def save_analytics(self, session_id: str, event_type: str, event_data: Dict = None): # type: ignore
+        """Save analytics event"""
+        self._write(*self.analytics_write(session_id, event_type, event_data))
+    
+    @metrics.timed('db.save_feedback')
+    def save_feedback(self, session_id: str, rating: int, comment: str = ''):
+        """Save user feedback"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO feedback (session_id, rating, comment)
+                VALUES (?, ?, ?)
+            ''', (session_id, rating, comment))
+            
+            conn.commit()
+            return cursor.lastrowid
+    
+    @metrics.timed('db.get_analytics_summary')
+    def get_analytics_summary(self) -> Dict:
+        """Get analytics summary from the rollup tables"""
+        self.flush()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT name, value FROM rollup_totals')
+            totals = {row['name']: row['value'] for row in cursor.fetchall()}
+            
+            cursor.execute('''
+                SELECT matched_faq, hits as count 
+                FROM rollup_faq_hits 
+                ORDER BY hits DESC, matched_faq 
+                LIMIT 5
+            ''')
+            top_faqs = [dict(row) for row in cursor.fetchall()]
+            
+            cursor.execute('''
+                SELECT day, sessions, user_messages, bot_messages 
+                FROM rollup_daily 
+                ORDER BY day DESC 
+                LIMIT 30
+            ''')
+            daily = [dict(row) for row in cursor.fetchall()]
+        
+        return {
+            "total_sessions": totals.get('sessions', 0),
+            "total_messages": totals.get('user_messages', 0),
+            "top_faqs": top_faqs,
+            "daily": daily
+        }
+    
+    # strftime formats for the report buckets
+    BUCKETS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}
+    
+    def _bucket_format(self, bucket: str) -> str:
+        if bucket not in self.BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(self.BUCKETS)}")
+        return self.BUCKETS[bucket]
+    
+    @metrics.timed('db.intent_distribution')
+    def intent_distribution(self, since: str, until: str, bucket: str = 'day') -> List[Dict]:
+        """Message count per intent in each time bucket of [since, until)"""
+        bucket_format = self._bucket_format(bucket)
+        self.flush()
+        series: Dict[str, Dict] = {}
+        with self.connection() as conn:
+            for period, intent, count in conn.execute('''
+                SELECT strftime(?, timestamp) AS period, intent, COUNT(*) 
+                FROM message_events WHERE timestamp >= ? AND timestamp < ? 
+                GROUP BY period, intent ORDER BY period, intent
+            ''', (bucket_format, since, until)):
+                entry = series.setdefault(period, {"bucket": period, "total": 0, "intents": {}})
+                entry["intents"][intent or "unknown"] = count
+                entry["total"] += count
+        return list(series.values())
+    
+    @metrics.timed('db.confidence_histogram')
+    def confidence_histogram(self, since: str, until: str, bins: int = 10) -> List[Dict]:
+        """Match confidence counts in ``bins`` equal-width bins over 0..1"""
+        if not 1 <= bins <= 100:
+            raise ValueError("bins must be between 1 and 100")
+        self.flush()
+        with self.connection() as conn:
+            counts = dict(conn.execute('''
+                SELECT MIN(MAX(CAST(confidence * ? AS INTEGER), 0), ? - 1) AS bin, COUNT(*) 
+                FROM message_events 
+                WHERE timestamp >= ? AND timestamp < ? AND confidence IS NOT NULL 
+                GROUP BY bin
+            ''', (bins, bins, since, until)).fetchall())
+        return [{"lower": round(n / bins, 6), "upper": round((n + 1) / bins, 6), "count": counts.get(n, 0)}
+                for n in range(bins)]
+    
+    @metrics.timed('db.fallback_rate')
+    def fallback_rate(self, since: str, until: str, bucket: str = 'day') -> List[Dict]:
+        """Share of messages answered by the fallback in each time bucket"""
+        bucket_format = self._bucket_format(bucket)
+        self.flush()
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT strftime(?, timestamp) AS period, COUNT(*), SUM(matched_faq = 'fallback') 
+                FROM message_events WHERE timestamp >= ? AND timestamp < ? 
+                GROUP BY period ORDER BY period
+            ''', (bucket_format, since, until)).fetchall()
+        return [{"bucket": period, "messages": messages, "fallbacks": fallbacks,
+                 "rate": round(fallbacks / messages, 4)} for period, messages, fallbacks in rows]
+    
+    @staticmethod
+    def _recount_queries(archived: bool = True) -> Dict[str, str]:
+        """Rollup recounts over the hot rows plus the tallies of archived ones"""
+        sessions = 'SELECT session_id, MIN(timestamp) AS first_seen FROM conversations GROUP BY session_id'
+        daily = ('''SELECT date(timestamp) AS day, SUM(message_type = 'user') AS user_messages, 
+                    SUM(message_type != 'user') AS bot_messages FROM conversations GROUP BY date(timestamp)''')
+        faq_hits = ('''SELECT matched_faq, COUNT(*) AS hits FROM conversations 
+                       WHERE matched_faq IS NOT NULL GROUP BY matched_faq''')
+        if archived:
+            sessions += ' UNION ALL SELECT session_id, first_seen FROM archive_sessions'
+            daily += ' UNION ALL SELECT day, user_messages, bot_messages FROM archive_daily'
+            faq_hits += ' UNION ALL SELECT matched_faq, hits FROM archive_faq_hits'
+        return {
+            "sessions": f'SELECT session_id, MIN(first_seen) AS first_seen FROM ({sessions}) GROUP BY session_id',
+            "daily": f'''SELECT day, SUM(user_messages) AS user_messages, SUM(bot_messages) AS bot_messages 
+                        FROM ({daily}) GROUP BY day''',
+            "faq_hits": f'SELECT matched_faq, SUM(hits) AS hits FROM ({faq_hits}) GROUP BY matched_faq',
+        }
+    
+    @classmethod
+    def _raw_rollups(cls, conn) -> Dict:
+        """Recompute every rollup with full scans of the raw rows"""
+        queries = cls._recount_queries()
+        totals = {
+            'sessions': conn.execute(f'SELECT COUNT(*) FROM ({queries["sessions"]})').fetchone()[0],
+            'user_messages': conn.execute(
+                f'SELECT COALESCE(SUM(user_messages), 0) FROM ({queries["daily"]})').fetchone()[0],
+        }
+        faq_hits = dict(conn.execute(queries["faq_hits"]).fetchall())
+        daily: Dict[str, List[int]] = {}
+        for day, sessions in conn.execute(
+                f'SELECT date(first_seen), COUNT(*) FROM ({queries["sessions"]}) GROUP BY date(first_seen)'):
+            daily.setdefault(day, [0, 0, 0])[0] = sessions
+        for day, user_messages, bot_messages in conn.execute(queries["daily"]):
+            daily.setdefault(day, [0, 0, 0])[1:] = [user_messages, bot_messages]
+        return {"totals": totals, "faq_hits": faq_hits, "daily": {d: tuple(v) for d, v in daily.items()}}
+    
+    @staticmethod
+    def _stored_rollups(conn) -> Dict:
+        return {
+            "totals": dict(conn.execute('SELECT name, value FROM rollup_totals').fetchall()),
+            "faq_hits": dict(conn.execute('SELECT matched_faq, hits FROM rollup_faq_hits').fetchall()),
+            "daily": {row[0]: tuple(row[1:]) for row in conn.execute(
+                'SELECT day, sessions, user_messages, bot_messages FROM rollup_daily')},
+        }
+    
+    @classmethod
+    def rebuild_rollup_tables(cls, conn, archived: bool = True):
+        """Recompute the rollup tables from raw rows inside the caller's transaction
+        
+        ``archived`` adds back what archived rows contributed; it is off only
+        for the migration that predates the archive tables.
+        """
+        queries = cls._recount_queries(archived)
+        for table in ('rollup_totals', 'rollup_sessions', 'rollup_faq_hits', 'rollup_daily'):
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute("INSERT INTO rollup_totals (name, value) VALUES ('sessions', 0), ('user_messages', 0)")
+        # rollup_sessions_insert counts sessions into the totals and daily buckets
+        conn.execute(f'INSERT INTO rollup_sessions (session_id, first_seen) {queries["sessions"]}')
+        conn.execute(f'''
+            UPDATE rollup_totals 
+            SET value = (SELECT COALESCE(SUM(user_messages), 0) FROM ({queries["daily"]})) 
+            WHERE name = 'user_messages'
+        ''')
+        conn.execute(f'INSERT INTO rollup_faq_hits (matched_faq, hits) {queries["faq_hits"]}')
+        conn.execute(f'''
+            INSERT INTO rollup_daily (day, user_messages, bot_messages) 
+            SELECT day, user_messages, bot_messages FROM ({queries["daily"]}) WHERE true 
+            ON CONFLICT (day) DO UPDATE SET user_messages = excluded.user_messages, 
+                                            bot_messages = excluded.bot_messages
+        ''')
+    
+    def verify_rollups(self) -> List[str]:
+        """Differences between the rollup tables and a recount of raw rows"""
+        self.flush()
+        with self.connection() as conn:
+            expected = self._raw_rollups(conn)
+            stored = self._stored_rollups(conn)
+        
+        problems = []
+        for section in ('totals', 'faq_hits', 'daily'):
+            for key in sorted(set(expected[section]) | set(stored[section])):
+                want, have = expected[section].get(key), stored[section].get(key)
+                if want != have:
+                    problems.append(f"{section}[{key}]: rollup has {have}, raw rows give {want}")
+        return problems
+    
+    def rebuild_rollups(self):
+        """Recompute the rollups from raw rows in one transaction"""
+        self.flush()
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self.rebuild_rollup_tables(conn)
+            conn.commit()
+    
+    # Sessions (or analytics rows) moved per write transaction
+    ARCHIVE_BATCH = 500
+    
+    def archive_old_rows(self, days: float = RETENTION_DAYS) -> Dict:
+        """Move sessions idle for ``days`` and older analytics events to the archive
+        
+        Sessions move whole so their history can be read back in order. Each
+        batch is written to the archive files while holding the write lock
+        and deleted from the hot tables in the same transaction, so a crash
+        can leave at most an unreferenced gzip member behind, never lose
+        rows. The rollups keep counting archived rows; the archive tallies
+        let ``rebuild_rollups`` do the same.
+        """
+        self.flush()
+        stats = Counter()
+        with self.connection() as conn:
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{days} days',)).fetchone()[0]
+            idle = [row[0] for row in conn.execute('''
+                SELECT session_id FROM conversations GROUP BY session_id HAVING MAX(timestamp) < ?
+            ''', (cutoff,))]
+            for start in range(0, len(idle), self.ARCHIVE_BATCH):
+                batch = idle[start:start + self.ARCHIVE_BATCH]
+                conn.execute('BEGIN IMMEDIATE')
+                # A session may have come back to life since the scan
+                marks = ','.join('?' * len(batch))
+                still_idle = [row[0] for row in conn.execute(f'''
+                    SELECT session_id FROM conversations WHERE session_id IN ({marks}) 
+                    GROUP BY session_id HAVING MAX(timestamp) < ?
+                ''', batch + [cutoff])]
+                if still_idle:
+                    self._archive_sessions(conn, still_idle, stats)
+                conn.commit()
+            
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                rows = [dict(row) for row in conn.execute(
+                    'SELECT * FROM analytics WHERE timestamp < ? ORDER BY id LIMIT ?', (cutoff, self.ARCHIVE_BATCH))]
+                if not rows:
+                    conn.rollback()
+                    break
+                for month, month_rows in itertools.groupby(
+                        sorted(rows, key=lambda row: row['timestamp']), key=lambda row: row['timestamp'][:7]):
+                    self.archive.append('analytics', month, list(month_rows))
+                    stats['archive_members'] += 1
+                conn.executemany('DELETE FROM analytics WHERE id = ?', [(row['id'],) for row in rows])
+                # The typed copies leave with them; the archive keeps the JSON
+                conn.executemany('DELETE FROM message_events WHERE timestamp = ? AND id = ?',
+                                 [(row['timestamp'], row['id']) for row in rows])
+                conn.commit()
+                stats['analytics_rows'] += len(rows)
+        
+        return {"cutoff": cutoff, "archive_dir": self.archive.directory,
+                **{name: stats[name] for name in ('sessions', 'conversation_rows', 'analytics_rows', 'archive_members')}}
+    
+    def _archive_sessions(self, conn, session_ids: List[str], stats: Counter):
+        marks = ','.join('?' * len(session_ids))
+        rows = [dict(row) for row in conn.execute(f'''
+            SELECT * FROM conversation_history WHERE session_id IN ({marks}) 
+            ORDER BY substr(timestamp, 1, 7), session_id, timestamp, id
+        ''', session_ids)]
+        
+        members = []
+        for month, month_rows in itertools.groupby(rows, key=lambda row: row['timestamp'][:7]):
+            member: List[Dict] = []
+            for _, session_rows in itertools.groupby(month_rows, key=lambda row: row['session_id']):
+                session_rows = list(session_rows)
+                if member and len(member) + len(session_rows) > self.archive.MEMBER_ROWS:
+                    members.append((month, member))
+                    member = []
+                member.extend(session_rows)
+            members.append((month, member))
+        
+        for month, member in members:
+            location = self.archive.append('conversations', month, member)
+            sessions: Dict[str, List] = {}
+            for row in member:
+                first_seen_and_count = sessions.setdefault(row['session_id'], [row['timestamp'], 0])
+                first_seen_and_count[1] += 1
+            conn.executemany('''
+                INSERT INTO archive_sessions 
+                    (session_id, first_seen, messages, archive_file, member_offset, member_length) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(session_id, first_seen, count) + location for session_id, (first_seen, count) in sessions.items()])
+        
+        daily = Counter()
+        faq_hits = Counter()
+        for row in rows:
+            daily[row['timestamp'][:10], row['message_type'] == 'user'] += 1
+            if row['matched_faq'] is not None:
+                faq_hits[row['matched_faq']] += 1
+        conn.executemany('''
+            INSERT INTO archive_daily (day, user_messages, bot_messages) VALUES (?, ?, ?) 
+            ON CONFLICT (day) DO UPDATE SET user_messages = user_messages + excluded.user_messages, 
+                                            bot_messages = bot_messages + excluded.bot_messages
+        ''', [(day, count if is_user else 0, 0 if is_user else count) for (day, is_user), count in daily.items()])
+        conn.executemany('''
+            INSERT INTO archive_faq_hits (matched_faq, hits) VALUES (?, ?) 
+            ON CONFLICT (matched_faq) DO UPDATE SET hits = hits + excluded.hits
+        ''', list(faq_hits.items()))
+        conn.executemany('DELETE FROM conversations WHERE id = ?', [(row['id'],) for row in rows])
+        
+        stats['sessions'] += len(session_ids)
+        stats['conversation_rows'] += len(rows)
+        stats['archive_members'] += len(members)
+    
+    # Tables whose AUTOINCREMENT ids ShardedDatabase keeps disjoint
+    ID_TABLES = ('conversations', 'analytics', 'feedback')
+    
+    def reserve_ids(self, floor: int):
+        """Make new ids in the row tables start above ``floor``"""
+        with self.connection() as conn:
+            current = dict(conn.execute('SELECT name, seq FROM sqlite_sequence').fetchall())
+            if all(current.get(table, 0) >= floor for table in self.ID_TABLES):
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            for table in self.ID_TABLES:
+                conn.execute('DELETE FROM sqlite_sequence WHERE name = ? AND seq < ?', (table, floor))
+                conn.execute('INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS '
+                             '(SELECT 1 FROM sqlite_sequence WHERE name = ?)', (table, floor, table))
+            conn.commit()
+    
+    def rollup_snapshot(self) -> Dict:
+        """Every stored rollup row, for merging across shards"""
+        self.flush()
+        with self.connection() as conn:
+            return self._stored_rollups(conn)
+    
+    def compact(self, pages: int = 0) -> Dict:
+        """Hand free pages back to the filesystem with incremental vacuum
+        
+        ``pages`` caps the pages released per call (0 releases all). A
+        database created before incremental auto-vacuum was enabled is
+        converted once with a full VACUUM.
+        """
+        self.flush()
+        size_before = os.path.getsize(self.db_path)
+        with self.connection() as conn:
+            converted = conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+            if converted:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            free_before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # execute() steps the pragma once, releasing a single page; the
+            # script interface runs it to completion
+            conn.executescript(f'PRAGMA incremental_vacuum({pages})' if pages else 'PRAGMA incremental_vacuum')
+            free_after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return {
+            "converted_to_incremental": converted,
+            "pages_released": free_before - free_after,
+            "bytes_before": size_before,
+            "bytes_after": os.path.getsize(self.db_path),
+        }
+
+
+def shard_index(session_id: str, shards: int) -> int:
+    """Shard holding ``session_id``; stable across processes and restarts"""
+    return zlib.crc32(session_id.encode('utf-8')) % shards
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{n}of{shards}{ext or '.db'}" for n in range(shards)]
+
+
+class ShardedDatabase:
+    """``DatabaseManager`` interface over N SQLite files split by session
+    
+    Everything about one session (messages, events, feedback, archive
+    bookkeeping) lives in the shard ``shard_index`` picks, so per-session
+    reads and writes touch a single file and writers of different shards
+    never contend. Reports fan out to every shard and merge. Each shard
+    allocates ids from its own ``SHARD_ID_SPAN`` range, so ids stay unique
+    across shards. Write statements carry the session id as their first
+    parameter, which is how ``write_many`` routes them. Shards share one
+    archive directory.
+    """
+    
+    SHARD_ID_SPAN = 1 << 40
+    EXPORT_COLUMNS = DatabaseManager.EXPORT_COLUMNS
+    INSERT_MESSAGE = DatabaseManager.INSERT_MESSAGE
+    INSERT_ANALYTICS = DatabaseManager.INSERT_ANALYTICS
+    
+    def __init__(self, db_path=None, shards: int = DB_SHARDS, **options):
+        if shards < 2:
+            raise ValueError("a sharded database needs at least 2 shards")
+        self.db_path = db_path or os.environ.get('CHATBOT_DB_PATH', 'chatbot.db')
+        options.setdefault('archive_dir', ARCHIVE_DIR or os.path.join(
+            os.path.dirname(os.path.abspath(self.db_path)), 'archive'))
+        self.shards = [DatabaseManager(path, id_floor=n * self.SHARD_ID_SPAN, **options)
+                       for n, path in enumerate(shard_paths(self.db_path, shards))]
+    
+    def shard_for(self, session_id: str) -> DatabaseManager:
+        return self.shards[shard_index(session_id, len(self.shards))]
+    
+    @property
+    def schema_version(self) -> int:
+        return min(shard.schema_version for shard in self.shards)
+    
+    def initialize(self):
+        for shard in self.shards:
+            shard.initialize()
+    
+    def init_database(self):
+        for shard in self.shards:
+            shard.init_database()
+    
+    def flush(self):
+        for shard in self.shards:
+            shard.flush()
+    
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+    
+    def stats(self) -> Dict:
+        per_shard = [shard.stats() for shard in self.shards]
+        return {
+            "write_mode": per_shard[0]["write_mode"],
+            "pool_size": per_shard[0]["pool_size"],
+            "schema_version": min(stats["schema_version"] for stats in per_shard),
+            "shards": per_shard,
+        }
+    
+    def message_writes(self, session_id: str, *args, **kwargs) -> List[Tuple[str, Tuple]]:
+        # Response ids belong to the session's shard
+        return self.shard_for(session_id).message_writes(session_id, *args, **kwargs)
+    
+    analytics_write = DatabaseManager.analytics_write
+    
+    def write_many(self, writes: List[Tuple[str, Tuple]]):
+        """Route each write to its session's shard; one transaction per shard"""
+        by_shard: Dict[int, List[Tuple[str, Tuple]]] = defaultdict(list)
+        for sql, params in writes:
+            by_shard[shard_index(params[0], len(self.shards))].append((sql, params))
+        for n, shard_writes in by_shard.items():
+            self.shards[n].write_many(shard_writes)
+    
+    def write_groups(self, groups: List[List[Tuple[str, Tuple]]]) -> List[Optional[Exception]]:
+        """``DatabaseManager.write_groups`` per shard; each group belongs to one session"""
+        by_shard: Dict[int, List[int]] = defaultdict(list)
+        for position, group in enumerate(groups):
+            if group:
+                by_shard[shard_index(group[0][1][0], len(self.shards))].append(position)
+        errors: List[Optional[Exception]] = [None] * len(groups)
+        for n, positions in by_shard.items():
+            for position, error in zip(positions, self.shards[n].write_groups([groups[p] for p in positions])):
+                errors[position] = error
+        return errors
+    
+    def save_message(self, session_id: str, *args, **kwargs):
+        return self.shard_for(session_id).save_message(session_id, *args, **kwargs)
+    
+    def save_analytics(self, session_id: str, *args, **kwargs):
+        return self.shard_for(session_id).save_analytics(session_id, *args, **kwargs)
+    
+    def save_feedback(self, session_id: str, *args, **kwargs):
+        return self.shard_for(session_id).save_feedback(session_id, *args, **kwargs)
+    
+    def get_conversation(self, session_id: str, *args, **kwargs) -> List[Dict]:
+        return self.shard_for(session_id).get_conversation(session_id, *args, **kwargs)
+    
+    def iter_conversation(self, session_id: str, *args, **kwargs):
+        return self.shard_for(session_id).iter_conversation(session_id, *args, **kwargs)
+    
+    def export_rows(self, table: str, since: str = None, until: str = None, session_id: str = None, # type: ignore
+                    event_type: str = None, after_id: int = None, chunk_size: int = 500): # type: ignore
+        """``DatabaseManager.export_rows`` merged across shards in id order
+        
+        A single ``after_id`` cannot resume a merge of independent id
+        ranges, so it needs ``session_id``; incremental consumers of a
+        sharded database resume with ``since`` and drop ids already seen.
+        """
+        if session_id is not None:
+            return self.shard_for(session_id).export_rows(table, since, until, session_id, event_type,
+                                                          after_id, chunk_size)
+        if after_id is not None:
+            raise ValueError("after_id needs session_id on a sharded database; resume with since instead")
+        streams = [shard.export_rows(table, since, until, None, event_type, None, chunk_size)
+                   for shard in self.shards]
+        return heapq.merge(*streams, key=lambda row: row['id'])
+    
+    @metrics.timed('db.get_analytics_summary')
+    def get_analytics_summary(self) -> Dict:
+        """``DatabaseManager.get_analytics_summary`` over the summed shard rollups"""
+        totals, faq_hits, daily = Counter(), Counter(), defaultdict(lambda: [0, 0, 0])
+        for shard in self.shards:
+            snapshot = shard.rollup_snapshot()
+            totals.update(snapshot["totals"])
+            faq_hits.update(snapshot["faq_hits"])
+            for day, counts in snapshot["daily"].items():
+                daily[day] = [a + b for a, b in zip(daily[day], counts)]
+        top_faqs = sorted(faq_hits.items(), key=lambda item: (-item[1], item[0]))[:5]
+        return {
+            "total_sessions": totals.get('sessions', 0),
+            "total_messages": totals.get('user_messages', 0),
+            "top_faqs": [{"matched_faq": faq, "count": hits} for faq, hits in top_faqs],
+            "daily": [{"day": day, "sessions": sessions, "user_messages": user_messages,
+                       "bot_messages": bot_messages}
+                      for day, (sessions, user_messages, bot_messages) in sorted(daily.items(), reverse=True)[:30]]
+        }
+    
+    def intent_distribution(self, since: str, until: str, bucket: str = 'day') -> List[Dict]:
+        series: Dict[str, Dict] = {}
+        for shard in self.shards:
+            for entry in shard.intent_distribution(since, until, bucket):
+                merged = series.setdefault(entry["bucket"], {"bucket": entry["bucket"], "total": 0, "intents": Counter()})
+                merged["total"] += entry["total"]
+                merged["intents"].update(entry["intents"])
+        return [dict(entry, intents=dict(sorted(entry["intents"].items()))) for _, entry in sorted(series.items())]
+    
+    def confidence_histogram(self, since: str, until: str, bins: int = 10) -> List[Dict]:
+        histograms = [shard.confidence_histogram(since, until, bins) for shard in self.shards]
+        return [dict(bins_[0], count=sum(entry["count"] for entry in bins_)) for bins_ in zip(*histograms)]
+    
+    def fallback_rate(self, since: str, until: str, bucket: str = 'day') -> List[Dict]:
+        totals: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        for shard in self.shards:
+            for entry in shard.fallback_rate(since, until, bucket):
+                totals[entry["bucket"]][0] += entry["messages"]
+                totals[entry["bucket"]][1] += entry["fallbacks"]
+        return [{"bucket": period, "messages": messages, "fallbacks": fallbacks,
+                 "rate": round(fallbacks / messages, 4)} for period, (messages, fallbacks) in sorted(totals.items())]
+    
+    def verify_rollups(self) -> List[str]:
+        return [f"shard {n}: {problem}" for n, shard in enumerate(self.shards) for problem in shard.verify_rollups()]
+    
+    def rebuild_rollups(self):
+        for shard in self.shards:
+            shard.rebuild_rollups()
+    
+    def archive_old_rows(self, days: float = RETENTION_DAYS) -> Dict:
+        results = [shard.archive_old_rows(days) for shard in self.shards]
+        merged = dict(results[0])
+        for name in ('sessions', 'conversation_rows', 'analytics_rows', 'archive_members'):
+            merged[name] = sum(result[name] for result in results)
+        return merged
+    
+    def compact(self, pages: int = 0) -> Dict:
+        results = [shard.compact(pages) for shard in self.shards]
+        return {
+            "converted_to_incremental": any(result["converted_to_incremental"] for result in results),
+            **{name: sum(result[name] for result in results)
+               for name in ('pages_released', 'bytes_before', 'bytes_after')}
+        }
+
+
+def open_database(db_path: str = None, shards: int = None, **options): # type: ignore
+    """A ``DatabaseManager``, or a ``ShardedDatabase`` when ``shards`` (default CHATBOT_DB_SHARDS) > 1"""
+    shards = DB_SHARDS if shards is None else shards
+    if shards > 1:
+        return ShardedDatabase(db_path, shards, **options)
+    return DatabaseManager(db_path, **options)
+
+
+# Row tables copied by reshard(), session-routed, with their columns
+RESHARD_TABLES = {
+    'conversations': DatabaseManager.EXPORT_COLUMNS['conversations'],
+    'analytics': DatabaseManager.EXPORT_COLUMNS['analytics'],
+    'feedback': DatabaseManager.EXPORT_COLUMNS['feedback'],
+    'archive_sessions': ('session_id', 'first_seen', 'messages', 'archive_file', 'member_offset',
+                         'member_length', 'archived_at'),
+}
+
+
+def reshard(source, target, chunk_size: int = 2000) -> Dict[str, int]:
+    """Copy every session of ``source`` into ``target`` (either may be sharded)
+    
+    Rows keep their ids and timestamps; the archive tallies land in the
+    first target shard, and rollups are rebuilt per shard afterwards.
+    Archive files are shared by reference, so ``target`` must use the same
+    archive directory. ``target`` must be empty.
+    """
+    sources = getattr(source, 'shards', [source])
+    targets = getattr(target, 'shards', [target])
+    source.flush()
+    for shard in targets:
+        with shard.connection() as conn:
+            if any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in RESHARD_TABLES):
+                raise ValueError(f"{shard.db_path} already holds data")
+    
+    copied = Counter()
+    max_id = 0
+    for table, columns in RESHARD_TABLES.items():
+        conversations = table == 'conversations'
+        # Bot text is read back whole and re-stored in the target shard's responses table
+        source_table, insert_columns = ('conversation_history', columns + ('response_id',)) if conversations \
+            else (table, columns)
+        insert = (f"INSERT INTO {table} ({', '.join(insert_columns)}) "
+                  f"VALUES ({', '.join('?' * len(insert_columns))})")
+        for shard in sources:
+            rows = shard._stream_rows(f"SELECT {', '.join(columns)} FROM {source_table}", [], chunk_size)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                by_target: Dict[int, List[Tuple]] = defaultdict(list)
+                for row in chunk:
+                    n = shard_index(row['session_id'], len(targets))
+                    values = list(row.values())
+                    if conversations:
+                        values.append(None)
+                        if DatabaseManager.is_bot_turn(row['message_type'], row['message'], row['response']):
+                            values[3:5] = ['', None]
+                            values[-1] = targets[n].response_id(row['response'])
+                    by_target[n].append(tuple(values))
+                    max_id = max(max_id, row.get('id', 0))
+                for n, target_rows in by_target.items():
+                    with targets[n].connection() as conn:
+                        conn.executemany(insert, target_rows)
+                        conn.commit()
+                copied[table] += len(chunk)
+    
+    with targets[0].connection() as conn:
+        for shard in sources:
+            with shard.connection() as source_conn:
+                daily = source_conn.execute('SELECT day, user_messages, bot_messages FROM archive_daily').fetchall()
+                faq_hits = source_conn.execute('SELECT matched_faq, hits FROM archive_faq_hits').fetchall()
+            conn.executemany('''
+                INSERT INTO archive_daily (day, user_messages, bot_messages) VALUES (?, ?, ?) 
+                ON CONFLICT (day) DO UPDATE SET user_messages = user_messages + excluded.user_messages, 
+                                                bot_messages = bot_messages + excluded.bot_messages
+            ''', [tuple(row) for row in daily])
+            conn.executemany('''
+                INSERT INTO archive_faq_hits (matched_faq, hits) VALUES (?, ?) 
+                ON CONFLICT (matched_faq) DO UPDATE SET hits = hits + excluded.hits
+            ''', [tuple(row) for row in faq_hits])
+        conn.commit()
+    
+    # New ids start above every copied one, each shard in its own range
+    span = ShardedDatabase.SHARD_ID_SPAN
+    first_free_range = 0 if max_id < span else max_id // span + 1
+    for n, shard in enumerate(targets):
+        shard.rebuild_rollups()
+        if len(targets) > 1:
+            shard.reserve_ids(max(max_id, (first_free_range + n) * span))
+    return dict(copied)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    ``search`` finds every keyword contained in a text in a single pass, so the
+    cost depends on the text length rather than on the number of keywords.
+    """
+
+    def __init__(self, patterns):
+        self.patterns: List[str] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.outputs: List[List[int]] = [[]]
+
+        seen = set()
+        for pattern in patterns:
+            if pattern in seen:
+                continue
+            seen.add(pattern)
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append(len(self.patterns))
+            self.patterns.append(pattern)
+
+        # Breadth-first failure links; outputs are merged along them so a
+        # state reports every pattern that ends at it
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def search(self, text: str) -> set:
+        """Every pattern that occurs as a substring of ``text``"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        found = set(outputs[0])
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return {self.patterns[pattern_id] for pattern_id in found}
+
+
+class NLPProcessor:
+    """Enhanced natural language processing"""
+    
+    INTENTS = {
+        "greeting": ["hello", "hi", "hey", "good morning", "good afternoon"],
+        "seo": ["seo", "search engine", "ranking", "google", "organic"],
+        "social_media": ["social media", "instagram", "facebook", "linkedin", "twitter"],
+        "paid_ads": ["ads", "advertising", "google ads", "facebook ads", "paid"],
+        "pricing": ["price", "cost", "how much", "budget"],
+        "getting_started": ["get started", "begin", "start", "how to start"],
+        "branding": ["brand", "identity", "logo", "branding"],
+        "results": ["results", "roi", "timeline", "how soon"],
+        "contact": ["contact", "reach", "email", "phone", "call", "talk", "speak"]
+    }
+    
+    # Keyword -> position of the first intent that lists it
+    INTENT_RANKS: Dict[str, int] = {}
+    for _rank, _keywords in enumerate(INTENTS.values()):
+        for _keyword in _keywords:
+            INTENT_RANKS.setdefault(_keyword, _rank)
+    INTENT_NAMES = list(INTENTS)
+    del _rank, _keywords, _keyword
+    
+    _intent_automaton: Optional[KeywordAutomaton] = None
+    
+    BUDGET_PATTERN = re.compile(r'₹?\s*(\d+(?:,\d+)*(?:k|K|lakh|lakhs?)?)')
+    EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+    PHONE_PATTERN = re.compile(r'\b(?:\+91|91)?[\s-]?[6-9]\d{9}\b')
+    
+    @staticmethod
+    def similarity_score(str1: str, str2: str) -> float:
+        """Calculate similarity between two strings"""
+        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+    
+    @classmethod
+    def intent_automaton(cls) -> KeywordAutomaton:
+        """Automaton over the intent keywords alone, built on first use"""
+        if cls._intent_automaton is None:
+            cls._intent_automaton = KeywordAutomaton(cls.INTENT_RANKS)
+        return cls._intent_automaton
+    
+    @classmethod
+    def extract_intent(cls, message: str, hits: Optional[set] = None) -> str:
+        """Extract user intent from message
+        
+        ``hits`` is the set of keywords found in the lowercased message by a
+        shared ``KeywordAutomaton`` pass; without it the intent keywords are
+        scanned on their own.
+        """
+        if hits is None:
+            hits = cls.intent_automaton().search(message.lower())
+        
+        ranks = [cls.INTENT_RANKS[keyword] for keyword in hits if keyword in cls.INTENT_RANKS]
+        if ranks:
+            return cls.INTENT_NAMES[min(ranks)]
+        
+        return "general_inquiry"
+    
+    @classmethod
+    def extract_entities(cls, message: str) -> Dict:
+        """Extract entities like budget, timeline, etc."""
+        entities = {}
+        
+        budget_match = cls.BUDGET_PATTERN.search(message)
+        if budget_match:
+            entities['budget'] = budget_match.group(1)
+        
+        email_match = cls.EMAIL_PATTERN.search(message)
+        if email_match:
+            entities['email'] = email_match.group()
+        
+        phone_match = cls.PHONE_PATTERN.search(message)
+        if phone_match:
+            entities['phone'] = phone_match.group()
+        
+        return entities
+
+
+class MessageAnalysis:
+    """One user message, normalized and tokenized once for every NLP stage.
+
+    Cache lookup, keyword scanning, FAQ scoring, vector matching, intent and
+    entity extraction all read the views below instead of lowercasing and
+    splitting the raw text again. Each view is computed on first use.
+    """
+
+    def __init__(self, message: str, index: Optional['FAQIndex'] = None, hits: Optional[set] = None):
+        self.message = message
+        self.normalized = message.lower().strip()
+        self.index = index
+        if hits is not None:
+            self.__dict__['hits'] = hits
+
+    @cached_property
+    def words(self) -> List[str]:
+        """Whitespace-separated words of the normalized text"""
+        return self.normalized.split()
+
+    @cached_property
+    def exact_key(self) -> str:
+        """Normalized text with inner whitespace collapsed, for exact lookups"""
+        return " ".join(self.words)
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        """Alphanumeric tokens without stop words, as used by ``VectorMatcher``"""
+        stop_words = VectorMatcher.STOP_WORDS
+        return [t for t in VectorMatcher.TOKEN_PATTERN.findall(self.normalized) if t not in stop_words]
+
+    def word_trigrams(self) -> Iterator[Tuple[str, set]]:
+        """Character trigrams of every word long enough for partial matching
+        
+        Generated one word at a time rather than cached: scoring reads each
+        set once, and holding them all is most of a message's peak memory.
+        """
+        return ((word, FAQIndex._trigrams(word)) for word in self.words if len(word) >= 3)
+
+    @cached_property
+    def hits(self) -> set:
+        """Keywords found by one automaton pass over the normalized text"""
+        if self.index is None:
+            return NLPProcessor.intent_automaton().search(self.normalized)
+        return self.index.automaton.search(self.normalized)
+
+    @cached_property
+    def intent(self) -> str:
+        return NLPProcessor.extract_intent(self.normalized, self.hits)
+
+    @cached_property
+    def entities(self) -> Dict:
+        return NLPProcessor.extract_entities(self.message)
+
+
+class FAQIndex:
+    """Compiled keyword index over the FAQ corpus.
+
+    Built once from ``load_faqs()``. Scores exactly like the linear scan in
+    ``BrandsetuChatbot._find_best_match_scan`` but only visits FAQs that own a
+    keyword related to the message:
+
+    * keywords contained in the message come from one ``KeywordAutomaton``
+      pass, which also carries the intent keywords so ``extract_intent`` can
+      reuse the same hits;
+    * keywords containing the message (or one of its words) are found by
+      intersecting character-trigram postings and verifying the candidates;
+    * a message word that matches nothing is looked up, with a bounded edit
+      distance, among the words of the keywords (through a padded-trigram
+      index, so only words sharing trigrams are compared) and the keywords
+      holding the nearest words score ``fuzzy_weight`` points.
+    """
+
+    # Shorter words are too easily one edit away from an unrelated keyword
+    FUZZY_MIN_LENGTH = 5
+
+    def __init__(self, faqs: Dict, extra_keywords=(), fuzzy_weight: int = None): # type: ignore
+        self.faqs = faqs
+        self.faq_keys: List[str] = list(faqs)
+
+        # Per-keyword metadata, one entry per distinct lowercased keyword
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.term_bonus: List[int] = []
+        self.postings: List[List[int]] = []  # term id -> FAQ ordinals (with repeats)
+        self.trigrams: Dict[str, set] = defaultdict(set)  # trigram -> term ids
+
+        for ordinal, faq_data in enumerate(faqs.values()):
+            for keyword in faq_data["keywords"]:
+                keyword_lower = keyword.lower()
+                term_id = self.term_ids.get(keyword_lower)
+                if term_id is None:
+                    term_id = len(self.terms)
+                    self.term_ids[keyword_lower] = term_id
+                    self.terms.append(keyword_lower)
+                    self.term_bonus.append(20 + len(keyword.split()) * 5)
+                    self.postings.append([])
+                    for trigram in self._trigrams(keyword_lower):
+                        self.trigrams[trigram].add(term_id)
+                self.postings[term_id].append(ordinal)
+
+        self.trigrams = dict(self.trigrams)
+        self.max_term_length = max(map(len, self.terms), default=0)
+        self.automaton = KeywordAutomaton(self.terms + list(extra_keywords))
+
+        # Keyword words for the fuzzy layer: word -> term ids, padded trigram -> word ids
+        self.fuzzy_weight = FUZZY_WEIGHT if fuzzy_weight is None else fuzzy_weight
+        self.word_terms: Dict[str, List[int]] = defaultdict(list)
+        self.word_trigrams: Dict[str, List[int]] = defaultdict(list)
+        if self.fuzzy_weight:
+            for term_id, term in enumerate(self.terms):
+                for word in dict.fromkeys(term.split()):
+                    if len(word) >= 3:
+                        self.word_terms[word].append(term_id)
+            for word_id, word in enumerate(self.word_terms):
+                for trigram in self._padded_trigrams(word):
+                    self.word_trigrams[trigram].append(word_id)
+        self.word_terms = dict(self.word_terms)
+        self.word_trigrams = dict(self.word_trigrams)
+        self.words: List[str] = list(self.word_terms)
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def _padded_trigrams(word: str) -> set:
+        """Trigrams with word boundaries, so edits at either end still share some"""
+        return FAQIndex._trigrams(f"  {word} ")
+
+    @staticmethod
+    def _edit_distance(a: str, b: str, limit: int) -> int:
+        """Levenshtein distance counting a transposition as one edit, capped at ``limit + 1``"""
+        before_previous: List[int] = []
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                                 previous[j - 1] + (a[i - 1] != b[j - 1]))
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    current[j] = min(current[j], before_previous[j - 2] + 1)
+            if min(current) > limit:
+                return limit + 1
+            before_previous, previous = previous, current
+        return min(previous[-1], limit + 1)
+
+    def fuzzy_words(self, word: str) -> List[str]:
+        """Keyword words nearest to ``word`` within its edit budget"""
+        if len(word) < self.FUZZY_MIN_LENGTH or not self.word_trigrams:
+            return []
+        limit = 1 if len(word) < 8 else 2
+        word_trigrams = self._padded_trigrams(word)
+        shared = Counter()
+        for trigram in word_trigrams:
+            shared.update(self.word_trigrams.get(trigram, ()))
+        # Every edit touches at most four padded trigrams
+        needed = max(1, len(word_trigrams) - 4 * limit)
+
+        best, nearest = limit + 1, []
+        for word_id, count in shared.items():
+            candidate = self.words[word_id]
+            if count < needed or abs(len(candidate) - len(word)) > limit:
+                continue
+            distance = self._edit_distance(word, candidate, limit)
+            if distance > limit:
+                continue
+            if distance < best:
+                best, nearest = distance, [candidate]
+            elif distance == best:
+                nearest.append(candidate)
+        return sorted(nearest)
+
+    def scan(self, user_message: str) -> set:
+        """Keywords (FAQ and extra) contained in the normalized message"""
+        return self.automaton.search(user_message.lower().strip())
+
+    def analyze(self, user_message: str, hits: Optional[set] = None) -> MessageAnalysis:
+        return MessageAnalysis(user_message, self, hits)
+
+    def _terms_containing(self, text: str, text_trigrams: Optional[set] = None) -> List[int]:
+        """Ids of keywords that contain ``text`` (at least 3 characters)"""
+        if len(text) > self.max_term_length:
+            return []
+        postings = []
+        for trigram in text_trigrams or self._trigrams(text):
+            term_ids = self.trigrams.get(trigram)
+            if not term_ids:
+                return []
+            postings.append(term_ids)
+        postings.sort(key=len)
+        candidates = set.intersection(*postings)
+        return [term_id for term_id in candidates if text in self.terms[term_id]]
+
+    def score(self, analysis: MessageAnalysis) -> Dict[int, int]:
+        """Additive score per candidate FAQ ordinal"""
+        user_message_lower = analysis.normalized
+        scores: Dict[int, int] = defaultdict(int)
+
+        # Exact match / keyword contained in the message
+        contained = {self.term_ids[keyword] for keyword in analysis.hits if keyword in self.term_ids}
+        for term_id in contained:
+            points = 50 if self.terms[term_id] == user_message_lower else self.term_bonus[term_id]
+            for ordinal in self.postings[term_id]:
+                scores[ordinal] += points
+
+        # Keyword contains the message (for short queries like "seo")
+        if len(user_message_lower) >= 3:
+            for term_id in self._terms_containing(user_message_lower):
+                if term_id in contained:
+                    continue
+                for ordinal in self.postings[term_id]:
+                    scores[ordinal] += 15
+
+        # Partial word match; a word with none may be a typo of a keyword word
+        for word, word_trigrams in analysis.word_trigrams():
+            term_ids = self._terms_containing(word, word_trigrams)
+            for term_id in term_ids:
+                for ordinal in self.postings[term_id]:
+                    scores[ordinal] += 8
+            if not term_ids and self.fuzzy_weight:
+                fuzzy_terms = {term_id for near in self.fuzzy_words(word) for term_id in self.word_terms[near]}
+                for term_id in fuzzy_terms:
+                    for ordinal in self.postings[term_id]:
+                        scores[ordinal] += self.fuzzy_weight
+
+        return scores
+
+    def _rank(self, analysis: MessageAnalysis, k: int) -> List[Tuple[int, int]]:
+        scores = self.score(analysis)
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def rank(self, user_message: str, k: int = 3, hits: Optional[set] = None) -> List[Tuple[str, int]]:
+        """Top ``k`` (faq_key, score) pairs, ties broken by corpus order"""
+        ranked = self._rank(self.analyze(user_message, hits), k)
+        return [(self.faq_keys[ordinal], score) for ordinal, score in ranked]
+
+    def find_best_matches(self, analyses: List[MessageAnalysis]) -> List[Tuple[Optional[Dict], float, str]]:
+        matches = []
+        for analysis in analyses:
+            ranked = self._rank(analysis, 1)
+            if not ranked:
+                matches.append((None, 0.0, None))
+                continue
+            ordinal, best_score = ranked[0]
+            faq_key = self.faq_keys[ordinal]
+            matches.append((self.faqs[faq_key], min(best_score / 50, 1.0), faq_key))
+        return matches # type: ignore
+
+    def find_best_match(self, user_message: str, hits: Optional[set] = None) -> Tuple[Optional[Dict], float, str]:
+        """Same contract as ``BrandsetuChatbot.find_best_match``"""
+        return self.find_best_matches([self.analyze(user_message, hits)])[0]
+
+
+class VectorMatcher:
+    """Sparse TF-IDF / BM25 retrieval over FAQ keywords and canonical questions.
+
+    Each FAQ becomes a weighted row of a sparse FAQ x term matrix. With SciPy
+    the matrix is a ``csr_matrix`` and a batch of queries is scored with one
+    sparse product; without it the transposed matrix is kept as plain CSR
+    arrays (term -> FAQ postings) and the same product runs in Python.
+    Exposes the same ``rank`` / ``find_best_match`` interface as ``FAQIndex``.
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    STOP_WORDS = frozenset(
+        "a an and are as at be can do does for how i in is it me my of on or "
+        "the to we what when which will with you your".split()
+    )
+
+    def __init__(self, faqs: Dict, weighting: str = 'bm25', backend: str = 'auto',
+                 k1: float = 1.2, b: float = 0.75):
+        if weighting not in ('tfidf', 'bm25'):
+            raise ValueError(f"Unknown weighting '{weighting}'")
+        if backend not in ('auto', 'scipy', 'python'):
+            raise ValueError(f"Unknown vector backend '{backend}'")
+        sparse = vector_modules()[1] if backend != 'python' else None
+        if backend == 'scipy' and sparse is None:
+            raise ValueError("The scipy vector backend needs numpy and scipy installed")
+
+        self.faqs = faqs
+        self.faq_keys: List[str] = list(faqs)
+        self.weighting = weighting
+        self.backend = 'python' if backend == 'python' or sparse is None else 'scipy'
+
+        self.vocabulary: Dict[str, int] = {}
+        doc_counts = []
+        for faq_data in faqs.values():
+            text = " ".join(faq_data["keywords"] + [faq_data.get("question", "")])
+            counts = Counter()
+            for token in self.tokenize(text):
+                counts[self.vocabulary.setdefault(token, len(self.vocabulary))] += 1
+            doc_counts.append(counts)
+
+        n_docs = len(doc_counts)
+        document_frequency = Counter(term for counts in doc_counts for term in counts)
+        avg_length = sum(sum(c.values()) for c in doc_counts) / max(n_docs, 1)
+        self.idf = [0.0] * len(self.vocabulary)
+        for term, df in document_frequency.items():
+            if weighting == 'bm25':
+                self.idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            else:
+                self.idf[term] = math.log((1 + n_docs) / (1 + df)) + 1
+
+        rows = []
+        for counts in doc_counts:
+            length = sum(counts.values())
+            if weighting == 'bm25':
+                norm = k1 * (1 - b + b * length / avg_length) if avg_length else k1
+                row = {t: self.idf[t] * tf * (k1 + 1) / (tf + norm) for t, tf in counts.items()}
+            else:
+                row = {t: (1 + math.log(tf)) * self.idf[t] for t, tf in counts.items()}
+                l2 = math.sqrt(sum(w * w for w in row.values())) or 1.0
+                row = {t: w / l2 for t, w in row.items()}
+            rows.append(row)
+
+        # Best score any query can reach against a row; turns raw scores into
+        # a 0..1 confidence comparable with the additive matcher
+        if weighting == 'bm25':
+            self.max_scores = [sum(row.values()) or 1.0 for row in rows]
+        else:
+            self.max_scores = [1.0] * n_docs
+
+        # Term-major CSR arrays of the transpose: term -> (FAQ ordinal, weight)
+        postings = defaultdict(list)
+        for ordinal, row in enumerate(rows):
+            for term, weight in row.items():
+                postings[term].append((ordinal, weight))
+        self.indptr = [0]
+        self.indices: List[int] = []
+        self.data: List[float] = []
+        for term in range(len(self.vocabulary)):
+            for ordinal, weight in postings[term]:
+                self.indices.append(ordinal)
+                self.data.append(weight)
+            self.indptr.append(len(self.indices))
+
+        if self.backend == 'scipy':
+            self.matrix = sparse.csc_matrix(
+                (self.data, self.indices, self.indptr), shape=(n_docs, len(self.vocabulary))
+            ).tocsr()
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [t for t in cls.TOKEN_PATTERN.findall(text.lower()) if t not in cls.STOP_WORDS]
+
+    def query_vector(self, analysis: MessageAnalysis) -> Dict[int, float]:
+        """Sparse query weights over the vocabulary"""
+        vocabulary = self.vocabulary
+        counts = Counter(vocabulary[t] for t in analysis.tokens if t in vocabulary)
+        if self.weighting == 'bm25':
+            return {term: 1.0 for term in counts}
+        vector = {t: (1 + math.log(tf)) * self.idf[t] for t, tf in counts.items()}
+        l2 = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / l2 for t, w in vector.items()}
+
+    def rank_batch(self, user_messages: List[str], k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Top ``k`` (faq_key, score) pairs for each message"""
+        return [
+            [(self.faq_keys[ordinal], score) for ordinal, score in ranked]
+            for ranked in self._rank_ordinals([MessageAnalysis(m) for m in user_messages], k)
+        ]
+
+    def _rank_ordinals(self, analyses: List[MessageAnalysis], k: int) -> List[List[Tuple[int, float]]]:
+        vectors = [self.query_vector(analysis) for analysis in analyses]
+        if self.backend == 'scipy':
+            return self._rank_scipy(vectors, k)
+        return [self._rank_python(vector, k) for vector in vectors]
+
+    def _rank_python(self, vector: Dict[int, float], k: int) -> List[Tuple[int, float]]:
+        indptr, indices, data = self.indptr, self.indices, self.data
+        scores: Dict[int, float] = defaultdict(float)
+        for term, weight in vector.items():
+            for pos in range(indptr[term], indptr[term + 1]):
+                scores[indices[pos]] += weight * data[pos]
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _rank_scipy(self, vectors: List[Dict[int, float]], k: int) -> List[List[Tuple[int, float]]]:
+        np, sparse = vector_modules()
+        rows, cols, vals = [], [], []
+        for row, vector in enumerate(vectors):
+            for term, weight in vector.items():
+                rows.append(row)
+                cols.append(term)
+                vals.append(weight)
+        queries = sparse.csr_matrix((vals, (rows, cols)), shape=(len(vectors), len(self.vocabulary)))
+        scores = (queries @ self.matrix.T).tocsr()
+
+        ranked = []
+        for row in range(len(vectors)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            ordinals, values = scores.indices[start:end], scores.data[start:end]
+            keep = values > 0
+            ordinals, values = ordinals[keep], values[keep]
+            if len(values) > k:
+                cut = np.argpartition(-values, k - 1)[:k]
+                # Keep every FAQ tied with the k-th score so ties resolve by corpus order
+                threshold = values[cut].min()
+                keep = values >= threshold
+                ordinals, values = ordinals[keep], values[keep]
+            order = np.lexsort((ordinals, -values))[:k]
+            ranked.append([(int(ordinals[i]), float(values[i])) for i in order])
+        return ranked
+
+    def rank(self, user_message: str, k: int = 3, hits: Optional[set] = None) -> List[Tuple[str, float]]:
+        return self.rank_batch([user_message], k)[0]
+
+    def find_best_match(self, user_message: str, hits: Optional[set] = None) -> Tuple[Optional[Dict], float, str]:
+        """Same contract as ``BrandsetuChatbot.find_best_match``"""
+        return self.find_best_matches([MessageAnalysis(user_message)])[0]
+
+    def find_best_matches(self, analyses: List[MessageAnalysis]) -> List[Tuple[Optional[Dict], float, str]]:
+        """Best match for every message from one batched product"""
+        matches = []
+        for ranked in self._rank_ordinals(analyses, 1):
+            if not ranked:
+                matches.append((None, 0.0, None))
+                continue
+            ordinal, best_score = ranked[0]
+            faq_key = self.faq_keys[ordinal]
+            matches.append((self.faqs[faq_key], min(best_score / self.max_scores[ordinal], 1.0), faq_key))
+        return matches # type: ignore
+
+
+def approximate_size(root) -> int:
+    """Bytes held by an object graph, each object counted once
+
+    Walks containers and instance attributes; NumPy arrays report their own
+    buffers. Classes, functions, modules and compiled patterns are shared
+    rather than owned, so they are skipped.
+    """
+    shared = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+              types.MethodType, re.Pattern)
+    # Arrays can only exist once something has imported numpy
+    numpy = sys.modules.get('numpy')
+    seen = set()
+    stack = [root]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, shared):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif numpy is not None and isinstance(obj, numpy.ndarray):
+            if obj.base is not None:  # a view; the buffer belongs to its base
+                stack.append(obj.base)
+        elif hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+    return total
+
+
+class FAQCorpus:
+    """Immutable snapshot of the FAQ corpus and the structures compiled from it.
+
+    A reload builds a complete new snapshot and swaps the reference, so a
+    request that grabbed the previous one keeps a consistent view.
+    """
+
+    MATCHERS = ('additive', 'tfidf', 'bm25')
+
+    def __init__(self, faqs: Dict, version: str, matcher: str = None): # type: ignore
+        started = time.perf_counter()
+        self.faqs = faqs
+        self.version = version
+        # The keyword index is always built: its automaton drives intent extraction
+        self.index = FAQIndex(faqs, NLPProcessor.INTENT_RANKS)
+        self.matcher_name = matcher or MATCHER
+        if self.matcher_name == 'additive':
+            self.matcher = self.index
+        else:
+            self.matcher = VectorMatcher(faqs, self.matcher_name, VECTOR_BACKEND)
+        self.exact = self._exact_matches(faqs)
+        self.build_ms = (time.perf_counter() - started) * 1000
+        self.loaded_at = datetime.now().isoformat()
+        self.source = 'compiled'
+
+    @staticmethod
+    def _exact_matches(faqs: Dict) -> Dict[str, str]:
+        """Normalized text -> FAQ key for messages answered without scoring
+
+        Canonical questions come first; option buttons repeat the question of
+        the FAQ they lead to, so a clicked option always lands there. Then
+        every keyword that a single FAQ owns. A keyword shared by several
+        FAQs stays with the matcher to break the tie.
+        """
+        def normalize(text: str) -> str:
+            return " ".join(text.lower().split())
+
+        exact: Dict[str, str] = {}
+        for faq_key, faq_data in faqs.items():
+            question = faq_data.get("question")
+            if isinstance(question, str) and normalize(question):
+                exact.setdefault(normalize(question), faq_key)
+
+        owners: Dict[str, set] = defaultdict(set)
+        for faq_key, faq_data in faqs.items():
+            for keyword in faq_data["keywords"]:
+                owners[normalize(keyword)].add(faq_key)
+        for keyword, keys in owners.items():
+            if keyword and len(keys) == 1:
+                exact.setdefault(keyword, next(iter(keys)))
+        return exact
+
+    def find_best_matches(self, analyses: List[MessageAnalysis]) -> List[Tuple[Optional[Dict], float, str]]:
+        """Exact questions, options and keywords by lookup; the rest through the matcher"""
+        matches: List = [None] * len(analyses)
+        scored = []
+        for position, analysis in enumerate(analyses):
+            faq_key = self.exact.get(analysis.exact_key)
+            if faq_key is not None:
+                matches[position] = (self.faqs[faq_key], 1.0, faq_key)
+            else:
+                scored.append(position)
+        if scored:
+            for position, match in zip(scored, self.matcher.find_best_matches([analyses[p] for p in scored])):
+                matches[position] = match
+        return matches
+
+    def find_best_match(self, user_message: str, hits: Optional[set] = None) -> Tuple[Optional[Dict], float, str]:
+        return self.find_best_matches([MessageAnalysis(user_message, self.index, hits)])[0]
+
+    def rank(self, user_message: str, k: int = 3) -> List[str]:
+        """Top ``k`` FAQ keys, an exact lookup hit first, then the matcher's order"""
+        analysis = MessageAnalysis(user_message, self.index)
+        exact = self.exact.get(analysis.exact_key)
+        ranked = [faq_key for faq_key, _ in self.matcher.rank(user_message, k, analysis.hits)]
+        if exact is None:
+            return ranked
+        return ([exact] + [faq_key for faq_key in ranked if faq_key != exact])[:k]
+
+    @classmethod
+    def from_file(cls, path: str, matcher: str = None) -> 'FAQCorpus': # type: ignore
+        """Load and compile a JSON corpus; the version is a content hash"""
+        with open(path, 'rb') as corpus_file:
+            return cls.from_bytes(corpus_file.read(), matcher)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, matcher: str = None) -> 'FAQCorpus': # type: ignore
+        faqs = json.loads(raw.decode('utf-8'))
+        if not isinstance(faqs, dict):
+            raise ValueError("The FAQ corpus must be a JSON object of FAQs")
+        for faq_key, faq_data in faqs.items():
+            if not isinstance(faq_data, dict):
+                raise ValueError(f"FAQ '{faq_key}' must be an object")
+            if not isinstance(faq_data.get("keywords"), list) or "response" not in faq_data:
+                raise ValueError(f"FAQ '{faq_key}' needs a keywords list and a response")
+        return cls(faqs, hashlib.sha256(raw).hexdigest()[:12], matcher)
+
+    # Bump when the pickled layout changes in a way the source hash cannot see
+    SNAPSHOT_FORMAT = 2
+
+    @classmethod
+    def load(cls, path: str, matcher: str = None, snapshot_dir: str = None) -> 'FAQCorpus': # type: ignore
+        """``from_file`` through an on-disk snapshot of the compiled corpus
+
+        A snapshot is keyed by the corpus content, the matcher and the
+        settings it compiles with, and the source of this module, so any
+        change to one of them compiles afresh (and writes a new snapshot).
+        Snapshots are pickles, so each carries an HMAC of its bytes (see
+        ``snapshot_key``) and one whose signature does not verify is never
+        unpickled.
+        """
+        with open(path, 'rb') as corpus_file:
+            raw = corpus_file.read()
+        matcher = matcher or MATCHER
+        snapshot = cls.snapshot_path(path, hashlib.sha256(raw).hexdigest()[:12], matcher, snapshot_dir)
+        if snapshot is not None:
+            corpus = cls._read_snapshot(snapshot)
+            if corpus is not None:
+                return corpus
+        corpus = cls.from_bytes(raw, matcher)
+        if snapshot is not None:
+            corpus._write_snapshot(snapshot)
+        return corpus
+
+    @classmethod
+    def snapshot_path(cls, path: str, version: str, matcher: str, snapshot_dir: str = None) -> Optional[str]: # type: ignore
+        directory = INDEX_SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+        if directory == 'off':
+            return None
+        if not directory:
+            cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            directory = os.path.join(cache, 'brandsetu-chatbot', 'index')
+        settings = [cls.SNAPSHOT_FORMAT, source_version(), sys.version_info[:2], version, matcher]
+        if matcher == 'additive':
+            settings.append(FUZZY_WEIGHT)
+        else:
+            settings += [VECTOR_BACKEND, vector_modules()[1] is not None]
+        key = hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+        # Corpora sharing a directory (e.g. every tenant's faqs.json) must not collide
+        source = os.path.abspath(path)
+        stem = f"{os.path.splitext(os.path.basename(source))[0]}-{hashlib.sha256(source.encode()).hexdigest()[:8]}"
+        return os.path.join(directory, f"{stem}.{matcher}.{key}.pickle")
+
+    @staticmethod
+    def snapshot_key(directory: str) -> bytes:
+        """The key snapshots in ``directory`` are signed with
+
+        CHATBOT_INDEX_SNAPSHOT_KEY when set; otherwise a random key created,
+        owner-only, beside the snapshots by the first process to need one.
+        """
+        if INDEX_SNAPSHOT_KEY:
+            return INDEX_SNAPSHOT_KEY.encode()
+        path = os.path.join(directory, 'snapshot.key')
+        if not os.path.exists(path):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, 'wb') as key_file:
+                key_file.write(secrets.token_bytes(32))
+            try:
+                os.link(temporary, path)  # the first of several workers wins
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary)
+        with open(path, 'rb') as key_file:
+            return key_file.read()
+
+    @classmethod
+    def _read_snapshot(cls, snapshot: str) -> Optional['FAQCorpus']:
+        started = time.perf_counter()
+        try:
+            with open(snapshot, 'rb') as snapshot_file:
+                signature, payload = snapshot_file.read(32), snapshot_file.read()
+            key = cls.snapshot_key(os.path.dirname(snapshot))
+            if not hmac.compare_digest(signature, hmac.new(key, payload, hashlib.sha256).digest()):
+                logger.warning(f"Ignoring corpus snapshot {snapshot}: bad signature")
+                return None
+            corpus = pickle.loads(payload)
+        except FileNotFoundError:
+            return None
+        except Exception as e:  # truncated or unreadable: compile instead
+            logger.warning(f"Ignoring corpus snapshot {snapshot}: {str(e)}")
+            return None
+        if not isinstance(corpus, cls):
+            logger.warning(f"Ignoring corpus snapshot {snapshot}: not a compiled corpus")
+            return None
+        corpus.build_ms = (time.perf_counter() - started) * 1000
+        corpus.loaded_at = datetime.now().isoformat()
+        corpus.source = 'snapshot'
+        return corpus
+
+    def _write_snapshot(self, snapshot: str):
+        """Sign and write atomically, then drop older snapshots of the same corpus and matcher"""
+        directory = os.path.dirname(snapshot)
+        stem, matcher, _, _ = os.path.basename(snapshot).rsplit('.', 3)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            payload = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+            signature = hmac.new(self.snapshot_key(directory), payload, hashlib.sha256).digest()
+            temporary = f"{snapshot}.{os.getpid()}.tmp"
+            with open(temporary, 'wb') as snapshot_file:
+                snapshot_file.write(signature + payload)
+            os.replace(temporary, snapshot)
+            for name in os.listdir(directory):
+                if name.startswith(f"{stem}.{matcher}.") and name.endswith('.pickle') and \
+                        os.path.join(directory, name) != snapshot:
+                    os.remove(os.path.join(directory, name))
+        except OSError as e:
+            logger.warning(f"Could not write corpus snapshot {snapshot}: {str(e)}")
+
+    @cached_property
+    def memory_bytes(self) -> int:
+        """Approximate footprint of the FAQs and everything compiled from them"""
+        return approximate_size(self)
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "faq_count": len(self.faqs),
+            "matcher": self.matcher_name,
+            "exact_entries": len(self.exact),
+            "memory_bytes": self.memory_bytes,
+            "loaded_at": self.loaded_at,
+            "source": self.source,
+            "build_ms": round(self.build_ms, 2)
+        }
+
+
+class CorpusWatcher(threading.Thread):
+    """Poll the corpus file and hot-reload the chatbot when it changes"""
+
+    def __init__(self, chatbot: 'BrandsetuChatbot', interval: float):
+        super().__init__(name='faq-corpus-watcher', daemon=True)
+        self.chatbot = chatbot
+        self.interval = interval
+        self.last_seen = self._signature()
+        self.stopped = threading.Event()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.chatbot.faq_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check"""
+        signature = self._signature()
+        if signature is None or signature == self.last_seen:
+            return False
+        self.last_seen = signature
+        return self.chatbot.reload_faqs()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class ResponseCache:
+    """Bounded LRU/TTL cache of message analysis results.
+
+    Keys are the normalized message plus the corpus version, so entries from
+    a previous corpus can never be served. Messages containing ``@`` or a
+    digit may carry contact details (or a budget) and always bypass the
+    cache, which keeps PII out of memory and makes cached entities ``{}``.
+    """
+
+    CONTACT_HINT = re.compile(r'[@\d]')
+    # Rough upper bound on one entry (key strings, tuple, dict slot) for
+    # memory budgets; measured entries of ordinary messages take ~500 bytes
+    ENTRY_BYTES = 1024
 
-class DatabaseManager:
-    """Manage SQLite database for conversations and analytics"""
-    
-    def __init__(self, db_path='chatbot.db'):
-        self.db_path = db_path
-        self.init_database()
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = Counter()
+
+    def key(self, user_message: str, version: str, normalized: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """Cache key for a message, or None if it must not be cached"""
+        if self.max_size <= 0 or self.CONTACT_HINT.search(user_message):
+            self.counters['bypasses'] += 1
+            return None
+        return version, normalized if normalized is not None else user_message.lower().strip()
+
+    def get(self, key: Tuple[str, str]):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.counters['expirations'] += 1
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return value
+
+    def put(self, key: Tuple[str, str], value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.counters['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            size = len(self.entries)
+        stats = {name: self.counters[name] for name in
+                 ('hits', 'misses', 'evictions', 'expirations', 'bypasses', 'invalidations')}
+        stats.update(size=size, max_size=self.max_size, ttl=self.ttl)
+        return stats
+
+
+class BrandsetuChatbot:
+    """Brandsetu Digital Chatbot with improved matching"""
     
-    def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+    # A match must score above this to be answered; lower gets the fallback
+    MIN_CONFIDENCE = 0.08
     
-    def init_database(self):
-        """Initialize database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                message_type TEXT NOT NULL,
-                message TEXT NOT NULL,
-                response TEXT,
-                matched_faq TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS analytics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                event_type TEXT NOT NULL,
-                event_data TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                message_id INTEGER,
-                rating INTEGER,
-                comment TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    def __init__(self, faq_path: str = None, reload_interval: float = FAQ_RELOAD_INTERVAL, # type: ignore
+                 matcher: str = None, db=None, snapshot_dir: str = None, # type: ignore
+                 cache_size: int = CACHE_SIZE):
+        # Nothing is read or compiled here: the database migrates on its first
+        # query and the corpus loads on first access (see ``corpus``)
+        self.db = db if db is not None else open_database(lazy=True)
+        self.nlp = NLPProcessor()
+        self.faq_path = faq_path or FAQ_PATH
+        self.matcher_name = matcher or MATCHER
+        if self.matcher_name not in FAQCorpus.MATCHERS:
+            raise ValueError(f"Unknown matcher '{self.matcher_name}'")
+        self.snapshot_dir = snapshot_dir
+        self._corpus: Optional[FAQCorpus] = None
+        self._corpus_lock = threading.Lock()
+        self.cache = ResponseCache(max_size=cache_size)
+        self.reloads = 0
+        self.last_reload_error = None
+        self.watcher = None
+        if reload_interval > 0:
+            self.watcher = CorpusWatcher(self, reload_interval)
+            self.watcher.start()
     
-    def save_message(self, session_id: str, message_type: str, message: str, 
-                     response: str = None, matched_faq: str = None): # type: ignore
-        """Save a message to database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO conversations (session_id, message_type, message, response, matched_faq)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (session_id, message_type, message, response, matched_faq))
-        
-        conn.commit()
-        message_id = cursor.lastrowid
-        conn.close()
-        
-        return message_id
+    @property
+    def corpus(self) -> FAQCorpus:
+        """The current corpus snapshot, loaded (once, across threads) on first use"""
+        corpus = self._corpus
+        if corpus is None:
+            with self._corpus_lock:
+                if self._corpus is None:
+                    with metrics.stage('corpus_load'):
+                        self._corpus = FAQCorpus.load(self.faq_path, self.matcher_name, self.snapshot_dir)
+                corpus = self._corpus
+        return corpus
     
-    def get_conversation(self, session_id: str) -> List[Dict]:
-        """Get conversation history"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM conversations 
-            WHERE session_id = ? 
-            ORDER BY timestamp ASC
-        ''', (session_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+    @corpus.setter
+    def corpus(self, corpus: FAQCorpus):
+        self._corpus = corpus
     
-    def save_analytics(self, session_id: str, event_type: str, event_data: Dict = None): # type: ignore
-        """Save analytics event"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO analytics (session_id, event_type, event_data)
-            VALUES (?, ?, ?)
-        ''', (session_id, event_type, json.dumps(event_data) if event_data else None))
-        
-        conn.commit()
-        conn.close()
+    @property
+    def faqs(self) -> Dict:
+        return self.corpus.faqs
     
-    def get_analytics_summary(self) -> Dict:
-        """Get analytics summary"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(DISTINCT session_id) as count FROM conversations')
-        total_sessions = cursor.fetchone()['count']
-        
-        cursor.execute('SELECT COUNT(*) as count FROM conversations WHERE message_type = "user"')
-        total_messages = cursor.fetchone()['count']
-        
-        cursor.execute('''
-            SELECT matched_faq, COUNT(*) as count 
-            FROM conversations 
-            WHERE matched_faq IS NOT NULL 
-            GROUP BY matched_faq 
-            ORDER BY count DESC 
-            LIMIT 5
-        ''')
-        top_faqs = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return {
-            "total_sessions": total_sessions,
-            "total_messages": total_messages,
-            "top_faqs": top_faqs
-        }
-
-
-class NLPProcessor:
-    """Enhanced natural language processing"""
+    @property
+    def index(self) -> FAQIndex:
+        return self.corpus.index
     
-    @staticmethod
-    def similarity_score(str1: str, str2: str) -> float:
-        """Calculate similarity between two strings"""
-        return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+    def load_faqs(self) -> Dict:
+        """Load all FAQ data"""
+        with open(self.faq_path, encoding='utf-8') as corpus_file:
+            return json.load(corpus_file)
     
-    @staticmethod
-    def extract_intent(message: str) -> str:
-        """Extract user intent from message"""
-        message_lower = message.lower()
-        
-        intents = {
-            "greeting": ["hello", "hi", "hey", "good morning", "good afternoon"],
-            "seo": ["seo", "search engine", "ranking", "google", "organic"],
-            "social_media": ["social media", "instagram", "facebook", "linkedin", "twitter"],
-            "paid_ads": ["ads", "advertising", "google ads", "facebook ads", "paid"],
-            "pricing": ["price", "cost", "how much", "budget"],
-            "getting_started": ["get started", "begin", "start", "how to start"],
-            "branding": ["brand", "identity", "logo", "branding"],
-            "results": ["results", "roi", "timeline", "how soon"],
-            "contact": ["contact", "reach", "email", "phone", "call", "talk", "speak"]
-        }
-        
-        for intent, keywords in intents.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return intent
+    def reload_faqs(self) -> bool:
+        """Rebuild the corpus off to the side and swap it in atomically"""
+        try:
+            corpus = FAQCorpus.load(self.faq_path, self.matcher_name, self.snapshot_dir)
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            # Never touch the lazy ``corpus`` property here: it would retry the load
+            current = self._corpus.version if self._corpus is not None else 'none'
+            self.last_reload_error = str(e)
+            logger.error(f"FAQ reload failed, keeping version {current}: {str(e)}")
+            return False
         
-        return "general_inquiry"
+        self.corpus = corpus
+        self.cache.clear()
+        self.reloads += 1
+        self.last_reload_error = None
+        logger.info(f"Loaded FAQ corpus {corpus.version} ({len(corpus.faqs)} FAQs) in {corpus.build_ms:.1f}ms")
+        return True
     
-    @staticmethod
-    def extract_entities(message: str) -> Dict:
-        """Extract entities like budget, timeline, etc."""
-        entities = {}
-        
-        budget_pattern = r'₹?\s*(\d+(?:,\d+)*(?:k|K|lakh|lakhs?)?)'
-        budget_matches = re.findall(budget_pattern, message)
-        if budget_matches:
-            entities['budget'] = budget_matches[0]
-        
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_matches = re.findall(email_pattern, message)
-        if email_matches:
-            entities['email'] = email_matches[0]
+    def before_fork(self):
+        """Leave nothing behind that a forked worker must not inherit
         
-        phone_pattern = r'\b(?:\+91|91)?[\s-]?[6-9]\d{9}\b'
-        phone_matches = re.findall(phone_pattern, message)
-        if phone_matches:
-            entities['phone'] = phone_matches[0]
-        
-        return entities
-
-
-class BrandsetuChatbot:
-    """Brandsetu Digital Chatbot with improved matching"""
+        Runs in the preloading master before each fork: SQLite connections
+        must not cross ``fork``, and a watcher thread caught mid-reload
+        would leave its locks held in the child.
+        """
+        if self.watcher is not None and self.watcher.is_alive():
+            self.watcher.stop()
+            self.watcher.join()
+        self.db.close()
     
-    def __init__(self):
-        self.db = DatabaseManager()
-        self.nlp = NLPProcessor()
-        self.faqs = self.load_faqs()
+    def after_fork(self):
+        """Restart per-process machinery in a worker forked after preload
+        
+        The corpus and its compiled index are inherited copy-on-write; only
+        threads (which do not survive ``fork``) need restarting. The new
+        watcher compares against the file the inherited corpus was loaded
+        from, so a worker forked after an edit still picks it up. Pooled
+        connections and the write-behind writer already reset themselves
+        on first use in a new process.
+        """
+        if self.watcher is not None and not self.watcher.is_alive():
+            inherited = self.watcher
+            self.watcher = CorpusWatcher(self, inherited.interval)
+            self.watcher.last_seen = inherited.last_seen
+            self.watcher.start()
     
-    def load_faqs(self) -> Dict:
-        """Load all FAQ data"""
-        return {
-            # SEO SERVICES
-            "seo_overview": {
-                "keywords": ["seo", "seo services", "search engine optimization", "search engine", "ranking", "google ranking", "organic"],
-                "response": "We help businesses improve their Google visibility and attract customers organically. What would you like to know about our SEO services?",
-                "options": [
-                    "Is SEO suitable for small or local businesses?",
-                    "Will I get SEO reports?",
-                    "What SEO services does BrandSetu Digital provide?"
-                ],
-                "category": "seo_services"
-            },
-            "seo_local": {
-                "keywords": ["local seo", "small business seo", "seo for local business", "local business"],
-                "response": "Yes. Local SEO is one of our strengths. We help local businesses rank on Google Maps and local search results to attract nearby customers.",
-                "category": "seo_services"
-            },
-            "seo_reports": {
-                "keywords": ["seo reports", "seo tracking", "keyword rankings", "seo report"],
-                "response": "Yes. You'll receive clear SEO reports covering keyword rankings, traffic growth, and performance insights.",
-                "category": "seo_services"
-            },
-            "seo_services_detail": {
-                "keywords": ["what seo services", "seo include", "seo offer", "complete seo", "seo solutions"],
-                "response": "We offer complete SEO solutions including keyword research, on-page SEO, technical SEO, content optimization, backlink building, and local SEO to improve your Google visibility.",
-                "category": "seo_services"
-            },
-
-            # SOCIAL MEDIA MARKETING
-            "social_overview": {
-                "keywords": ["social media", "social media marketing", "smm", "social"],
-                "response": "We help brands grow through social media marketing using content, strategy, and consistent engagement. What would you like to know?",
-                "options": [
-                    "Which platforms do you manage?",
-                    "Do you create the content or do I need to provide it?",
-                    "How soon will I see growth on social media?"
-                ],
-                "category": "social_media_marketing"
-            },
-            "social_platforms": {
-                "keywords": ["platforms you manage", "instagram facebook linkedin", "which platforms", "what platforms"],
-                "response": "We manage Instagram, Facebook, LinkedIn, and other platforms depending on where your audience is most active.",
-                "category": "social_media_marketing"
-            },
-            "social_content": {
-                "keywords": ["create content", "provide content", "content creation", "who creates content"],
-                "response": "We handle everything — strategy, creatives, captions, and posting. If you have brand assets, we can incorporate them.",
-                "category": "social_media_marketing"
-            },
-            "social_growth": {
-                "keywords": ["social media growth", "how soon social media", "social media results", "growth timeline"],
-                "response": "Engagement improves within weeks. Strong audience growth and lead flow usually take 1–3 months depending on consistency and strategy.",
-                "category": "social_media_marketing"
-            },
-
-            # ABOUT BRANDSETU DIGITAL
-            "bsd_overview": {
-                "keywords": ["brandsetu", "about brandsetu", "about bsd", "brandsetu digital", "tell me about"],
-                "response": "BrandSetu Digital helps businesses build strong brands and grow online using marketing, strategy, and automation. What would you like to know about us?",
-                "options": [
-                    "What specific services does BrandSetu Digital offer?",
-                    "How does BrandSetu Digital create a strategy?",
-                    "How soon will I see results from digital marketing?",
-                    "Do you help businesses with branding as well as marketing?"
-                ],
-                "category": "about_bsd"
-            },
-            "bsd_services": {
-                "keywords": ["services brandsetu", "what services do you offer", "your services", "services you provide", "tell me about the services"],
-                "response": "We specialize in branding and identity strategy, social media marketing and management, search engine optimization, paid advertising on Google and Meta, content strategy and creation, and business growth automation support. These services work together to build your brand and grow your business online.",
-                "category": "about_bsd"
-            },
-            "bsd_strategy": {
-                "keywords": ["create strategy", "strategy process", "how do you create strategy"],
-                "response": "Every business is unique. We begin with a discovery session to understand your goals, audience, and challenges, then craft a custom strategy aligned with your business needs and market realities.",
-                "category": "about_bsd"
-            },
-            "bsd_results": {
-                "keywords": ["how soon results", "marketing results timeline", "when will i see results"],
-                "response": "Paid advertising can show results in days. SEO and organic growth usually take 40–60 days and build sustainability. Branding and long-term strategy improvements compound benefits over time. We focus on results that matter, not just quick numbers.",
-                "category": "about_bsd"
-            },
-            "bsd_branding": {
-                "keywords": ["branding", "brand identity", "branding help", "what about the branding", "tell me about branding"],
-                "response": "Yes. We don't just run ads — we help build your brand story, identity, positioning, and long-term digital reputation so your audience connects with your business.",
-                "category": "about_bsd"
-            },
-
-            # PAID ADVERTISING
-            "paid_overview": {
-                "keywords": ["paid ads", "advertising", "google ads", "ads", "paid advertising", "tell me about the paid ads"],
-                "response": "We manage paid advertising campaigns to generate leads and sales efficiently. What would you like to know?",
-                "options": [
-                    "What paid advertising services do you offer?",
-                    "Will I get performance reports for ads?",
-                    "Do you manage ad budgets as well?"
-                ],
-                "category": "paid_ads"
-            },
-            "paid_services": {
-                "keywords": ["paid advertising services", "facebook ads", "instagram ads", "what ads", "advertising services"],
-                "response": "We manage Google Ads, Facebook Ads, and Instagram Ads — from strategy and setup to optimization and scaling.",
-                "category": "paid_ads"
-            },
-            "paid_reports": {
-                "keywords": ["ads reports", "performance reports", "ad reports"],
-                "response": "Absolutely. You'll get detailed reports showing ad spend, leads, conversions, and ROI.",
-                "category": "paid_ads"
-            },
-            "paid_budget": {
-                "keywords": ["ad budget", "manage ad spend", "budget management"],
-                "response": "Yes. We optimize your ad spend to get the best ROI and avoid unnecessary wastage.",
-                "category": "paid_ads"
-            },
-
-            # GETTING STARTED
-            "getting_started_overview": {
-                "keywords": ["get started", "how to start", "starting", "begin"],
-                "response": "Getting started with BrandSetu Digital is simple. What would you like to know?",
-                "options": [
-                    "How do I get started with BrandSetu Digital?",
-                    "Do you offer a free consultation?",
-                    "Are your plans flexible?"
-                ],
-                "category": "getting_started"
-            },
-            "get_started": {
-                "keywords": ["start with brandsetu", "get started brandsetu", "how do i get started"],
-                "response": "Just message us here with your business goal, and our team will guide you step by step.",
-                "category": "getting_started"
-            },
-            "free_consultation": {
-                "keywords": ["free consultation", "free strategy", "consultation"],
-                "response": "Yes. We offer a free strategy discussion to understand your business and recommend the best solution.",
-                "category": "getting_started"
-            },
-            "flexible_plans": {
-                "keywords": ["flexible plans", "custom plans", "plans flexible", "are your plans flexible"],
-                "response": "Yes. We offer custom and scalable plans based on your needs and growth stage.",
-                "category": "getting_started"
-            },
-
-            # CONTACT INFORMATION
-            "contact_info": {
-                "keywords": ["contact", "reach out", "get in touch", "contact you", "contact brandsetu", "how to contact", "reach you", "talk to you", "speak with you"],
-                "response": "Great! Here's how you can reach us:\n\n📧 Email: contact@brandsetudigital.com\n📱 Phone: +91 98765 43210\n🌐 Website: www.brandsetudigital.com\n\nOr simply share your contact details here, and our team will reach out within 2 hours!",
-                "category": "contact"
-            },
-            "email_contact": {
-                "keywords": ["email", "email address", "mail id", "send email"],
-                "response": "You can email us at: contact@brandsetudigital.com\n\nOr share your email here, and we'll get back to you within 2 hours!",
-                "category": "contact"
-            },
-            "phone_contact": {
-                "keywords": ["phone", "phone number", "call", "mobile number", "whatsapp"],
-                "response": "You can call or WhatsApp us at: +91 98765 43210\n\nOr share your number here, and we'll reach out within 2 hours!",
-                "category": "contact"
-            }
-        }
+    def find_best_match(self, user_message: str, hits: Optional[set] = None) -> Tuple[Optional[Dict], float, str]:
+        """Find best FAQ match with the configured matcher"""
+        return self.corpus.find_best_match(user_message, hits)
     
-    def find_best_match(self, user_message: str) -> Tuple[Optional[Dict], float, str]:
-        """Find best FAQ match with improved scoring"""
+    def _find_best_match_scan(self, user_message: str) -> Tuple[Optional[Dict], float, str]:
+        """Reference linear scan over every FAQ; kept for parity checks"""
         user_message_lower = user_message.lower().strip()
         
         best_match = None
@@ -416,35 +2890,73 @@ class BrandsetuChatbot:
         
         return best_match, confidence, matched_key # type: ignore
     
-    def generate_response(self, user_message: str, session_id: str) -> Dict:
-        """Generate contextual response"""
+    def analyze(self, user_message: str, corpus: FAQCorpus) -> Tuple[str, Dict, Optional[str], float]:
+        """Intent, entities, matched FAQ key and confidence, cached per message"""
+        return self.analyze_batch([user_message], corpus)[0]
+    
+    def analyze_batch(self, user_messages: List[str], corpus: FAQCorpus) -> List[Tuple[str, Dict, Optional[str], float]]:
+        """``analyze`` for many messages; cache misses are matched as one batch"""
+        results: List = [None] * len(user_messages)
+        misses = []
+        with metrics.stage('cache_lookup'):
+            for position, user_message in enumerate(user_messages):
+                analysis = MessageAnalysis(user_message, corpus.index)
+                cache_key = self.cache.key(user_message, corpus.version, analysis.normalized)
+                cached = self.cache.get(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    intent, faq_key, confidence = cached
+                    results[position] = (intent, {}, faq_key, confidence)
+                else:
+                    misses.append((position, analysis, cache_key))
         
-        intent = self.nlp.extract_intent(user_message)
-        entities = self.nlp.extract_entities(user_message)
+        if misses:
+            analyses = [analysis for _, analysis, _ in misses]
+            # One automaton pass per message serves both intent extraction and FAQ scoring
+            with metrics.stage('keyword_scan'):
+                for analysis in analyses:
+                    analysis.hits  # cached on the analysis for the stages below
+            with metrics.stage('find_best_match'):
+                matches = corpus.find_best_matches(analyses)
+            for (position, analysis, cache_key), match in zip(misses, matches):
+                with metrics.stage('extract_intent'):
+                    intent = analysis.intent
+                with metrics.stage('extract_entities'):
+                    entities = analysis.entities
+                _, confidence, faq_key = match
+                if cache_key is not None:
+                    self.cache.put(cache_key, (intent, faq_key, confidence))
+                results[position] = (intent, entities, faq_key, confidence)
         
-        matched_faq, confidence, faq_key = self.find_best_match(user_message)
+        return results
+    
+    def _reply(self, user_message: str, session_id: str, analysis, corpus: FAQCorpus) -> Tuple[Dict, List]:
+        """Response payload plus the database writes that record it"""
+        intent, entities, faq_key, confidence = analysis
+        matched_faq = corpus.faqs.get(faq_key) if faq_key else None
         
-        # Lower threshold for better matching
-        if matched_faq and confidence > 0.08:
+        if matched_faq and confidence > self.MIN_CONFIDENCE:
             response = matched_faq["response"]
             category = matched_faq.get("category", "general")
+            options = matched_faq.get("options", [])
         else:
             response = self._generate_fallback_response(user_message, entities)
             faq_key = "fallback"
             category = "general"
+            options = []
         
-        self.db.save_message(session_id, "user", user_message)
-        self.db.save_message(session_id, "bot", response, response, faq_key)
-        
-        self.db.save_analytics(session_id, "message_processed", {
-            "intent": intent,
-            "entities": entities,
-            "matched_faq": faq_key,
-            "confidence": confidence
-        })
+        writes = [
+            *self.db.message_writes(session_id, "user", user_message),
+            *self.db.message_writes(session_id, "bot", response, response, faq_key),
+            self.db.analytics_write(session_id, "message_processed", {
+                "intent": intent,
+                "entities": entities,
+                "matched_faq": faq_key,
+                "confidence": confidence
+            }),
+        ]
         
         if entities.get('email') or entities.get('phone'):
-            self.db.save_analytics(session_id, "contact_captured", entities)
+            writes.append(self.db.analytics_write(session_id, "contact_captured", entities))
         
         return {
             "response": response,
@@ -452,8 +2964,64 @@ class BrandsetuChatbot:
             "entities": entities,
             "confidence": confidence,
             "category": category,
+            "options": options,
             "timestamp": datetime.now().isoformat()
-        }
+        }, writes
+    
+    def generate_response(self, user_message: str, session_id: str) -> Dict:
+        """Generate contextual response"""
+        
+        # Pin one corpus snapshot for the whole request
+        corpus = self.corpus
+        
+        reply, writes = self._reply(user_message, session_id, self.analyze(user_message, corpus), corpus)
+        self.db.write_many(writes)
+        return reply
+    
+    # What a batch item that could not be answered or saved gets instead of a reply
+    BATCH_ITEM_ERROR = "An error occurred processing this message"
+    
+    def generate_responses(self, items: List[Tuple[str, str]]) -> List[Dict]:
+        """Generate responses for many (session_id, message) pairs
+        
+        Messages are analyzed as one batch against a single corpus snapshot
+        and every row is persisted in one transaction. Returns one reply per
+        item, in input order; an item whose analysis, reply or writes fail
+        gets ``{"error": ...}`` instead, without costing the others theirs.
+        """
+        corpus = self.corpus
+        messages = [message for _, message in items]
+        try:
+            analyses: List = self.analyze_batch(messages, corpus)
+        except Exception as e:
+            # Find the culprit: analyze one by one, keeping whatever succeeds
+            logger.warning(f"Batch analysis of {len(items)} messages failed, retrying one by one: {str(e)}")
+            analyses = []
+            for message in messages:
+                try:
+                    analyses.append(self.analyze(message, corpus))
+                except Exception as item_error:
+                    logger.error(f"Error analyzing batch message: {str(item_error)}")
+                    analyses.append(None)
+        
+        replies: List[Optional[Dict]] = []
+        groups, positions = [], []
+        for position, ((session_id, user_message), analysis) in enumerate(zip(items, analyses)):
+            reply = None
+            if analysis is not None:
+                try:
+                    reply, item_writes = self._reply(user_message, session_id, analysis, corpus)
+                    groups.append(item_writes)
+                    positions.append(position)
+                except Exception as e:
+                    logger.error(f"Error replying to batch message: {str(e)}")
+            replies.append(reply)
+        
+        for position, error in zip(positions, self.db.write_groups(groups)):
+            if error is not None:
+                logger.error(f"Error saving batch message: {str(error)}")
+                replies[position] = None
+        return [reply if reply is not None else {"error": self.BATCH_ITEM_ERROR} for reply in replies]
     
     def _generate_fallback_response(self, message: str, entities: Dict) -> str:
         """Generate fallback response"""
@@ -496,22 +3064,356 @@ class BrandsetuChatbot:
         )
 
 
-# Initialize chatbot
-chatbot = BrandsetuChatbot()
+class TenantRegistry:
+    """Chatbots for the tenants under ``directory``, loaded on first request
+
+    A tenant is a subdirectory holding a ``faqs.json``; its database and
+    archive live beside it. Loaded tenants are kept in LRU order and, once
+    their ``footprint`` adds up to more than ``memory_budget`` bytes or more
+    than ``max_loaded`` of them are loaded, the least recently used ones are
+    dropped until the rest fit and reload on their next request. ``get``
+    checks a chatbot out and ``release`` hands it back; a dropped tenant's
+    database is flushed and closed once its last checkout is released, so
+    requests already holding it finish normally. Rather than one watcher
+    thread per tenant, a tenant's corpus file is checked for edits when it
+    is used, at most every ``reload_interval`` seconds.
+    """
+
+    TENANT_ID = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+    def __init__(self, directory: str, memory_budget: int = int(TENANT_MEMORY_MB * 1024 * 1024),
+                 reload_interval: float = FAQ_RELOAD_INTERVAL, pool_size: int = TENANT_DB_POOL_SIZE,
+                 snapshot_dir: str = None, max_loaded: int = TENANT_MAX_LOADED, # type: ignore
+                 cache_kb: int = TENANT_DB_CACHE_KB, cache_size: int = TENANT_CACHE_SIZE):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.max_loaded = max_loaded
+        self.reload_interval = reload_interval
+        self.pool_size = pool_size
+        self.cache_kb = cache_kb
+        self.cache_size = cache_size
+        self.snapshot_dir = snapshot_dir
+        # tenant id -> [chatbot, watcher, last checked]
+        self._tenants: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        # chatbot -> requests holding it; evicted chatbots still held
+        self._leases: Counter = Counter()
+        self._retired: Set['BrandsetuChatbot'] = set()
+        self.counters = Counter()
+
+    def path(self, tenant_id: str) -> str:
+        if not self.TENANT_ID.fullmatch(tenant_id):
+            raise KeyError(tenant_id)
+        return os.path.join(self.directory, tenant_id)
+
+    def get(self, tenant_id: str) -> 'BrandsetuChatbot':
+        """Check out the tenant's chatbot, loading it (and evicting others) if needed
+
+        Every checkout must be handed back with ``release``. Raises KeyError
+        for a malformed id or a tenant without a corpus.
+        """
+        with self._lock:
+            entry = self._tenants.get(tenant_id)
+            if entry is not None:
+                self._tenants.move_to_end(tenant_id)
+                self._leases[entry[0]] += 1
+                self.counters['hits'] += 1
+        if entry is not None:
+            self._check_corpus(tenant_id, entry)
+            return entry[0]
+
+        tenant_dir = self.path(tenant_id)
+        faq_path = os.path.join(tenant_dir, 'faqs.json')
+        if not os.path.isfile(faq_path):
+            raise KeyError(tenant_id)
+        with self._lock:
+            loading = self._loading.setdefault(tenant_id, threading.Lock())
+        # Concurrent first requests for one tenant compile it once
+        with loading:
+            with self._lock:
+                entry = self._tenants.get(tenant_id)
+                if entry is not None:
+                    self._tenants.move_to_end(tenant_id)
+                    self._leases[entry[0]] += 1
+                    self.counters['hits'] += 1
+                    return entry[0]
+            db = open_database(os.path.join(tenant_dir, 'chatbot.db'), pool_size=self.pool_size,
+                               archive_dir=os.path.join(tenant_dir, 'archive'), cache_kb=self.cache_kb)
+            with metrics.stage('tenant_load'):
+                bot = BrandsetuChatbot(faq_path, reload_interval=0, db=db, snapshot_dir=self.snapshot_dir,
+                                       cache_size=self.cache_size)
+            bot.corpus.memory_bytes  # measured once, outside the registry lock
+            with self._lock:
+                self._tenants[tenant_id] = [bot, CorpusWatcher(bot, self.reload_interval), time.monotonic()]
+                self._leases[bot] += 1
+                self.counters['loads'] += 1
+                evicted = self._evict(keep=tenant_id)
+        for old in evicted:
+            self._release(old)
+        return bot
+
+    def release(self, bot: 'BrandsetuChatbot'):
+        """Hand back a checkout; the last one out closes an evicted chatbot"""
+        with self._lock:
+            self._leases[bot] -= 1
+            if self._leases[bot] > 0:
+                return
+            del self._leases[bot]
+            if bot not in self._retired:
+                return
+            self._retired.discard(bot)
+        self._release(bot)
+
+    def _check_corpus(self, tenant_id: str, entry: List):
+        """Reload an edited corpus; of the requests arriving once it is due, one checks"""
+        if self.reload_interval <= 0:
+            return
+        with self._lock:
+            if time.monotonic() - entry[2] < self.reload_interval:
+                return
+            entry[2] = time.monotonic()
+        if not entry[1].check():
+            return
+        entry[0].corpus.memory_bytes  # measured outside the registry lock
+        with self._lock:
+            self.counters['reloads'] += 1
+            # A grown corpus may no longer fit beside the others
+            evicted = self._evict(keep=tenant_id) if tenant_id in self._tenants else []
+        for old in evicted:
+            self._release(old)
+
+    @staticmethod
+    def footprint(bot: 'BrandsetuChatbot') -> int:
+        """Bytes a loaded tenant may hold: its compiled corpus, plus the most
+        its connections' SQLite page caches and its response cache can grow to
+        """
+        page_caches = sum(manager.pool_size * manager.cache_kb * 1024
+                          for manager in getattr(bot.db, 'shards', [bot.db]))
+        return bot.corpus.memory_bytes + page_caches + bot.cache.max_size * ResponseCache.ENTRY_BYTES
+
+    def _evict(self, keep: str) -> List['BrandsetuChatbot']:
+        """Drop least recently used tenants until the rest fit the budget and the cap
+
+        Returns the dropped chatbots nobody holds; held ones are retired and
+        closed by their last ``release``.
+        """
+        evicted = []
+        total = sum(self.footprint(entry[0]) for entry in self._tenants.values())
+        for tenant_id in list(self._tenants):
+            if total <= self.memory_budget and len(self._tenants) <= self.max_loaded:
+                break
+            if tenant_id == keep:
+                continue
+            bot = self._tenants.pop(tenant_id)[0]
+            total -= self.footprint(bot)
+            if self._leases[bot] > 0:
+                self._retired.add(bot)
+            else:
+                evicted.append(bot)
+            self.counters['evictions'] += 1
+        return evicted
+
+    @staticmethod
+    def _release(bot: 'BrandsetuChatbot'):
+        """Commit an evicted tenant's pending writes and free its connections"""
+        for manager in getattr(bot.db, 'shards', [bot.db]):
+            if manager.writer is not None:
+                manager.writer.stop()
+            manager.close()
+
+    def close(self):
+        with self._lock:
+            loaded, self._tenants = self._tenants, OrderedDict()
+            retired, self._retired = self._retired, set()
+        for bot in [entry[0] for entry in loaded.values()] + list(retired):
+            self._release(bot)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            loaded = {tenant_id: self.footprint(entry[0]) for tenant_id, entry in self._tenants.items()}
+        stats = {name: self.counters[name] for name in ('loads', 'hits', 'evictions', 'reloads')}
+        stats.update(loaded=len(loaded), max_loaded=self.max_loaded, memory_bytes=sum(loaded.values()),
+                     memory_budget=self.memory_budget, tenants=list(loaded))
+        return stats
+
+
+class TenantPrefixMiddleware:
+    """Serve ``/t/<tenant>/api/...`` as ``/api/...`` with ``X-Tenant-ID: <tenant>``"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith('/t/'):
+            tenant_id, _, rest = path[3:].partition('/')
+            environ['HTTP_X_TENANT_ID'] = tenant_id
+            environ['SCRIPT_NAME'] = f"{environ.get('SCRIPT_NAME', '')}/t/{tenant_id}"
+            environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+
+class Startup:
+    """Cold-start timings and the readiness ``/api/health`` reports
+
+    ``begin`` marks the process ready at once (the corpus and database then
+    load on first use), after warming up in the caller (``sync``), or after
+    warming up on a thread (``background``) while health answers 503.
+    """
+
+    MODES = ('off', 'sync', 'background')
+
+    def __init__(self, started: float = None): # type: ignore
+        self.started = time.perf_counter() if started is None else started
+        self.timings: Dict[str, float] = {}
+        self.ready = threading.Event()
+        self.mode = 'off'
+        self.error = None
+        self.thread = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+    def begin(self, bot: 'BrandsetuChatbot', mode: str = WARMUP):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown warmup mode '{mode}'")
+        self.mode = mode
+        self.timings['import'] = round((time.perf_counter() - self.started) * 1000, 2)
+        if mode == 'off':
+            self.mark_ready()
+        elif mode == 'sync':
+            self.warm_up(bot)
+        else:
+            self.ready.clear()
+            self.thread = threading.Thread(target=self.warm_up, args=(bot,), name='warmup', daemon=True)
+            self.thread.start()
+
+    def warm_up(self, bot: 'BrandsetuChatbot'):
+        """Load the corpus, migrate the database and match every FAQ question once
+
+        The questions go through the matcher directly, so warming up neither
+        fills the response cache nor shows in the latency metrics. A failure
+        is reported by health; the lazy paths retry it on the next request.
+        """
+        try:
+            with self.phase('corpus'):
+                corpus = bot.corpus
+            with self.phase('database'):
+                bot.db.initialize()
+            with self.phase('queries'):
+                analyses = [MessageAnalysis(faq["question"], corpus.index) for faq in corpus.faqs.values()
+                            if isinstance(faq.get("question"), str)]
+                corpus.find_best_matches(analyses)
+                for analysis in analyses:
+                    analysis.intent, analysis.entities
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Warmup failed: {str(e)}")
+        self.mark_ready()
+
+    def mark_ready(self):
+        self.timings['ready'] = round((time.perf_counter() - self.started) * 1000, 2)
+        self.ready.set()
+        logger.info(f"Ready in {self.timings['ready']:.1f}ms ({self.mode} warmup): {self.timings}")
+
+    def after_fork(self, bot: 'BrandsetuChatbot'):
+        """Finish, in a forked worker, a background warmup the fork interrupted"""
+        if self.mode == 'background' and not self.ready.is_set():
+            self.begin(bot, 'background')
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready.is_set(), "warmup": self.mode, "timings_ms": dict(self.timings),
+                "error": self.error}
+
+
+@api.before_app_request
+def start_request_timer():
+    metrics.begin_request()
+
+
+@api.before_app_request
+def select_tenant():
+    """Point ``g.chatbot`` at the tenant named by X-Tenant-ID, or the default"""
+    tenant_id = request.headers.get('X-Tenant-ID')
+    if not tenant_id:
+        g.chatbot = current_app.extensions['chatbot']
+        return None
+    tenants = current_app.extensions['tenants']
+    try:
+        if tenants is None:
+            raise KeyError(tenant_id)
+        g.chatbot = g.tenant_lease = tenants.get(tenant_id)
+    except KeyError:
+        return jsonify({"error": f"Unknown tenant '{tenant_id}'"}), 404
+    return None
+
+
+@api.after_app_request
+def hold_tenant_until_sent(response):
+    """Keep a tenant's chatbot checked out until a streamed body is sent"""
+    bot = g.pop('tenant_lease', None)
+    if bot is not None:
+        response.call_on_close(partial(current_app.extensions['tenants'].release, bot))
+    return response
+
+
+@api.teardown_app_request
+def release_tenant(exc):
+    # Only reached with the lease still held when no response was made
+    bot = g.pop('tenant_lease', None)
+    if bot is not None:
+        current_app.extensions['tenants'].release(bot)
+
+
+def current_chatbot() -> BrandsetuChatbot:
+    """The chatbot serving this request (the app's own outside a request)"""
+    return g.chatbot if 'chatbot' in g else current_app.extensions['chatbot']
+
+
+@api.after_app_request
+def record_request_timing(response):
+    # Label by view name ("chat", not "api.chat") as before the blueprint
+    endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+    metrics.end_request(endpoint, f"{request.method} {request.path}")
+    return response
 
 
 # API Routes
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; 503 until startup (and any warmup) is done"""
+    startup = current_app.extensions['startup']
+    tenants = current_app.extensions['tenants']
+    if not startup.ready.is_set():
+        return jsonify({
+            "status": "starting",
+            "timestamp": datetime.now().isoformat(),
+            "startup": startup.stats()
+        }), 503
+    bot = current_chatbot()
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "version": "2.2.0"
+        "version": "2.2.0",
+        "corpus": dict(
+            bot.corpus.stats(),
+            reloads=bot.reloads,
+            last_reload_error=bot.last_reload_error
+        ),
+        "cache": bot.cache.stats(),
+        "db": bot.db.stats(),
+        "tenants": tenants.stats() if tenants is not None else None,
+        "startup": startup.stats()
     })
 
 
-@app.route('/api/chat', methods=['POST'])
+@api.route('/api/chat', methods=['POST'])
 def chat():
     """Main chat endpoint"""
     try:
@@ -526,7 +3428,7 @@ def chat():
         if not user_message:
             return jsonify({"error": "Message cannot be empty"}), 400
         
-        response_data = chatbot.generate_response(user_message, session_id)
+        response_data = current_chatbot().generate_response(user_message, session_id)
         
         return jsonify({
             "success": True,
@@ -542,19 +3444,100 @@ def chat():
         }), 500
 
 
-@app.route('/api/conversation/<session_id>', methods=['GET'])
+@api.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Process many chat messages in one request
+    
+    Body: ``{"items": [{"session_id": ..., "message": ...}, ...]}``. Results
+    come back in input order; an invalid item, or one that fails to be
+    answered or saved, gets its own error entry without failing the rest
+    of the batch.
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else None
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "items must be a non-empty list"}), 400
+        if len(items) > CHAT_BATCH_MAX:
+            return jsonify({"error": f"At most {CHAT_BATCH_MAX} items per batch"}), 400
+        
+        results: List = [None] * len(items)
+        valid, positions = [], []
+        for position, item in enumerate(items):
+            message = item.get('message') if isinstance(item, dict) else None
+            if not isinstance(message, str) or not message.strip():
+                results[position] = {"success": False, "error": "Message is required"}
+                continue
+            session_id = item.get('session_id') or f"session_{datetime.now().timestamp()}_{position}"
+            valid.append((str(session_id), message.strip()))
+            positions.append(position)
+        
+        if valid:
+            replies = current_chatbot().generate_responses(valid)
+            for position, (session_id, _), reply in zip(positions, valid, replies):
+                if "error" in reply:
+                    results[position] = {"success": False, "session_id": session_id, "error": reply["error"]}
+                else:
+                    results[position] = {"success": True, "session_id": session_id, "data": reply}
+        
+        return jsonify({
+            "success": True,
+            "results": results
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in batch chat endpoint: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "An error occurred processing the batch"
+        }), 500
+
+
+def _stream_conversation(session_id: str, rows):
+    """Serialize history incrementally in the same shape as the buffered reply"""
+    yield '{"success": true, "data": {"session_id": %s, "history": [' % json.dumps(session_id)
+    count = 0
+    for row in rows:
+        yield (',' if count else '') + json.dumps(row)
+        count += 1
+    yield '], "message_count": %d}}' % count
+
+
+@api.route('/api/conversation/<session_id>', methods=['GET'])
 def get_conversation(session_id):
-    """Get conversation history"""
+    """Get conversation history
+    
+    Query parameters: ``after_id`` and ``limit`` page through the history
+    (the reply carries ``next_after_id``), ``stream=1`` streams the whole
+    remaining history from a server-side cursor.
+    """
     try:
-        history = chatbot.db.get_conversation(session_id)
+        after_id = request.args.get('after_id', type=int)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= CONVERSATION_PAGE_MAX:
+            return jsonify({"error": f"limit must be between 1 and {CONVERSATION_PAGE_MAX}"}), 400
+        
+        if request.args.get('stream') in ('1', 'true'):
+            rows = current_chatbot().db.iter_conversation(session_id, after_id)
+            first = next(rows, None)  # surfaces a bad cursor before streaming starts
+            history = rows if first is None else itertools.chain([first], rows)
+            return Response(_stream_conversation(session_id, history), mimetype='application/json')
+        
+        history = current_chatbot().db.get_conversation(session_id, after_id, limit)
+        data = {
+            "session_id": session_id,
+            "history": history,
+            "message_count": len(history)
+        }
+        if limit is not None:
+            data["next_after_id"] = history[-1]["id"] if len(history) == limit else None
         return jsonify({
             "success": True,
-            "data": {
-                "session_id": session_id,
-                "history": history,
-                "message_count": len(history)
-            }
+            "data": data
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error retrieving conversation: {str(e)}")
         return jsonify({
@@ -563,11 +3546,17 @@ def get_conversation(session_id):
         }), 500
 
 
-@app.route('/api/analytics', methods=['GET'])
+@api.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Per-stage latency histograms in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Get analytics dashboard data"""
     try:
-        summary = chatbot.db.get_analytics_summary()
+        summary = current_chatbot().db.get_analytics_summary()
         return jsonify({
             "success": True,
             "data": summary
@@ -580,7 +3569,154 @@ def get_analytics():
         }), 500
 
 
-@app.route('/api/feedback', methods=['POST'])
+def sqlite_timestamp(value, name: str) -> Optional[str]:
+    """An ISO 8601 date/datetime (or datetime) as a UTC ``CURRENT_TIMESTAMP`` string
+    
+    Raises ValueError naming ``name`` for values ``datetime.fromisoformat``
+    cannot read; None passes through.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        moment = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _report_window() -> Tuple[str, str]:
+    """``since``/``until`` query parameters, defaulting to the last ``REPORT_WINDOW_DAYS`` days"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    since = sqlite_timestamp(request.args.get('since') or now - timedelta(days=REPORT_WINDOW_DAYS), 'since')
+    until = sqlite_timestamp(request.args.get('until') or now + timedelta(seconds=1), 'until')
+    if since >= until:
+        raise ValueError("since must be earlier than until")
+    return since, until
+
+
+def _report(name: str, build):
+    try:
+        since, until = _report_window()
+        return jsonify({
+            "success": True,
+            "data": {"since": since, "until": until, "series": build(since, until)}
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error retrieving {name}: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Error retrieving {name}"
+        }), 500
+
+
+@api.route('/api/analytics/intents', methods=['GET'])
+def get_intent_distribution():
+    """Messages per intent per ``bucket`` (hour, day, week, month)"""
+    bucket = request.args.get('bucket', 'day')
+    return _report("intent distribution",
+                   lambda since, until: current_chatbot().db.intent_distribution(since, until, bucket))
+
+
+@api.route('/api/analytics/confidence', methods=['GET'])
+def get_confidence_histogram():
+    """Match confidence histogram with ``bins`` equal-width bins"""
+    bins = request.args.get('bins', 10, type=int)
+    return _report("confidence histogram",
+                   lambda since, until: current_chatbot().db.confidence_histogram(since, until, bins))
+
+
+@api.route('/api/analytics/fallback-rate', methods=['GET'])
+def get_fallback_rate():
+    """Share of messages answered by the fallback per ``bucket``"""
+    bucket = request.args.get('bucket', 'day')
+    return _report("fallback rate",
+                   lambda since, until: current_chatbot().db.fallback_rate(since, until, bucket))
+
+
+def export_ndjson(rows):
+    """One JSON object per line; analytics ``event_data`` is decoded inline"""
+    for row in rows:
+        if row.get('event_data') is not None:
+            row['event_data'] = json.loads(row['event_data'])
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_csv(rows, columns):
+    """A header line, then one CSV line per row, reusing a single buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([row[column] for column in columns])
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _tally(rows, stats: Counter):
+    for row in rows:
+        stats['rows'] += 1
+        stats['last_id'] = row['id']
+        yield row
+
+
+def export_lines(db: 'DatabaseManager', table: str, output_format: str, stats: Counter = None, **filters): # type: ignore
+    """Validated export of ``table`` as a generator of text lines
+    
+    ``stats``, when given, counts the rows written and keeps the last id.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    filters['since'] = sqlite_timestamp(filters.get('since'), 'since')
+    filters['until'] = sqlite_timestamp(filters.get('until'), 'until')
+    rows = db.export_rows(table, **filters)
+    if stats is not None:
+        rows = _tally(rows, stats)
+    if output_format == 'csv':
+        return export_csv(rows, db.EXPORT_COLUMNS['analytics' if table == 'leads' else table])
+    return export_ndjson(rows)
+
+
+@api.route('/api/export/<table>', methods=['GET'])
+def export_table(table):
+    """Stream a table (or ``leads``) as NDJSON or CSV
+    
+    Query parameters: ``format``, ``since``, ``until``, ``session_id``,
+    ``event_type`` and ``after_id``. Rows come in id order, so a consumer
+    resumes by passing the last id it stored as ``after_id``. Requires
+    ``Authorization: Bearer $CHATBOT_EXPORT_TOKEN``.
+    """
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not EXPORT_TOKEN or not hmac.compare_digest(supplied.encode(), EXPORT_TOKEN.encode()):
+        return jsonify({"error": "export requires a valid bearer token"}), 403
+    try:
+        output_format = request.args.get('format', 'ndjson')
+        lines = export_lines(current_chatbot().db, table, output_format,
+                             since=request.args.get('since'), until=request.args.get('until'),
+                             session_id=request.args.get('session_id'),
+                             event_type=request.args.get('event_type'),
+                             after_id=request.args.get('after_id', type=int))
+        return Response(lines, mimetype=EXPORT_FORMATS[output_format], headers={
+            'Content-Disposition': f'attachment; filename="{table}.{output_format}"'})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting {table}: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Error exporting data"
+        }), 500
+
+
+@api.route('/api/feedback', methods=['POST'])
 def submit_feedback():
     """Submit feedback"""
     try:
@@ -593,16 +3729,7 @@ def submit_feedback():
         if not session_id or rating is None:
             return jsonify({"error": "session_id and rating are required"}), 400
         
-        conn = chatbot.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO feedback (session_id, rating, comment)
-            VALUES (?, ?, ?)
-        ''', (session_id, rating, comment))
-        
-        conn.commit()
-        conn.close()
+        current_chatbot().db.save_feedback(session_id, rating, comment)
         
         return jsonify({
             "success": True,
@@ -617,7 +3744,117 @@ def submit_feedback():
         }), 500
 
 
-@app.route('/api/welcome', methods=['GET'])
+@api.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending schema migrations to the configured database"""
+    db = current_app.extensions['chatbot'].db
+    click.echo(f"{db.db_path} is at schema version {db.schema_version}")
+
+
+@api.cli.command('build-index')
+def build_index_command():
+    """Compile the FAQ corpus and write the snapshot workers load at startup"""
+    bot = current_app.extensions['chatbot']
+    corpus = FAQCorpus.from_file(bot.faq_path, bot.matcher_name)
+    snapshot = FAQCorpus.snapshot_path(bot.faq_path, corpus.version, corpus.matcher_name, bot.snapshot_dir)
+    if snapshot is None:
+        raise click.UsageError("Corpus snapshots are disabled (CHATBOT_INDEX_SNAPSHOT_DIR=off)")
+    corpus._write_snapshot(snapshot)
+    click.echo(f"Compiled corpus {corpus.version} ({corpus.matcher_name}) in {corpus.build_ms:.1f}ms; wrote {snapshot}")
+
+
+@api.cli.command('rebuild-rollups')
+@click.option('--check-only', is_flag=True, help='Only compare the rollups with the raw rows')
+def rebuild_rollups_command(check_only):
+    """Recompute analytics rollups from raw rows and verify they match"""
+    db = current_app.extensions['chatbot'].db
+    problems = db.verify_rollups()
+    for problem in problems:
+        click.echo(f"  mismatch: {problem}", err=True)
+    click.echo(f"{len(problems)} rollup mismatches before rebuild")
+    if check_only:
+        raise SystemExit(1 if problems else 0)
+    
+    db.rebuild_rollups()
+    problems = db.verify_rollups()
+    for problem in problems:
+        click.echo(f"  mismatch: {problem}", err=True)
+    click.echo(f"Rebuilt rollups; {len(problems)} mismatches after rebuild")
+    raise SystemExit(1 if problems else 0)
+
+
+@api.cli.command('archive-db')
+@click.option('--days', type=float, default=RETENTION_DAYS, show_default=True,
+              help='Archive sessions idle (and analytics events older) than this many days')
+@click.option('--vacuum-pages', type=int, default=0, help='Cap on pages released afterwards (0 releases all)')
+@click.option('--no-compact', is_flag=True, help='Skip the incremental vacuum')
+def archive_db_command(days, vacuum_pages, no_compact):
+    """Move old rows to gzip NDJSON archives and compact the database"""
+    db = current_app.extensions['chatbot'].db
+    result = db.archive_old_rows(days)
+    click.echo(f"Archived {result['sessions']} sessions ({result['conversation_rows']} messages) and "
+               f"{result['analytics_rows']} analytics events older than {result['cutoff']} "
+               f"into {result['archive_members']} members under {result['archive_dir']}")
+    if not no_compact:
+        compacted = db.compact(vacuum_pages)
+        if compacted['converted_to_incremental']:
+            click.echo("Switched the database to incremental auto-vacuum (one full VACUUM)")
+        click.echo(f"Released {compacted['pages_released']} pages: "
+                   f"{compacted['bytes_before']} -> {compacted['bytes_after']} bytes")
+
+
+@api.cli.command('export-db')
+@click.argument('table', type=click.Choice(['conversations', 'analytics', 'feedback', 'leads']))
+@click.option('--format', 'output_format', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson',
+              show_default=True)
+@click.option('--since', help='Only rows at or after this ISO 8601 date/datetime (UTC)')
+@click.option('--until', help='Only rows before this ISO 8601 date/datetime (UTC)')
+@click.option('--session', 'session_id', help='Only rows of this session')
+@click.option('--event-type', help='Only analytics events of this type')
+@click.option('--after-id', type=int, help='Resume after the last id a previous export wrote')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='Output file (default stdout)')
+def export_db_command(table, output_format, since, until, session_id, event_type, after_id, output):
+    """Stream TABLE (or the contact_captured leads) as NDJSON or CSV"""
+    stats = Counter(last_id=after_id or 0)
+    try:
+        lines = export_lines(current_app.extensions['chatbot'].db, table, output_format, stats, since=since,
+                             until=until, session_id=session_id, event_type=event_type, after_id=after_id)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    output.writelines(lines)
+    output.flush()
+    click.echo(f"Exported {stats['rows']} rows; continue with --after-id {stats['last_id']}", err=True)
+
+
+@api.cli.command('reshard-db')
+@click.option('--shards', type=int, required=True, help='Shard count to write (1 writes a single file)')
+@click.option('--from-shards', type=int, default=DB_SHARDS, show_default=True, help='Shard count of the source')
+@click.option('--source', default=None, help='Source database path (default CHATBOT_DB_PATH)')
+@click.option('--target', default=None, help='Target database path (default the source path)')
+def reshard_db_command(shards, from_shards, source, target):
+    """Copy every session into a new shard layout"""
+    source_path = source or current_app.config['CHATBOT_DB_PATH']
+    target_path = target or source_path
+    if shards == from_shards and os.path.abspath(target_path) == os.path.abspath(source_path):
+        raise click.UsageError("source and target are the same files")
+    old = open_database(source_path, from_shards, write_mode='sync')
+    new = open_database(target_path, shards, write_mode='sync')
+    try:
+        copied = reshard(old, new)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        old.close()
+        new.close()
+    paths = shard_paths(target_path, shards) if shards > 1 else [target_path]
+    click.echo(f"Copied {copied.get('conversations', 0)} messages, {copied.get('analytics', 0)} analytics events, "
+               f"{copied.get('feedback', 0)} feedback rows and {copied.get('archive_sessions', 0)} archived "
+               f"session entries into {', '.join(paths)}")
+    click.echo(f"Serve it with CHATBOT_DB_SHARDS={shards}; the source files are left in place")
+
+
+@api.route('/api/welcome', methods=['GET'])
 def welcome_message():
     """Get welcome message"""
     return jsonify({
@@ -639,7 +3876,53 @@ What would you like to know about?""",
     })
 
 
+def create_app(config: Dict = None) -> Flask: # type: ignore
+    """Build the Flask application and the chatbot state it serves
+
+    Every call builds its own chatbot, tenant registry and ``Startup`` and
+    keeps them in ``app.extensions`` (``chatbot``, ``tenants``, ``startup``);
+    routes and CLI commands reach them through ``current_app``. ``config``
+    overrides the CHATBOT_DB_PATH, CHATBOT_FAQ_PATH, CHATBOT_FAQ_RELOAD_INTERVAL,
+    CHATBOT_INDEX_SNAPSHOT_DIR, CHATBOT_TENANTS_DIR and CHATBOT_WARMUP settings,
+    which otherwise come from the environment.
+
+    Cheap by design: the database migrates and the corpus loads (from its
+    snapshot when one matches) on first use, unless CHATBOT_WARMUP does both
+    up front; see ``Startup``.
+    """
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        CHATBOT_DB_PATH=os.environ.get('CHATBOT_DB_PATH', 'chatbot.db'),
+        CHATBOT_FAQ_PATH=FAQ_PATH,
+        CHATBOT_FAQ_RELOAD_INTERVAL=FAQ_RELOAD_INTERVAL,
+        CHATBOT_INDEX_SNAPSHOT_DIR=INDEX_SNAPSHOT_DIR,
+        CHATBOT_TENANTS_DIR=TENANTS_DIR,
+        CHATBOT_WARMUP=WARMUP,
+    )
+    flask_app.config.update(config or {})
+    settings = flask_app.config
+    if settings['CHATBOT_WARMUP'] not in Startup.MODES:
+        raise ValueError(f"Unknown warmup mode '{settings['CHATBOT_WARMUP']}'")
+
+    bot = BrandsetuChatbot(settings['CHATBOT_FAQ_PATH'], reload_interval=settings['CHATBOT_FAQ_RELOAD_INTERVAL'],
+                           db=open_database(settings['CHATBOT_DB_PATH'], lazy=True),
+                           snapshot_dir=settings['CHATBOT_INDEX_SNAPSHOT_DIR'])
+    tenants = None
+    if settings['CHATBOT_TENANTS_DIR']:
+        tenants = TenantRegistry(settings['CHATBOT_TENANTS_DIR'],
+                                 reload_interval=settings['CHATBOT_FAQ_RELOAD_INTERVAL'],
+                                 snapshot_dir=settings['CHATBOT_INDEX_SNAPSHOT_DIR'])
+    startup = Startup(IMPORT_STARTED)
+    flask_app.extensions.update(chatbot=bot, tenants=tenants, startup=startup)
+    CORS(flask_app)
+    flask_app.register_blueprint(api)
+    flask_app.wsgi_app = TenantPrefixMiddleware(flask_app.wsgi_app)
+    startup.begin(bot, settings['CHATBOT_WARMUP'])
+    return flask_app
+
+
 if __name__ == '__main__':
+    app = create_app()
     print("🚀 Starting BrandSetu Digital Chatbot (FIXED VERSION)...")
     print("📍 Server: http://localhost:5000")
     print("\n📚 Loaded FAQs:")
@@ -649,7 +3932,7 @@ if __name__ == '__main__':
     print("   ✅ About BrandSetu Digital (5 FAQs)")
     print("   ✅ Getting Started (4 FAQs)")
     print("   ✅ Contact Information (3 FAQs)")
-    print(f"\n   Total: {len(chatbot.faqs)} FAQ responses loaded")
+    print(f"\n   Total: {len(app.extensions['chatbot'].faqs)} FAQ responses loaded")
     print("\n📡 API Endpoints:")
     print("   POST /api/chat - Send message")
     print("   GET  /api/conversation/<session_id> - Get history")
@@ -662,4 +3945,5 @@ if __name__ == '__main__':
     print("   • Lower confidence threshold (0.08)")
     print("   • Enhanced scoring system")
     print("   • Better fallback responses")
+    print("\n🏭 Production: gunicorn -c gunicorn.conf.py (preforked workers, shared FAQ index)")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
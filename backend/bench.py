@@ -0,0 +1,490 @@
+"""
+Brandsetu Digital Chatbot - load and replay benchmark
+
+Replays traffic against the Flask app (in-process test client) or a running
+server (e.g. local gunicorn) and reports throughput and p50/p95/p99 latency
+per endpoint. Results are saved as JSON so runs can be compared.
+
+    python bench.py load --source synthetic --requests 2000 --concurrency 8
+    python bench.py load --source db --db chatbot.db --output run.json
+    python bench.py load --target http://localhost:5000 --compare baseline.json
+    python bench.py nlp --messages 2000 --output nlp.json
+    python bench.py shards --shards 1,2,4,8 --workers 8 --output shards.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FAQ_PATH = os.path.join(BACKEND_DIR, 'faqs.json')
+
+SYNTHETIC_TEMPLATES = [
+    "{keyword}",
+    "tell me about {keyword}",
+    "what about {keyword}?",
+    "I need help with {keyword}",
+    "how much does {keyword} cost",
+    "do you do {keyword} for small businesses?",
+]
+
+DEFAULT_MIX = "chat=85,batch=2,conversation=8,analytics=3,health=2"
+
+
+def load_faqs(path: str = DEFAULT_FAQ_PATH) -> Dict:
+    with open(path, encoding='utf-8') as corpus_file:
+        return json.load(corpus_file)
+
+
+def synthetic_corpus(faqs: Dict, size: int, seed: int = 0) -> Dict:
+    """Grow the corpus to ``size`` FAQs by recombining existing keywords"""
+    rng = random.Random(seed)
+    vocabulary = sorted({word for faq in faqs.values() for kw in faq["keywords"] for word in kw.split()})
+    corpus = dict(faqs)
+    base = list(faqs.items())
+    n = 0
+    while len(corpus) < size:
+        key, faq_data = base[n % len(base)]
+        keywords = [" ".join(rng.sample(vocabulary, rng.randint(1, 3))) for _ in range(4)]
+        corpus[f"{key}_syn{n}"] = dict(faq_data, keywords=faq_data["keywords"][:2] + keywords)
+        n += 1
+    return corpus
+
+
+def synthetic_messages(faqs: Dict, count: int, seed: int = 0) -> List[str]:
+    """Messages built from FAQ keywords, canonical questions and options"""
+    rng = random.Random(seed)
+    keywords = [kw for faq in faqs.values() for kw in faq["keywords"]]
+    verbatim = [text for faq in faqs.values()
+                for text in [faq.get("question")] + list(faq.get("options", [])) if isinstance(text, str)]
+    messages = []
+    for n in range(count):
+        roll = rng.random()
+        if roll < 0.3 and verbatim:
+            messages.append(rng.choice(verbatim))
+        elif roll < 0.33:
+            messages.append(f"my email is lead{n}@example.com")
+        else:
+            messages.append(rng.choice(SYNTHETIC_TEMPLATES).format(keyword=rng.choice(keywords)))
+    return messages
+
+
+def recorded_messages(db_path: str, count: int, seed: int = 0) -> List[str]:
+    """User messages from the conversations table, sampled with replacement"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute(
+            "SELECT message FROM conversations WHERE message_type = 'user' ORDER BY id")]
+    finally:
+        conn.close()
+    if not rows:
+        raise SystemExit(f"No user messages recorded in {db_path}")
+    rng = random.Random(seed)
+    return [rng.choice(rows) for _ in range(count)]
+
+
+def parse_mix(spec: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+class TestClientTarget:
+    """Send requests through Flask's test client, one client per thread"""
+
+    def __init__(self):
+        import app as chatbot_app
+        self.app = chatbot_app.create_app()
+        self.local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> int:
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPTarget:
+    """Send requests to a running server over HTTP"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> int:
+        from urllib.error import HTTPError
+        from urllib.request import Request, urlopen
+
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = Request(self.base_url + path, data=data, method=method,
+                      headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(req, timeout=30) as response:
+                response.read()
+                return response.status
+        except HTTPError as e:
+            return e.code
+
+
+def build_plan(messages: List[str], mix: List[Tuple[str, int]], sessions: int, seed: int):
+    """Ordered list of (endpoint, method, path, body) requests"""
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    plan = []
+    for message in messages:
+        session_id = f"bench_{rng.randrange(sessions)}"
+        endpoint = rng.choices(names, weights)[0]
+        if endpoint == 'chat':
+            plan.append(('chat', 'POST', '/api/chat', {"session_id": session_id, "message": message}))
+        elif endpoint == 'batch':
+            items = [{"session_id": session_id, "message": m} for m in rng.sample(messages, min(20, len(messages)))]
+            plan.append(('batch', 'POST', '/api/chat/batch', {"items": items}))
+        elif endpoint == 'conversation':
+            plan.append(('conversation', 'GET', f'/api/conversation/{session_id}?limit=50', None))
+        elif endpoint == 'analytics':
+            plan.append(('analytics', 'GET', '/api/analytics', None))
+        elif endpoint == 'health':
+            plan.append(('health', 'GET', '/api/health', None))
+        else:
+            raise SystemExit(f"Unknown endpoint '{endpoint}' in --mix")
+    return plan
+
+
+def run_plan(target, plan, concurrency: int) -> Dict:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    position = iter(range(len(plan)))
+
+    def worker():
+        while True:
+            with lock:
+                n = next(position, None)
+            if n is None:
+                return
+            endpoint, method, path, body = plan[n]
+            started = time.perf_counter()
+            try:
+                status = target.request(method, path, body)
+            except Exception:
+                status = 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies[endpoint].append(elapsed_ms)
+                if status >= 400 or status == 0:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {name: summarize(values, errors[name], elapsed) for name, values in sorted(latencies.items())}
+    report['overall'] = summarize([v for values in latencies.values() for v in values],
+                                  sum(errors.values()), elapsed)
+    report['overall']['elapsed_s'] = round(elapsed, 3)
+    return report
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Endpoints whose throughput dropped or p95 grew by more than ``tolerance``"""
+    regressions = []
+    for endpoint, stats in current['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(endpoint)
+        if not base:
+            continue
+        if base['throughput_rps'] and stats['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{endpoint}: throughput {stats['throughput_rps']} < baseline {base['throughput_rps']}")
+        if base['p95_ms'] and stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {stats['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    return regressions
+
+
+def print_report(endpoints: Dict):
+    print(f"{'endpoint':<14}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in endpoints.items():
+        print(f"{name:<14}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+
+
+def configure_in_process(faqs: Dict, corpus_size: int, seed: int) -> Dict:
+    """Point the app at a scratch database (and grown corpus) before importing it"""
+    scratch = tempfile.mkdtemp(prefix='chatbot-bench-')
+    os.environ.setdefault('CHATBOT_DB_PATH', os.path.join(scratch, 'bench.db'))
+    os.environ.setdefault('CHATBOT_FAQ_RELOAD_INTERVAL', '0')
+    if corpus_size:
+        faqs = synthetic_corpus(faqs, corpus_size, seed)
+        corpus_path = os.path.join(scratch, 'faqs.json')
+        with open(corpus_path, 'w', encoding='utf-8') as corpus_file:
+            json.dump(faqs, corpus_file)
+        os.environ['CHATBOT_FAQ_PATH'] = corpus_path
+    sys.path.insert(0, BACKEND_DIR)
+    return faqs
+
+
+def load_command(args) -> int:
+    faqs = load_faqs()
+
+    if args.target == 'testclient':
+        faqs = configure_in_process(faqs, args.corpus_size, args.seed)
+        target = TestClientTarget()
+    else:
+        target = HTTPTarget(args.target)
+
+    if args.source == 'db':
+        messages = recorded_messages(args.db, args.requests, args.seed)
+    else:
+        messages = synthetic_messages(faqs, args.requests, args.seed)
+
+    plan = build_plan(messages, parse_mix(args.mix), args.sessions, args.seed)
+    for warm in plan[:args.warmup]:
+        target.request(*warm[1:])
+    report = run_plan(target, plan, args.concurrency)
+
+    overall = report.pop('overall')
+    result = {
+        "config": {
+            "target": args.target, "source": args.source, "requests": args.requests,
+            "concurrency": args.concurrency, "corpus_size": len(faqs), "mix": args.mix,
+            "matcher": os.environ.get('CHATBOT_MATCHER', 'additive'),
+            "write_mode": os.environ.get('CHATBOT_WRITE_MODE', 'sync'),
+        },
+        "started_at": datetime.now().isoformat(),
+        "endpoints": report,
+        "overall": overall,
+    }
+    print_report(dict(report, overall=overall))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+def nlp_command(args) -> int:
+    """Time and trace allocations of the message analysis pipeline alone"""
+    faqs = configure_in_process(load_faqs(), args.corpus_size, args.seed)
+    from app import BrandsetuChatbot
+
+    # A private instance without a response cache: every message runs every NLP stage
+    chatbot = BrandsetuChatbot(reload_interval=0)
+    chatbot.cache.max_size = 0
+    corpus = chatbot.corpus
+    messages = synthetic_messages(faqs, args.messages, args.seed)
+    for message in messages[:args.warmup]:
+        chatbot.analyze(message, corpus)
+
+    per_message_us = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        for message in messages:
+            chatbot.analyze(message, corpus)
+        per_message_us.append((time.perf_counter() - started) / len(messages) * 1e6)
+
+    # Peak traced memory above the starting point while analysing one message
+    peaks = []
+    tracemalloc.start()
+    try:
+        for message in messages:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            chatbot.analyze(message, corpus)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+
+    result = {
+        "config": {"messages": len(messages), "repeat": args.repeat, "corpus_size": len(corpus.faqs),
+                   "matcher": corpus.matcher_name},
+        "started_at": datetime.now().isoformat(),
+        "best_us_per_message": round(min(per_message_us), 2),
+        "median_us_per_message": round(sorted(per_message_us)[len(per_message_us) // 2], 2),
+        "messages_per_sec": round(1e6 / min(per_message_us), 1),
+        "mean_peak_bytes": round(sum(peaks) / len(peaks)),
+        "p95_peak_bytes": percentile(peaks, 95),
+    }
+    print(f"{result['best_us_per_message']:.1f} us/message (best of {args.repeat}), "
+          f"{result['messages_per_sec']:.0f} messages/s, "
+          f"peak {result['mean_peak_bytes']} B/message (p95 {result['p95_peak_bytes']} B)")
+    chatbot.db.close()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+def shard_writer(db_path: str, shards: int, exchanges: int, sessions: int, seed: int, start, results):
+    """One worker process: persist ``exchanges`` chat exchanges as /api/chat would"""
+    from app import open_database
+
+    db = open_database(db_path, shards, write_mode='sync')
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    start.wait()
+    began = time.perf_counter()
+    for n in range(exchanges):
+        session_id = f"bench-{rng.randrange(sessions)}"
+        writes = [
+            *db.message_writes(session_id, "user", f"message {n}"),
+            *db.message_writes(session_id, "bot", "reply", "reply", "seo_overview"),
+            db.analytics_write(session_id, "message_processed", {
+                "intent": "seo", "entities": {}, "matched_faq": "seo_overview", "confidence": 0.5}),
+        ]
+        started = time.perf_counter()
+        try:
+            db.write_many(writes)
+        except sqlite3.OperationalError:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    results.put((began, time.perf_counter(), latencies, errors))
+    db.close()
+
+
+def shards_command(args) -> int:
+    """Concurrent write throughput of the chat path for several shard counts"""
+    configure_in_process({}, 0, args.seed)
+    scratch = tempfile.mkdtemp(prefix='chatbot-shards-')
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for shards in [int(count) for count in args.shards.split(',')]:
+        db_path = os.path.join(scratch, f'shards{shards}.db')
+        start, results = context.Barrier(args.workers + 1), context.Queue()
+        workers = [context.Process(target=shard_writer, args=(
+            db_path, shards, args.exchanges, args.sessions, args.seed + n, start, results))
+            for n in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        reports = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        elapsed = max(report[1] for report in reports) - min(report[0] for report in reports)
+        latencies = sorted(latency for report in reports for latency in report[2])
+        run = {
+            "shards": shards,
+            "exchanges_per_sec": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "errors": sum(report[3] for report in reports),
+        }
+        runs.append(run)
+        print(f"{shards:>3} shard(s): {run['exchanges_per_sec']:>8.0f} exchanges/s  "
+              f"p50 {run['p50_ms']:.2f} ms  p99 {run['p99_ms']:.2f} ms  max {run['max_ms']:.1f} ms  "
+              f"errors {run['errors']}")
+
+    result = {
+        "config": {"workers": args.workers, "exchanges_per_worker": args.exchanges, "sessions": args.sessions,
+                   "synchronous": os.environ.get('CHATBOT_DB_SYNCHRONOUS', 'NORMAL')},
+        "started_at": datetime.now().isoformat(),
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='replay traffic and report latency per endpoint')
+    load.add_argument('--target', default='testclient', help='"testclient" or a base URL like http://localhost:5000')
+    load.add_argument('--source', choices=['synthetic', 'db'], default='synthetic')
+    load.add_argument('--db', default=os.path.join(BACKEND_DIR, 'chatbot.db'), help='database to replay with --source db')
+    load.add_argument('--requests', type=int, default=2000)
+    load.add_argument('--concurrency', type=int, default=4)
+    load.add_argument('--sessions', type=int, default=200, help='distinct session ids in the replay')
+    load.add_argument('--corpus-size', type=int, default=0, help='grow the FAQ corpus to N entries (testclient only)')
+    load.add_argument('--mix', default=DEFAULT_MIX, help=f'endpoint weights (default {DEFAULT_MIX})')
+    load.add_argument('--warmup', type=int, default=50, help='requests sent before measuring')
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--output', help='write results as JSON')
+    load.add_argument('--compare', help='baseline JSON; exit 1 on regression')
+    load.add_argument('--tolerance', type=float, default=0.10, help='allowed regression ratio (default 0.10)')
+    load.set_defaults(handler=load_command)
+
+    nlp = commands.add_parser('nlp', help='time and trace allocations of message analysis alone')
+    nlp.add_argument('--messages', type=int, default=2000)
+    nlp.add_argument('--repeat', type=int, default=5, help='timed passes over the messages; the best is reported')
+    nlp.add_argument('--corpus-size', type=int, default=0, help='grow the FAQ corpus to N entries')
+    nlp.add_argument('--warmup', type=int, default=200, help='messages analysed before measuring')
+    nlp.add_argument('--seed', type=int, default=0)
+    nlp.add_argument('--output', help='write results as JSON')
+    nlp.set_defaults(handler=nlp_command)
+
+    shards = commands.add_parser('shards', help='concurrent write throughput across shard counts')
+    shards.add_argument('--shards', default='1,2,4,8', help='comma-separated shard counts to compare')
+    shards.add_argument('--workers', type=int, default=8, help='writer processes, like gunicorn workers')
+    shards.add_argument('--exchanges', type=int, default=500, help='chat exchanges each worker persists')
+    shards.add_argument('--sessions', type=int, default=1000, help='distinct session ids written to')
+    shards.add_argument('--seed', type=int, default=0)
+    shards.add_argument('--output', help='write results as JSON')
+    shards.set_defaults(handler=shards_command)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
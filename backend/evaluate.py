@@ -0,0 +1,223 @@
+"""
+Brandsetu Digital Chatbot - matcher accuracy and latency evaluation
+
+Scores each pluggable matcher on a gold set of hand-labelled
+(question, expected FAQ key, expected intent) entries: the questions of
+Document.md and the frontend qaData.ts, the FAQ menu, paraphrases,
+misspellings and out-of-scope questions whose right answer is the fallback.
+Reports top-1/top-3 accuracy, fallback rate, intent accuracy and the
+per-query latency distribution. Results are saved as JSON; --compare and
+--min-top1 exit 1 on a regression, so a run can gate a change.
+
+    python evaluate.py
+    python evaluate.py --matchers additive,bm25 --output baseline.json
+    python evaluate.py --compare baseline.json --show-failures
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from bench import BACKEND_DIR, DEFAULT_FAQ_PATH, configure_in_process, load_faqs, percentile
+
+DEFAULT_GOLD_PATH = os.path.join(BACKEND_DIR, 'gold_questions.json')
+DEFAULT_MATCHERS = 'additive,tfidf,bm25'
+
+# Higher is better for these, lower for the rest
+ACCURACY_METRICS = ('top1', 'top3', 'intent_accuracy')
+ERROR_METRICS = ('fallback_rate', 'out_of_scope_answered')
+
+
+def load_gold(path: str = DEFAULT_GOLD_PATH) -> List[Dict]:
+    with open(path, encoding='utf-8') as gold_file:
+        return json.load(gold_file)
+
+
+def gold_version(gold: List[Dict]) -> str:
+    return hashlib.sha256(json.dumps(gold, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def ratio(count: int, total: int) -> float:
+    return round(count / total, 4) if total else 0.0
+
+
+def evaluate(corpus, gold: List[Dict], repeat: int = 5) -> Dict:
+    """Accuracy and per-query latency of one compiled corpus on the gold set
+
+    A question counts as answered only when its match clears the confidence
+    threshold the chatbot applies; an out-of-scope entry (``expected`` null)
+    is right when it falls back. Top-3 asks whether the expected FAQ is among
+    the three best-ranked ones, whatever their confidence.
+    """
+    from app import BrandsetuChatbot, MessageAnalysis
+
+    totals, by_source = Counter(), defaultdict(Counter)
+    failures, intent_misses, latencies = [], [], []
+    for entry in gold:
+        question, expected = entry['question'], entry['expected']
+        analysis = MessageAnalysis(question, corpus.index)
+        _, confidence, faq_key = corpus.find_best_matches([analysis])[0]
+        answered = faq_key if faq_key is not None and confidence > BrandsetuChatbot.MIN_CONFIDENCE else None
+        correct = answered == expected
+
+        by_source[entry['source']]['questions'] += 1
+        by_source[entry['source']]['top1'] += correct
+        if expected is None:
+            totals['out_of_scope'] += 1
+            totals['out_of_scope_answered'] += answered is not None
+        else:
+            totals['in_scope'] += 1
+            totals['top1'] += correct
+            totals['top3'] += expected in corpus.rank(question, 3)
+            totals['fallbacks'] += answered is None
+        if not correct:
+            failures.append({"question": question, "expected": expected, "answered": answered,
+                             "confidence": round(confidence, 3)})
+        if entry.get('intent'):
+            totals['intents'] += 1
+            totals['intent_correct'] += analysis.intent == entry['intent']
+            if analysis.intent != entry['intent']:
+                intent_misses.append({"question": question, "expected": entry['intent'], "got": analysis.intent})
+
+        # Best of ``repeat`` full analyses (tokenize, match, intent, entities) of a fresh message
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            timed = MessageAnalysis(question, corpus.index)
+            corpus.find_best_matches([timed])
+            timed.intent, timed.entities
+            best = min(best, time.perf_counter() - started)
+        latencies.append(best * 1e6)
+
+    latencies.sort()
+    return {
+        "questions": len(gold),
+        "top1": ratio(totals['top1'], totals['in_scope']),
+        "top3": ratio(totals['top3'], totals['in_scope']),
+        "fallback_rate": ratio(totals['fallbacks'], totals['in_scope']),
+        "out_of_scope_answered": ratio(totals['out_of_scope_answered'], totals['out_of_scope']),
+        "intent_accuracy": ratio(totals['intent_correct'], totals['intents']),
+        "by_source": {source: ratio(counts['top1'], counts['questions']) for source, counts in sorted(by_source.items())},
+        "latency_us": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "failures": failures,
+        "intent_misses": intent_misses,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, accuracy_drop: float = 0.0) -> List[str]:
+    """Matchers whose accuracy fell by more than ``accuracy_drop`` or whose p95 grew by more than ``tolerance``"""
+    regressions = []
+    for matcher, stats in current['matchers'].items():
+        base = baseline.get('matchers', {}).get(matcher)
+        if not base:
+            continue
+        for metric in ACCURACY_METRICS:
+            if stats[metric] < base[metric] - accuracy_drop:
+                regressions.append(f"{matcher}: {metric} {stats[metric]:.2%} < baseline {base[metric]:.2%}")
+        for metric in ERROR_METRICS:
+            if stats[metric] > base[metric] + accuracy_drop:
+                regressions.append(f"{matcher}: {metric} {stats[metric]:.2%} > baseline {base[metric]:.2%}")
+        p95, base_p95 = stats['latency_us']['p95'], base['latency_us']['p95']
+        if base_p95 and p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{matcher}: p95 {p95}us > baseline {base_p95}us")
+    return regressions
+
+
+def print_report(matchers: Dict, show_failures: bool = False):
+    print(f"{'matcher':<10}{'top-1':>8}{'top-3':>8}{'fallback':>10}{'oos hit':>9}{'intent':>8}"
+          f"{'p50 us':>9}{'p95 us':>9}{'p99 us':>9}")
+    for name, stats in matchers.items():
+        latency = stats['latency_us']
+        print(f"{name:<10}{stats['top1']:>8.1%}{stats['top3']:>8.1%}{stats['fallback_rate']:>10.1%}"
+              f"{stats['out_of_scope_answered']:>9.1%}{stats['intent_accuracy']:>8.1%}"
+              f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}")
+    for name, stats in matchers.items():
+        print(f"\n{name} top-1 by source: " + ", ".join(
+            f"{source} {accuracy:.0%}" for source, accuracy in stats['by_source'].items()))
+        if show_failures:
+            for failure in stats['failures']:
+                print(f"  MISS {failure['question']!r}: expected {failure['expected']}, "
+                      f"answered {failure['answered']} ({failure['confidence']})")
+    if show_failures and matchers:
+        # Intent extraction reads the keyword index, which every matcher shares
+        print("\nintent misses:")
+        for miss in next(iter(matchers.values()))['intent_misses']:
+            print(f"  INTENT {miss['question']!r}: expected {miss['expected']}, got {miss['got']}")
+
+
+def run(args) -> int:
+    configure_in_process(load_faqs(args.faqs), 0, 0)
+    import app
+    from app import FAQCorpus
+
+    gold = load_gold(args.gold)
+    matchers = {}
+    for name in args.matchers.split(','):
+        corpus = FAQCorpus.from_file(args.faqs, name.strip())
+        matchers[corpus.matcher_name] = evaluate(corpus, gold, args.repeat)
+
+    result = {
+        "config": {"gold": os.path.basename(args.gold), "gold_version": gold_version(gold),
+                   "questions": len(gold), "faqs": os.path.basename(args.faqs), "corpus_version": corpus.version,
+                   "fuzzy_weight": app.FUZZY_WEIGHT, "repeat": args.repeat},
+        "started_at": datetime.now().isoformat(),
+        "matchers": matchers,
+    }
+    print_report(matchers, args.show_failures)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(result, output, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    regressions = [f"{name}: top1 {stats['top1']:.2%} < required {args.min_top1:.2%}"
+                   for name, stats in matchers.items() if stats['top1'] < args.min_top1]
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('config', {}).get('gold_version') != result['config']['gold_version']:
+            print(f"\nNote: {args.compare} was scored on a different gold set")
+        regressions += compare(result, baseline, args.tolerance, args.accuracy_drop)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    if args.compare:
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gold', default=DEFAULT_GOLD_PATH, help='gold question set (JSON)')
+    parser.add_argument('--faqs', default=DEFAULT_FAQ_PATH, help='FAQ corpus to evaluate')
+    parser.add_argument('--matchers', default=DEFAULT_MATCHERS, help=f'comma-separated (default {DEFAULT_MATCHERS})')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per question; the best is kept')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 latency growth (default 0.25)')
+    parser.add_argument('--accuracy-drop', type=float, default=0.0,
+                        help='allowed fall in any accuracy ratio (default 0: none)')
+    parser.add_argument('--min-top1', type=float, default=0.0, help='exit 1 if any matcher scores below this')
+    parser.add_argument('--show-failures', action='store_true', help='list every missed question')
+    return parser
+
+
+def main(argv=None) -> int:
+    return run(build_parser().parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
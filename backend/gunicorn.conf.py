@@ -0,0 +1,78 @@
+"""
+Gunicorn settings for serving the chatbot in production
+
+    cd backend && gunicorn -c gunicorn.conf.py
+
+The app is preloaded: the master calls ``create_app()`` once and, with
+CHATBOT_WARMUP=sync (the default here), loads the FAQ corpus (from its
+snapshot, or compiling the keyword index and matcher) and migrates the
+database before forking the workers. Workers share those structures
+copy-on-write instead of each building its own.
+
+``gc.freeze()`` before forking moves the preloaded objects out of the
+collector's reach, so collections in a worker do not write to (and thereby
+copy) the shared pages. The master also closes its SQLite connections and
+stops its corpus watcher before each fork; workers open their own
+connections and restart the watcher in ``post_fork``.
+
+Writes from several workers go to one SQLite file. WAL journaling and
+busy_timeout (CHATBOT_DB_BUSY_TIMEOUT_MS) make a worker wait for the write
+lock rather than fail; CHATBOT_WRITE_MODE=write_behind additionally batches
+each worker's inserts so the lock is taken once per batch.
+"""
+
+import gc
+import os
+import tempfile
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('CHATBOT_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('CHATBOT_WORKERS', str(2 * (os.cpu_count() or 1) + 1)))
+threads = int(os.environ.get('CHATBOT_THREADS', '1'))
+preload_app = os.environ.get('CHATBOT_PRELOAD', '1') != '0'
+timeout = int(os.environ.get('CHATBOT_WORKER_TIMEOUT', '30'))
+accesslog = os.environ.get('CHATBOT_ACCESS_LOG')
+errorlog = '-'
+
+# /api/metrics in any worker merges the histograms of all of them
+os.environ.setdefault('CHATBOT_METRICS_DIR', tempfile.mkdtemp(prefix='chatbot-metrics-'))
+
+# Keep the collector from leaving freed holes in pages the workers will share
+if preload_app:
+    gc.disable()
+    # Otherwise create_app defers all loading to each worker's first request
+    os.environ.setdefault('CHATBOT_WARMUP', 'sync')
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # The application the master preloaded (and every worker inherits)
+    chatbot = server.app.wsgi().extensions['chatbot']
+    chatbot.before_fork()
+    # Objects created since (e.g. a corpus reloaded by the master) join the frozen set
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from app import metrics
+    extensions = server.app.wsgi().extensions
+    chatbot = extensions['chatbot']
+    metrics.after_fork()
+    chatbot.after_fork()
+    extensions['startup'].after_fork(chatbot)
+    server.log.info(f"Worker {worker.pid} serving FAQ corpus {chatbot.corpus.version}")
+
+
+def worker_exit(server, worker):
+    # A recycled (max_requests) or stopped worker leaves its last observations for /api/metrics
+    from app import metrics
+    metrics.flush_pending()
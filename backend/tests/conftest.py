@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# create_app builds the chatbot; keep it away from the committed chatbot.db
+os.environ.setdefault('CHATBOT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'chatbot.db'))
+os.environ.setdefault('CHATBOT_FAQ_RELOAD_INTERVAL', '0')
+# Compiled corpus snapshots would otherwise land in the user's cache directory
+os.environ.setdefault('CHATBOT_INDEX_SNAPSHOT_DIR', tempfile.mkdtemp())
+
+from app import create_app  # reads the settings above
+
+
+@pytest.fixture
+def app_config():
+    """Settings for create_app beyond the environment; override per module"""
+    return {}
+
+
+@pytest.fixture
+def flask_app(app_config):
+    flask_app = create_app(app_config)
+    yield flask_app
+    flask_app.extensions['chatbot'].db.close()
+    if flask_app.extensions['tenants'] is not None:
+        flask_app.extensions['tenants'].close()
+
+
+@pytest.fixture
+def chatbot(flask_app):
+    return flask_app.extensions['chatbot']
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
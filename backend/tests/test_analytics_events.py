@@ -0,0 +1,130 @@
+"""Typed message events and the time-bucketed reports built on them"""
+
+import json
+import shutil
+
+import pytest
+
+from app import DatabaseManager
+
+from test_migrations import LEGACY_DB, query_plan
+
+
+def typed_from_json(conn):
+    """The typed rows as the JSON blobs describe them"""
+    rows = []
+    for row in conn.execute("SELECT * FROM analytics WHERE event_type = 'message_processed' ORDER BY id"):
+        data = json.loads(row["event_data"])
+        entities = data.get("entities") or {}
+        rows.append((row["timestamp"], row["id"], row["session_id"], data.get("intent"),
+                     data.get("matched_faq"), data.get("confidence"),
+                     int("email" in entities or "phone" in entities)))
+    return rows
+
+
+def typed_rows(conn):
+    return [tuple(row) for row in conn.execute(
+        "SELECT timestamp, id, session_id, intent, matched_faq, confidence, has_contact "
+        "FROM message_events ORDER BY id")]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "events.db"))
+    events = [("greeting", "fallback", 0.0, {}), ("seo", "seo_overview", 0.62, {}),
+              ("seo", "seo_overview", 1.0, {"email": "a@b.co"}), ("pricing", "fallback", 0.05, {"phone": "9876543210"})]
+    for n in range(40):
+        intent, faq, confidence, entities = events[n % len(events)]
+        db.save_analytics(f"s{n % 5}", "message_processed", {
+            "intent": intent, "entities": entities, "matched_faq": faq, "confidence": confidence})
+    db.save_analytics("s0", "contact_captured", {"email": "a@b.co"})
+    with db.connection() as conn:
+        # Rows on four consecutive days of June 2024
+        conn.execute("UPDATE analytics SET timestamp = datetime('2024-06-01 10:00:00', '+' || (id % 4) || ' days')")
+        conn.execute("DELETE FROM message_events")
+        conn.execute("""
+            INSERT INTO message_events
+            SELECT timestamp, id, session_id, json_extract(event_data, '$.intent'),
+                   json_extract(event_data, '$.matched_faq'), json_extract(event_data, '$.confidence'),
+                   json_extract(event_data, '$.entities.email') IS NOT NULL
+                       OR json_extract(event_data, '$.entities.phone') IS NOT NULL
+            FROM analytics WHERE event_type = 'message_processed'
+        """)
+        conn.commit()
+    return db
+
+
+def test_backfill_matches_the_json_blobs(tmp_path):
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    db = DatabaseManager(str(path))
+    with db.connection() as conn:
+        expected = typed_from_json(conn)
+        assert expected and typed_rows(conn) == expected
+
+
+def test_trigger_keeps_every_write_path_in_step(tmp_path):
+    db = DatabaseManager(str(tmp_path / "trigger.db"), write_mode="write_behind")
+    db.save_analytics("s", "message_processed", {"intent": "seo", "entities": {"phone": "9876543210"},
+                                                  "matched_faq": "seo_overview", "confidence": 0.5})
+    db.save_analytics("s", "message_processed", {"intent": "greeting", "entities": {},
+                                                  "matched_faq": "fallback", "confidence": 0.0})
+    db.save_analytics("s", "contact_captured", {"phone": "9876543210"})
+    db.flush()
+    with db.connection() as conn:
+        rows = typed_rows(conn)
+        assert rows == typed_from_json(conn)
+    assert [row[3:] for row in rows] == [("seo", "seo_overview", 0.5, 1), ("greeting", "fallback", 0.0, 0)]
+
+
+def test_intent_distribution(db):
+    series = db.intent_distribution("2024-06-01", "2024-06-03")
+    assert [entry["bucket"] for entry in series] == ["2024-06-01", "2024-06-02"]
+    assert all(entry["total"] == 10 for entry in series)
+    month = db.intent_distribution("2024-01-01", "2025-01-01", bucket="month")
+    assert month == [{"bucket": "2024-06", "total": 40, "intents": {"greeting": 10, "pricing": 10, "seo": 20}}]
+    with pytest.raises(ValueError):
+        db.intent_distribution("2024-01-01", "2025-01-01", bucket="fortnight")
+
+
+def test_confidence_histogram(db):
+    histogram = db.confidence_histogram("2024-01-01", "2025-01-01", bins=4)
+    assert [(entry["lower"], entry["upper"]) for entry in histogram] == [(0, 0.25), (0.25, 0.5), (0.5, 0.75), (0.75, 1)]
+    # 1.0 lands in the top bin rather than a fifth one
+    assert [entry["count"] for entry in histogram] == [20, 0, 10, 10]
+
+
+def test_fallback_rate(db):
+    series = db.fallback_rate("2024-01-01", "2025-01-01", bucket="week")
+    assert sum(entry["messages"] for entry in series) == 40
+    assert sum(entry["fallbacks"] for entry in series) == 20
+    assert all(0 <= entry["rate"] <= 1 for entry in series)
+
+
+def test_reports_read_a_primary_key_range(db):
+    for sql in ["SELECT strftime('%Y-%m-%d', timestamp), intent, COUNT(*) FROM message_events "
+                "WHERE timestamp >= ? AND timestamp < ? GROUP BY 1, 2",
+                "SELECT COUNT(*) FROM message_events WHERE timestamp >= ? AND timestamp < ?"]:
+        plan = query_plan(db, sql, ("2024-06-01", "2024-06-02"))
+        assert "SEARCH message_events USING PRIMARY KEY (timestamp>? AND timestamp<?)" in plan
+
+
+def test_report_endpoints(client, chatbot):
+    client.post("/api/chat", json={"message": "Tell me about SEO", "session_id": "report-session"})
+    chatbot.db.flush()
+
+    intents = client.get("/api/analytics/intents?bucket=hour").get_json()
+    assert intents["success"] and intents["data"]["series"]
+    assert sum(entry["total"] for entry in intents["data"]["series"]) >= 1
+
+    histogram = client.get("/api/analytics/confidence?bins=5").get_json()["data"]["series"]
+    assert len(histogram) == 5 and sum(entry["count"] for entry in histogram) >= 1
+
+    rate = client.get("/api/analytics/fallback-rate?since=2000-01-01&until=2100-01-01T00:00:00Z").get_json()
+    assert rate["data"]["until"] == "2100-01-01 00:00:00"
+    assert rate["data"]["series"]
+
+    assert client.get("/api/analytics/intents?bucket=fortnight").status_code == 400
+    assert client.get("/api/analytics/confidence?bins=0").status_code == 400
+    assert client.get("/api/analytics/fallback-rate?since=yesterday").status_code == 400
+    assert client.get("/api/analytics/fallback-rate?since=2024-02-01&until=2024-01-01").status_code == 400
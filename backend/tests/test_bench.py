@@ -0,0 +1,58 @@
+"""Benchmark harness helpers and a smoke run"""
+
+import json
+
+import bench
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert bench.percentile(values, 50) == 50
+    assert bench.percentile(values, 95) == 95
+    assert bench.percentile(values, 99) == 99
+    assert bench.percentile([7.0], 99) == 7.0
+    assert bench.percentile([], 50) == 0.0
+
+
+def test_compare_flags_regressions():
+    baseline = {"endpoints": {"chat": {"throughput_rps": 100.0, "p95_ms": 10.0}}}
+    ok = {"endpoints": {"chat": {"throughput_rps": 95.0, "p95_ms": 10.5}}}
+    slow = {"endpoints": {"chat": {"throughput_rps": 50.0, "p95_ms": 30.0}}}
+    assert bench.compare(ok, baseline, 0.10) == []
+    assert len(bench.compare(slow, baseline, 0.10)) == 2
+
+
+def test_synthetic_corpus_and_messages():
+    faqs = bench.load_faqs()
+    corpus = bench.synthetic_corpus(faqs, 100, seed=1)
+    assert len(corpus) == 100 and set(faqs) <= set(corpus)
+    assert len(bench.synthetic_messages(corpus, 50, seed=1)) == 50
+
+
+def test_load_smoke_run(tmp_path):
+    output = tmp_path / "run.json"
+    assert bench.main(["load", "--requests", "40", "--concurrency", "2", "--warmup", "0",
+                       "--output", str(output)]) == 0
+    result = json.loads(output.read_text())
+    assert result["overall"]["requests"] == 40
+    assert result["overall"]["errors"] == 0
+    assert bench.main(["load", "--requests", "40", "--concurrency", "2", "--warmup", "0",
+                       "--compare", str(output), "--tolerance", "100"]) == 0
+
+
+def test_nlp_smoke_run(tmp_path):
+    output = tmp_path / "nlp.json"
+    assert bench.main(["nlp", "--messages", "50", "--repeat", "1", "--warmup", "0",
+                       "--output", str(output)]) == 0
+    result = json.loads(output.read_text())
+    assert result["config"]["messages"] == 50
+    assert result["best_us_per_message"] > 0 and result["mean_peak_bytes"] > 0
+
+
+def test_shards_smoke_run(tmp_path):
+    output = tmp_path / "shards.json"
+    assert bench.main(["shards", "--shards", "1,2", "--workers", "2", "--exchanges", "20",
+                       "--output", str(output)]) == 0
+    runs = json.loads(output.read_text())["runs"]
+    assert [run["shards"] for run in runs] == [1, 2]
+    assert all(run["exchanges_per_sec"] > 0 and run["errors"] == 0 for run in runs)
@@ -0,0 +1,85 @@
+"""Batch chat endpoint"""
+
+import sqlite3
+
+import pytest
+
+from app import DatabaseManager
+
+
+def test_batch_results_follow_input_order(client, chatbot):
+    messages = ["seo reports", "Which platforms do you manage?", "hello", "free consultation"]
+    items = [{"session_id": f"batch_{n}", "message": message} for n, message in enumerate(messages)]
+    body = client.post("/api/chat/batch", json={"items": items}).get_json()
+    assert body["success"] is True
+    assert [result["session_id"] for result in body["results"]] == [item["session_id"] for item in items]
+    for message, result in zip(messages, body["results"]):
+        single = chatbot.generate_response(message, "batch_compare")
+        assert result["data"]["response"] == single["response"]
+        assert result["data"]["intent"] == single["intent"]
+
+
+def test_invalid_items_do_not_fail_the_batch(client, chatbot):
+    items = [{"session_id": "batch_ok", "message": "seo"}, {"session_id": "batch_bad"}, "junk",
+             {"session_id": "batch_blank", "message": "   "}]
+    body = client.post("/api/chat/batch", json={"items": items}).get_json()
+    assert [result["success"] for result in body["results"]] == [True, False, False, False]
+    assert len(chatbot.db.get_conversation("batch_ok")) == 2
+    assert chatbot.db.get_conversation("batch_bad") == []
+
+
+def test_batch_rows_are_persisted_with_contact_events(client, chatbot):
+    items = [{"session_id": "batch_lead", "message": "reach me at lead@example.com"},
+             {"session_id": "batch_lead", "message": "seo"}]
+    client.post("/api/chat/batch", json={"items": items})
+    history = chatbot.db.get_conversation("batch_lead")
+    assert [row["message_type"] for row in history] == ["user", "bot", "user", "bot"]
+    with chatbot.db.connection() as conn:
+        events = conn.execute(
+            "SELECT event_type FROM analytics WHERE session_id = 'batch_lead' ORDER BY id").fetchall()
+    assert [row[0] for row in events] == ["message_processed", "contact_captured", "message_processed"]
+
+
+def test_items_that_fail_to_be_answered_or_saved_fail_alone(monkeypatch, client, chatbot):
+    analyze_batch, analytics_write = chatbot.analyze_batch, chatbot.db.analytics_write
+
+    def fragile_analysis(messages, corpus):
+        if "boom" in messages:
+            raise RuntimeError("analysis failed")
+        return analyze_batch(messages, corpus)
+
+    def fragile_write(session_id, *args):
+        if session_id == "batch_unsaved":
+            return "INSERT INTO no_such_table VALUES (?)", (session_id,)
+        return analytics_write(session_id, *args)
+
+    monkeypatch.setattr(chatbot, "analyze_batch", fragile_analysis)
+    monkeypatch.setattr(chatbot.db, "analytics_write", fragile_write)
+    items = [{"session_id": "batch_fine", "message": "seo"}, {"session_id": "batch_boom", "message": "boom"},
+             {"session_id": "batch_unsaved", "message": "seo"}, {"session_id": "batch_fine", "message": "hello"}]
+    response = client.post("/api/chat/batch", json={"items": items})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["success"] for result in results] == [True, False, False, True]
+    assert results[1]["session_id"] == "batch_boom" and results[2]["error"]
+    assert len(chatbot.db.get_conversation("batch_fine")) == 4
+    assert chatbot.db.get_conversation("batch_boom") == chatbot.db.get_conversation("batch_unsaved") == []
+
+
+def test_new_response_text_commits_with_its_turn(tmp_path):
+    db = DatabaseManager(str(tmp_path / "atomic.db"))
+    writes = db.message_writes("s", "bot", "A brand new answer", "A brand new answer", "seo")
+    with pytest.raises(sqlite3.OperationalError):
+        db.write_many(writes + [("INSERT INTO no_such_table VALUES (?)", ("s",))])
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+    db.write_many(writes)
+    assert db.get_conversation("s")[0]["message"] == "A brand new answer"
+    assert len(db.message_writes("s", "bot", "A brand new answer", "A brand new answer", "seo")) == 1
+
+
+def test_malformed_batches_are_rejected(client):
+    assert client.post("/api/chat/batch", json={}).status_code == 400
+    assert client.post("/api/chat/batch", json={"items": []}).status_code == 400
+    assert client.post("/api/chat/batch", data="nope").status_code == 400
@@ -0,0 +1,74 @@
+"""Keyset pagination and streaming of conversation history"""
+
+import json
+
+import pytest
+
+from app import DatabaseManager
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {"CHATBOT_DB_PATH": str(tmp_path / "history.db")}
+
+
+@pytest.fixture
+def session_id(chatbot):
+    session_id = "history_session"
+    for n in range(25):
+        chatbot.db.save_message(session_id, "user", f"question {n}")
+        chatbot.db.save_message(session_id, "bot", f"answer {n}", f"answer {n}", "fallback")
+    chatbot.db.save_message("other_session", "user", "noise")
+    return session_id
+
+
+def test_pages_cover_history_exactly_once(session_id, chatbot):
+    full = chatbot.db.get_conversation(session_id)
+    pages, after_id = [], None
+    while True:
+        page = chatbot.db.get_conversation(session_id, after_id, limit=7)
+        if not page:
+            break
+        pages.extend(page)
+        after_id = page[-1]["id"]
+    assert [row["id"] for row in pages] == [row["id"] for row in full]
+    assert len(full) == 50
+
+
+def test_endpoint_pagination(session_id, client):
+    seen, after_id = [], None
+    while True:
+        query = "?limit=20" + (f"&after_id={after_id}" if after_id else "")
+        data = client.get(f"/api/conversation/{session_id}{query}").get_json()["data"]
+        seen.extend(row["id"] for row in data["history"])
+        after_id = data["next_after_id"]
+        if after_id is None:
+            break
+    assert len(seen) == 50 and len(set(seen)) == 50
+
+
+def test_stream_matches_buffered_reply(session_id, client):
+    buffered = client.get(f"/api/conversation/{session_id}").get_json()
+    streamed = client.get(f"/api/conversation/{session_id}?stream=1")
+    assert streamed.mimetype == "application/json"
+    assert json.loads(streamed.get_data(as_text=True)) == buffered
+
+    empty = client.get("/api/conversation/nobody?stream=1")
+    assert json.loads(empty.get_data(as_text=True))["data"]["message_count"] == 0
+
+
+def test_bad_cursor_and_limit_are_rejected(session_id, client, chatbot):
+    other_id = chatbot.db.get_conversation("other_session")[0]["id"]
+    assert client.get(f"/api/conversation/{session_id}?after_id={other_id}").status_code == 400
+    assert client.get(f"/api/conversation/{session_id}?after_id={other_id}&stream=1").status_code == 400
+    assert client.get(f"/api/conversation/{session_id}?limit=0").status_code == 400
+
+
+def test_iter_conversation_fetches_in_chunks(tmp_path):
+    db = DatabaseManager(str(tmp_path / "chunks.db"))
+    for n in range(10):
+        db.save_message("s", "user", f"m{n}")
+    rows = db.iter_conversation("s", chunk_size=3)
+    assert next(rows)["message"] == "m0"
+    rows.close()  # returns the borrowed connection to the pool
+    assert [row["message"] for row in db.iter_conversation("s", chunk_size=3)] == [f"m{n}" for n in range(10)]
@@ -0,0 +1,68 @@
+"""FAQ corpus loading and hot reload"""
+
+import json
+import os
+
+import pytest
+
+from app import BrandsetuChatbot, CorpusWatcher, FAQ_PATH
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    path = tmp_path / "faqs.json"
+    with open(FAQ_PATH, encoding="utf-8") as source:
+        path.write_text(source.read(), encoding="utf-8")
+    return path
+
+
+def rewrite(path, mutate):
+    faqs = json.loads(path.read_text(encoding="utf-8"))
+    mutate(faqs)
+    path.write_text(json.dumps(faqs), encoding="utf-8")
+    # Make sure the watcher sees a new signature even on coarse mtime clocks
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_reload_swaps_in_new_corpus(corpus_path):
+    bot = BrandsetuChatbot(str(corpus_path), reload_interval=0)
+    watcher = CorpusWatcher(bot, interval=60)  # not started; polled by hand
+    old = bot.corpus
+    assert bot.find_best_match("pricing packages")[2] is None
+    assert watcher.check() is False
+
+    rewrite(corpus_path, lambda faqs: faqs.update(pricing={
+        "keywords": ["pricing packages"], "response": "From 15k/month.", "category": "pricing"}))
+
+    assert watcher.check() is True
+    assert watcher.check() is False
+
+    assert bot.corpus is not old and bot.corpus.version != old.version
+    assert bot.find_best_match("pricing packages")[2] == "pricing"
+    # A request holding the previous snapshot still sees consistent state
+    assert old.index.find_best_match("pricing packages")[2] is None
+
+
+def test_broken_file_keeps_serving_previous_version(corpus_path):
+    bot = BrandsetuChatbot(str(corpus_path), reload_interval=0)
+    version = bot.corpus.version
+    corpus_path.write_text("{not json", encoding="utf-8")
+    assert bot.reload_faqs() is False
+    assert bot.corpus.version == version
+    assert bot.last_reload_error
+
+
+@pytest.mark.parametrize("content", ['["a list"]', '{"seo": "just text"}', '{"seo": {"keywords": "seo"}}'])
+def test_malformed_corpus_is_rejected_before_first_load(corpus_path, content):
+    bot = BrandsetuChatbot(str(corpus_path), reload_interval=0)
+    corpus_path.write_text(content, encoding="utf-8")
+    assert bot.reload_faqs() is False
+    assert bot._corpus is None and bot.last_reload_error
+
+
+def test_health_reports_corpus_version(client):
+    body = client.get("/api/health").get_json()
+    assert body["corpus"]["version"]
+    assert body["corpus"]["faq_count"] > 0
+    assert "build_ms" in body["corpus"]
@@ -0,0 +1,88 @@
+"""Concurrency stress test for the pooled DatabaseManager
+
+Run with ``-s`` to see the throughput of pooled connections against opening
+a connection per call (pool_size=0), the pre-pooling behaviour.
+"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from app import DatabaseManager
+
+THREADS = 8
+WRITES_PER_THREAD = 150
+
+
+def hammer(db, thread_id, errors):
+    session_id = f"stress_{thread_id}"
+    try:
+        for n in range(WRITES_PER_THREAD):
+            db.save_message(session_id, "user", f"message {n}")
+            db.save_analytics(session_id, "message_processed", {"n": n})
+            if n % 25 == 0:
+                db.get_conversation(session_id)
+                db.get_analytics_summary()
+    except Exception as e:  # surfaced by the assertion below
+        errors.append(e)
+
+
+def run_threads(db):
+    errors = []
+    threads = [threading.Thread(target=hammer, args=(db, i, errors)) for i in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def process_worker(db_path, worker_id):
+    db = DatabaseManager(db_path)
+    errors = []
+    hammer(db, f"proc{worker_id}", errors)
+    return len(errors)
+
+
+@pytest.mark.parametrize("pool_size", [0, 8])
+def test_threaded_writers_lose_nothing(tmp_path, pool_size):
+    db = DatabaseManager(str(tmp_path / "stress.db"), pool_size=pool_size)
+    elapsed, errors = run_threads(db)
+    assert errors == []
+    summary = db.get_analytics_summary()
+    assert summary["total_sessions"] == THREADS
+    assert summary["total_messages"] == THREADS * WRITES_PER_THREAD
+    ops = THREADS * WRITES_PER_THREAD * 2
+    print(f"\npool_size={pool_size}: {ops / elapsed:.0f} writes/s across {THREADS} threads")
+
+
+def test_pooled_connections_are_reused(tmp_path):
+    db = DatabaseManager(str(tmp_path / "reuse.db"), pool_size=2)
+    with db.connection() as first:
+        pass
+    with db.connection() as second:
+        assert second is first
+        assert second.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_failed_unit_of_work_is_rolled_back(tmp_path):
+    db = DatabaseManager(str(tmp_path / "rollback.db"), pool_size=1)
+    with pytest.raises(RuntimeError):
+        with db.connection() as conn:
+            conn.execute("INSERT INTO feedback (session_id, rating) VALUES ('s', 5)")
+            raise RuntimeError("boom")
+    with db.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0] == 0
+
+
+def test_multiprocess_writers(tmp_path):
+    db_path = str(tmp_path / "procs.db")
+    DatabaseManager(db_path)
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        failures = pool.starmap(process_worker, [(db_path, i) for i in range(4)])
+    assert failures == [0, 0, 0, 0]
+    assert DatabaseManager(db_path).get_analytics_summary()["total_messages"] == 4 * WRITES_PER_THREAD
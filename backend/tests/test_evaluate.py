@@ -0,0 +1,68 @@
+"""Gold-set evaluation of the matchers and its regression gate"""
+
+import json
+import os
+import re
+
+import evaluate
+from app import FAQCorpus, NLPProcessor
+
+from conftest import BACKEND_DIR
+
+FRONTEND_QA = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "src", "data", "qaData.ts")
+
+
+def test_gold_set_covers_the_documented_questions(chatbot):
+    gold = evaluate.load_gold()
+    questions = {entry["question"] for entry in gold}
+    with open(os.path.join(BACKEND_DIR, "Document.md"), encoding="utf-8") as document:
+        documented = re.findall(r"^### Q: (.+)$", document.read(), re.MULTILINE)
+    assert documented and set(documented) <= questions
+    if os.path.exists(FRONTEND_QA):
+        with open(FRONTEND_QA, encoding="utf-8") as qa_data:
+            assert set(re.findall(r'question: "(.+)"', qa_data.read())) <= questions
+
+    intents = set(NLPProcessor.INTENT_NAMES) | {"general_inquiry"}
+    for entry in gold:
+        assert entry["expected"] is None or entry["expected"] in chatbot.faqs, entry
+        assert entry["intent"] in intents, entry
+    assert len(questions) == len(gold)
+
+
+def test_scores_and_latency_of_each_matcher(chatbot):
+    gold = evaluate.load_gold()
+    for matcher in ("additive", "bm25"):
+        result = evaluate.evaluate(FAQCorpus(chatbot.faqs, "gold", matcher), gold, repeat=1)
+        assert result["questions"] == len(gold)
+        assert result["top1"] <= result["top3"]
+        assert result["by_source"]["document"] >= 0.9 and result["by_source"]["faqs"] == 1.0
+        assert result["latency_us"]["p50"] <= result["latency_us"]["p95"] <= result["latency_us"]["max"]
+        missed = {failure["question"] for failure in result["failures"]}
+        assert "Tell me about your SEO services" not in missed
+
+
+def test_compare_flags_accuracy_and_latency_regressions():
+    stats = {"top1": 0.9, "top3": 0.95, "intent_accuracy": 0.7, "fallback_rate": 0.05,
+             "out_of_scope_answered": 0.2, "latency_us": {"p95": 100.0}}
+    baseline = {"matchers": {"bm25": stats}}
+    assert evaluate.compare(baseline, baseline, 0.25) == []
+
+    worse = dict(stats, top1=0.88, fallback_rate=0.1, latency_us={"p95": 200.0})
+    regressions = evaluate.compare({"matchers": {"bm25": worse}}, baseline, 0.25)
+    assert len(regressions) == 3
+    assert evaluate.compare({"matchers": {"bm25": worse}}, baseline, 1.5, accuracy_drop=0.05) == []
+
+
+def test_cli_gates_on_a_baseline(tmp_path):
+    output = tmp_path / "eval.json"
+    assert evaluate.main(["--matchers", "additive", "--repeat", "1", "--output", str(output)]) == 0
+    result = json.loads(output.read_text())
+    assert set(result["matchers"]) == {"additive"}
+    assert evaluate.main(["--matchers", "additive", "--repeat", "1", "--compare", str(output),
+                          "--tolerance", "100"]) == 0
+
+    result["matchers"]["additive"]["top1"] = 1.0
+    output.write_text(json.dumps(result))
+    assert evaluate.main(["--matchers", "additive", "--repeat", "1", "--compare", str(output),
+                          "--tolerance", "100"]) == 1
+    assert evaluate.main(["--matchers", "additive", "--repeat", "1", "--min-top1", "1.01"]) == 1
@@ -0,0 +1,43 @@
+"""Exact-match fast path for questions, option buttons and owned keywords"""
+
+from app import BrandsetuChatbot, FAQCorpus
+
+
+def test_every_option_lands_on_its_question(chatbot):
+    questions = {faq["question"]: key for key, faq in chatbot.faqs.items() if faq.get("question")}
+    for faq in chatbot.faqs.values():
+        for option in faq.get("options", []):
+            matched, confidence, faq_key = chatbot.find_best_match(option)
+            assert faq_key == questions[option] and confidence == 1.0
+            assert matched is chatbot.faqs[faq_key]
+            # Clicked buttons arrive with whatever case and spacing the client sends
+            assert chatbot.find_best_match(f"  {option.upper()} ")[2] == faq_key
+
+
+def test_lookup_skips_scoring(monkeypatch, chatbot):
+    option = next(o for faq in chatbot.faqs.values() for o in faq.get("options", []))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("matcher should not run for an exact match")
+
+    monkeypatch.setattr(chatbot.corpus.matcher, "find_best_matches", fail)
+    assert chatbot.find_best_match(option)[1] == 1.0
+
+
+def test_owned_keywords_map_to_owner_and_shared_ones_are_scored():
+    bot = BrandsetuChatbot.__new__(BrandsetuChatbot)
+    bot.corpus = FAQCorpus({
+        "a": {"question": "What is A?", "keywords": ["alpha", "shared"], "response": "A"},
+        "b": {"keywords": ["beta", "shared", "shared term"], "response": "B"},
+    }, "exact")
+    assert bot.corpus.exact == {"what is a?": "a", "alpha": "a", "beta": "b", "shared term": "b"}
+    assert bot.find_best_match("Alpha")[2] == "a"
+    assert bot.find_best_match("shared") == bot.corpus.matcher.find_best_match("shared")
+
+
+def test_chat_reply_carries_options(client, chatbot):
+    faq_key, faq = next((k, f) for k, f in chatbot.faqs.items() if f.get("options"))
+    response = client.post("/api/chat", json={"message": faq["question"], "session_id": "exact"})
+    data = response.get_json()["data"]
+    assert data["confidence"] == 1.0
+    assert data["options"] == faq["options"]
@@ -0,0 +1,138 @@
+"""Streaming NDJSON/CSV export of conversations, analytics, feedback and leads"""
+
+import csv
+import io
+import json
+import tracemalloc
+
+import pytest
+
+import app
+from app import DatabaseManager, export_db_command, export_lines
+
+
+def populate(db, exchanges):
+    for n in range(exchanges):
+        session_id = f"s{n % 7}"
+        db.save_message(session_id, "user", f"question {n}, \"quoted\"\nover two lines")
+        db.save_message(session_id, "bot", "answer", "answer", "seo_overview")
+        db.save_analytics(session_id, "message_processed", {"intent": "seo", "n": n})
+        if n % 10 == 0:
+            db.save_analytics(session_id, "contact_captured", {"email": f"lead{n}@example.com"})
+    db.save_feedback("s1", 5, "great, thanks")
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "export.db"))
+    populate(db, 50)
+    with db.connection() as conn:
+        conn.execute("UPDATE conversations SET timestamp = datetime('2024-06-01', '+' || id || ' hours')")
+        conn.commit()
+    return db
+
+
+def ndjson(db, table, **filters):
+    return [json.loads(line) for line in export_lines(db, table, "ndjson", **filters)]
+
+
+def test_ndjson_round_trips_every_row(db):
+    rows = ndjson(db, "conversations")
+    with db.connection() as conn:
+        assert rows == [dict(row) for row in conn.execute(
+            "SELECT id, session_id, message_type, message, response, matched_faq, timestamp FROM conversation_history")]
+    analytics = ndjson(db, "analytics")
+    assert analytics[0]["event_data"] == {"intent": "seo", "n": 0}
+    assert ndjson(db, "feedback")[0]["comment"] == "great, thanks"
+
+
+def test_csv_has_a_header_and_quotes_fields(db):
+    lines = list(export_lines(db, "conversations", "csv"))
+    assert lines[0] == "id,session_id,message_type,message,response,matched_faq,timestamp\r\n"
+    rows = list(csv.DictReader(io.StringIO("".join(lines))))
+    assert rows == [{key: "" if value is None else str(value) for key, value in row.items()}
+                    for row in ndjson(db, "conversations")]
+
+
+def test_filters(db):
+    assert {row["session_id"] for row in ndjson(db, "conversations", session_id="s3")} == {"s3"}
+    window = ndjson(db, "conversations", since="2024-06-02", until="2024-06-03T00:00:00+00:00")
+    assert len(window) == 24
+    assert all("2024-06-02" <= row["timestamp"] < "2024-06-03" for row in window)
+    assert len(ndjson(db, "analytics", event_type="message_processed")) == 50
+    with pytest.raises(ValueError):
+        ndjson(db, "conversations", event_type="contact_captured")
+    with pytest.raises(ValueError):
+        ndjson(db, "sqlite_master")
+    with pytest.raises(ValueError):
+        ndjson(db, "feedback", since="last tuesday")
+
+
+def test_leads_export_resumes_after_the_last_id(db):
+    leads = ndjson(db, "leads")
+    assert len(leads) == 5
+    assert {row["event_type"] for row in leads} == {"contact_captured"}
+    assert ndjson(db, "leads", after_id=leads[-1]["id"]) == []
+
+    db.save_analytics("s9", "contact_captured", {"phone": "9876543210"})
+    db.save_analytics("s9", "message_processed", {"intent": "contact"})
+    new = ndjson(db, "leads", after_id=leads[-1]["id"])
+    assert [row["event_data"] for row in new] == [{"phone": "9876543210"}]
+
+
+def test_memory_stays_flat_as_the_table_grows(tmp_path):
+    def peak(exchanges):
+        db = DatabaseManager(str(tmp_path / f"size{exchanges}.db"))
+        with db.connection() as conn:
+            conn.executemany("INSERT INTO conversations (session_id, message_type, message) VALUES (?, 'user', ?)",
+                             [(f"s{n % 100}", "x" * 200) for n in range(exchanges)])
+            conn.commit()
+        tracemalloc.start()
+        try:
+            for output_format in ("ndjson", "csv"):
+                for _ in export_lines(db, "conversations", output_format):
+                    pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small, large = peak(2_000), peak(20_000)
+    assert large < small * 1.5 + 64 * 1024
+
+
+def test_export_endpoint(monkeypatch, client):
+    client.post("/api/chat", json={"message": "my email is export@example.com", "session_id": "export-session"})
+
+    assert client.get("/api/export/leads").status_code == 403
+    monkeypatch.setattr(app, "EXPORT_TOKEN", "secret")
+    assert client.get("/api/export/leads", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+    headers = {"Authorization": "Bearer secret"}
+    response = client.get("/api/export/leads?session_id=export-session", headers=headers)
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    leads = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [lead["event_data"]["email"] for lead in leads] == ["export@example.com"]
+
+    response = client.get("/api/export/conversations?format=csv&session_id=export-session", headers=headers)
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="conversations.csv"'
+    assert len(list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))) == 2
+
+    assert client.get("/api/export/conversations?format=xml", headers=headers).status_code == 400
+    assert client.get("/api/export/users", headers=headers).status_code == 400
+    assert client.get("/api/export/feedback?until=soon", headers=headers).status_code == 400
+
+
+def test_export_command(tmp_path, flask_app, chatbot):
+    chatbot.db.save_analytics("cli-session", "contact_captured", {"email": "cli@example.com"})
+    path = tmp_path / "leads.ndjson"
+    result = flask_app.test_cli_runner().invoke(export_db_command,
+                                                ["leads", "--session", "cli-session", "-o", str(path)])
+    assert result.exit_code == 0, result.output
+    leads = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [lead["event_data"] for lead in leads] == [{"email": "cli@example.com"}]
+    assert f"continue with --after-id {leads[-1]['id']}" in result.stderr
+
+    result = flask_app.test_cli_runner().invoke(export_db_command, ["feedback", "--since", "someday"])
+    assert result.exit_code == 2
@@ -0,0 +1,111 @@
+"""Parity between the compiled FAQIndex and the reference linear scan"""
+
+import random
+
+import pytest
+
+import app
+from app import BrandsetuChatbot, FAQCorpus
+
+
+@pytest.fixture(autouse=True)
+def no_fuzzy_layer(monkeypatch):
+    # The reference linear scan has no fuzzy layer; indexes built here leave it out
+    monkeypatch.setattr(app, "FUZZY_WEIGHT", 0)
+
+
+def scan_bot(faqs):
+    bot = BrandsetuChatbot.__new__(BrandsetuChatbot)
+    bot.corpus = FAQCorpus(faqs, "parity")
+    return bot
+
+
+def corpus_messages(faqs):
+    messages = []
+    for faq_data in faqs.values():
+        messages.extend(faq_data["keywords"])
+        messages.extend(faq_data.get("options", []))
+        messages.extend(faq_data["response"].split(". "))
+    return messages
+
+
+FIXED_MESSAGES = [
+    "", "  ", "a", "se", "seo", "SEO", "  seo  ", "Hi", "hello there",
+    "What services do you offer?", "How much do you charge?",
+    "How do I get started?", "Show me your portfolio",
+    "I need leads from ads", "tell me about the paid ads",
+    "instgram", "serach engin", "my email is a@b.com, call 9876543210",
+    "social media growth for local business", "ENGINE", "org",
+]
+
+
+def random_messages(faqs, count, seed):
+    rng = random.Random(seed)
+    words = sorted({w for faq in faqs.values() for kw in faq["keywords"] for w in kw.split()})
+    words += ["the", "and", "you", "me", "about", "please", "xyz", "re", "ing"]
+    messages = []
+    for _ in range(count):
+        picked = [rng.choice(words) for _ in range(rng.randint(1, 7))]
+        if rng.random() < 0.3:
+            # Fragments exercise substring (not whole word) matches
+            joined = " ".join(picked)
+            start = rng.randrange(len(joined))
+            picked = [joined[start:start + rng.randint(2, 12)]]
+        messages.append(" ".join(picked))
+    return messages
+
+
+def synthetic_faqs(base, copies, seed):
+    rng = random.Random(seed)
+    vocab = sorted({w for faq in base.values() for kw in faq["keywords"] for w in kw.split()})
+    faqs = {}
+    for n in range(copies):
+        for key, faq_data in base.items():
+            keywords = list(faq_data["keywords"])
+            keywords.append(" ".join(rng.sample(vocab, rng.randint(1, 3))))
+            faqs[f"{key}_{n}"] = dict(faq_data, keywords=keywords)
+    return faqs
+
+
+def assert_parity(bot, messages):
+    for message in messages:
+        expected = bot._find_best_match_scan(message)
+        actual = bot.index.find_best_match(message)
+        assert actual[2] == expected[2], message
+        assert actual[1] == expected[1], message
+        assert actual[0] is expected[0], message
+
+
+def test_parity_on_corpus_text(chatbot):
+    assert_parity(scan_bot(chatbot.faqs), corpus_messages(chatbot.faqs) + FIXED_MESSAGES)
+
+
+def test_parity_on_random_messages(chatbot):
+    assert_parity(scan_bot(chatbot.faqs), random_messages(chatbot.faqs, 2000, seed=7))
+
+
+def test_parity_on_large_corpus(chatbot):
+    bot = scan_bot(synthetic_faqs(chatbot.faqs, 40, seed=11))
+    assert_parity(bot, random_messages(bot.faqs, 300, seed=13) + FIXED_MESSAGES)
+
+
+@pytest.mark.parametrize("keywords,message", [
+    (["seo", "seo"], "seo"),        # repeated keyword counts twice
+    ([""], "anything"),             # empty keyword is contained everywhere
+    ([""], ""),
+    (["ads"], "leads"),             # substring, not word, containment
+])
+def test_parity_edge_cases(keywords, message):
+    bot = scan_bot({
+        "first": {"keywords": keywords, "response": "first"},
+        "second": {"keywords": list(keywords), "response": "second"},
+    })
+    assert_parity(bot, [message])
+
+
+def test_rank_orders_by_score_then_corpus_order(chatbot):
+    bot = scan_bot(chatbot.faqs)
+    ranked = bot.index.rank("social media growth", 3)
+    scores = [score for _, score in ranked]
+    assert ranked[0][0] == bot._find_best_match_scan("social media growth")[2]
+    assert scores == sorted(scores, reverse=True)
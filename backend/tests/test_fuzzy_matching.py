@@ -0,0 +1,100 @@
+"""Typo-tolerant matching through the keyword-word trigram index"""
+
+import random
+
+import pytest
+
+import app
+from app import BrandsetuChatbot, FAQCorpus, FAQIndex, NLPProcessor
+
+from test_faq_index import corpus_messages, synthetic_faqs
+
+
+def reference_distance(a, b):
+    """Unbounded optimal string alignment distance"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+
+def reference_fuzzy_words(index, word):
+    if len(word) < FAQIndex.FUZZY_MIN_LENGTH:
+        return []
+    limit = 1 if len(word) < 8 else 2
+    distances = {w: reference_distance(word, w) for w in index.words}
+    best = min(distances.values(), default=limit + 1)
+    return sorted(w for w, d in distances.items() if d == best and d <= limit)
+
+
+def typo(word, rng):
+    position = rng.randrange(len(word))
+    edit = rng.choice(["drop", "swap", "replace", "insert"])
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if edit == "drop":
+        return word[:position] + word[position + 1:]
+    if edit == "swap" and position < len(word) - 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    if edit == "replace":
+        return word[:position] + letter + word[position + 1:]
+    return word[:position] + letter + word[position:]
+
+
+@pytest.fixture
+def index(chatbot):
+    return FAQIndex(chatbot.faqs, NLPProcessor.INTENT_RANKS, fuzzy_weight=8)
+
+
+@pytest.fixture
+def fuzzy_bot(monkeypatch):
+    def build(faqs, weight=8):
+        monkeypatch.setattr(app, "FUZZY_WEIGHT", weight)
+        bot = BrandsetuChatbot.__new__(BrandsetuChatbot)
+        bot.corpus = FAQCorpus(faqs, "fuzzy")
+        return bot
+    return build
+
+
+def test_bounded_distance_matches_reference():
+    rng = random.Random(5)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        for limit in (1, 2):
+            assert FAQIndex._edit_distance(a, b, limit) == min(reference_distance(a, b), limit + 1)
+
+
+def test_trigram_candidates_miss_nothing(index, chatbot):
+    rng = random.Random(9)
+    large = FAQIndex(synthetic_faqs(chatbot.faqs, 20, seed=3), fuzzy_weight=8)
+    for idx in (index, large):
+        words = [w for w in idx.words if len(w) >= 4]
+        for _ in range(400):
+            word = typo(rng.choice(words), rng)
+            assert idx.fuzzy_words(word) == reference_fuzzy_words(idx, word), word
+
+
+@pytest.mark.parametrize("message,expected", [
+    ("serach engin", "seo_overview"),
+    ("instgram", "social_platforms"),
+    ("need brandng help", "bsd_branding"),
+])
+def test_misspelled_queries_find_their_faq(fuzzy_bot, message, expected, chatbot):
+    _, confidence, faq_key = fuzzy_bot(chatbot.faqs).find_best_match(message)
+    assert faq_key == expected and confidence > 0.08
+
+
+def test_weight_zero_disables_fuzzy_layer(fuzzy_bot, chatbot):
+    bot = fuzzy_bot(chatbot.faqs, weight=0)
+    assert bot.index.words == []
+    assert bot.find_best_match("instgram") == (None, 0.0, None)
+
+
+def test_correctly_spelled_text_scores_like_the_scan(fuzzy_bot, chatbot):
+    bot = fuzzy_bot(chatbot.faqs)
+    for message in corpus_messages(chatbot.faqs):
+        if all(bot.index._terms_containing(word) for word in message.lower().split() if len(word) >= 3):
+            assert bot.index.find_best_match(message) == chatbot._find_best_match_scan(message), message
@@ -0,0 +1,47 @@
+"""KeywordAutomaton against naive substring checks"""
+
+import random
+
+from app import KeywordAutomaton, NLPProcessor
+
+
+def reference_intent(message):
+    message_lower = message.lower()
+    for intent, keywords in NLPProcessor.INTENTS.items():
+        for keyword in keywords:
+            if keyword in message_lower:
+                return intent
+    return "general_inquiry"
+
+
+def test_search_matches_naive_containment():
+    rng = random.Random(3)
+    alphabet = "abc "
+    patterns = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(200)}
+    automaton = KeywordAutomaton(patterns)
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert automaton.search(text) == {p for p in patterns if p in text}
+
+
+def test_overlapping_and_nested_patterns():
+    automaton = KeywordAutomaton(["he", "she", "his", "hers", "google", "google ads", "ads"])
+    assert automaton.search("ushers") == {"he", "she", "hers"}
+    assert automaton.search("run google ads") == {"google", "google ads", "ads"}
+    assert automaton.search("") == set()
+
+
+def test_extract_intent_parity(chatbot):
+    messages = [faq_kw for faq in chatbot.faqs.values() for faq_kw in faq["keywords"]]
+    messages += ["Hi there", "How much for Google Ads?", "I want to talk", "nothing here", ""]
+    for message in messages:
+        expected = reference_intent(message)
+        assert NLPProcessor.extract_intent(message) == expected
+        assert NLPProcessor.extract_intent(message, chatbot.index.scan(message)) == expected
+
+
+def test_shared_scan_feeds_faq_scoring(chatbot):
+    message = "Tell me about the paid ads"
+    hits = chatbot.index.scan(message)
+    assert "paid ads" in hits and "ads" in hits
+    assert chatbot.find_best_match(message, hits) == chatbot._find_best_match_scan(message)
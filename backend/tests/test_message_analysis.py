@@ -0,0 +1,64 @@
+"""MessageAnalysis: one normalization pass shared by every NLP stage"""
+
+import re
+
+from app import MessageAnalysis, NLPProcessor, VectorMatcher
+
+# The uncompiled patterns extract_entities used to run with re.findall
+LEGACY_PATTERNS = {
+    'budget': r'₹?\s*(\d+(?:,\d+)*(?:k|K|lakh|lakhs?)?)',
+    'email': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    'phone': r'\b(?:\+91|91)?[\s-]?[6-9]\d{9}\b',
+}
+
+MESSAGES = [
+    "", "  SEO  ", "my budget is ₹50,000", "budget 2 lakhs, call +91 9876543210",
+    "Mail me at Lead.One@Example.co.in or lead2@example.com", "I have 5k and 10k options",
+    "How much do you charge for Google Ads?", "call 91-9123456789 today",
+]
+
+
+def legacy_entities(message):
+    entities = {}
+    for name, pattern in LEGACY_PATTERNS.items():
+        matches = re.findall(pattern, message)
+        if matches:
+            entities[name] = matches[0]
+    return entities
+
+
+def test_precompiled_entities_match_findall():
+    for message in MESSAGES:
+        assert NLPProcessor.extract_entities(message) == legacy_entities(message)
+        assert MessageAnalysis(message).entities == legacy_entities(message)
+
+
+def test_views_are_derived_once(chatbot):
+    analysis = MessageAnalysis("  Tell me about the Paid Ads  ", chatbot.index)
+    assert analysis.normalized == "tell me about the paid ads"
+    assert analysis.words == ["tell", "me", "about", "the", "paid", "ads"]
+    assert analysis.tokens == VectorMatcher.tokenize(analysis.message)
+    assert [word for word, _ in analysis.word_trigrams()] == ["tell", "about", "the", "paid", "ads"]
+    assert analysis.hits is analysis.hits
+    assert {"paid ads", "ads"} <= analysis.hits
+    assert analysis.intent == "paid_ads"
+
+
+def test_preset_hits_are_not_rescanned(chatbot):
+    analysis = MessageAnalysis("seo please", chatbot.index, hits={"seo"})
+    assert analysis.hits == {"seo"}
+    assert analysis.intent == "seo"
+
+
+def test_analysis_without_index_uses_intent_keywords():
+    for message in MESSAGES + ["Hi there", "I want to talk"]:
+        assert MessageAnalysis(message).intent == NLPProcessor.extract_intent(message)
+
+
+def test_shared_analysis_matches_string_apis(chatbot):
+    for message in MESSAGES + ["What services do you offer?", "instagram growth"]:
+        analysis = MessageAnalysis(message, chatbot.index)
+        assert chatbot.index.find_best_matches([analysis])[0] == chatbot._find_best_match_scan(message)
+        _, confidence, faq_key = chatbot.find_best_match(message)
+        assert chatbot.analyze(message, chatbot.corpus) == (
+            NLPProcessor.extract_intent(message), NLPProcessor.extract_entities(message), faq_key, confidence)
@@ -0,0 +1,80 @@
+"""Per-stage latency metrics and the /api/metrics endpoint"""
+
+import json
+import logging
+import os
+import time
+
+from app import StageMetrics
+
+
+def sample_value(text, prefix):
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not exported")
+
+
+def test_chat_stages_are_exported(client):
+    client.post("/api/chat", json={"session_id": "metrics", "message": "seo reports please"})
+    text = client.get("/api/metrics").get_data(as_text=True)
+    assert "# TYPE chatbot_stage_duration_seconds histogram" in text
+    for stage in ("keyword_scan", "extract_intent", "extract_entities", "find_best_match", "db.write_many"):
+        assert sample_value(text, f'chatbot_stage_duration_seconds_count{{stage="{stage}"}}') >= 1
+    assert sample_value(text, 'chatbot_request_duration_seconds_count{endpoint="chat"}') >= 1
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = StageMetrics(directory=None)
+    for seconds in (0.00001, 0.003, 0.003, 10.0):
+        metrics.observe("chatbot_stage_duration_seconds", "probe", seconds)
+    text = metrics.render()
+    assert sample_value(text, 'chatbot_stage_duration_seconds_bucket{stage="probe",le="5e-05"}') == 1
+    assert sample_value(text, 'chatbot_stage_duration_seconds_bucket{stage="probe",le="0.005"}') == 3
+    assert sample_value(text, 'chatbot_stage_duration_seconds_bucket{stage="probe",le="+Inf"}') == 4
+    assert sample_value(text, 'chatbot_stage_duration_seconds_count{stage="probe"}') == 4
+
+
+def test_workers_are_merged_through_the_metrics_directory(tmp_path):
+    worker = StageMetrics(directory=str(tmp_path), flush_interval=0)
+    worker.observe("chatbot_stage_duration_seconds", "find_best_match", 0.002)
+    # Pretend the snapshot was written by another process
+    os.replace(tmp_path / f"metrics-{os.getpid()}.json", tmp_path / "metrics-999999.json")
+
+    local = StageMetrics(directory=str(tmp_path), flush_interval=60)
+    local.observe("chatbot_stage_duration_seconds", "find_best_match", 0.002)
+    text = local.render()
+    assert sample_value(text, 'chatbot_stage_duration_seconds_count{stage="find_best_match"}') == 2
+
+
+def test_slow_request_log_has_stage_breakdown(caplog):
+    metrics = StageMetrics(directory=None, slow_request_ms=0)
+    metrics.begin_request()
+    with metrics.stage("find_best_match"):
+        pass
+    with caplog.at_level(logging.WARNING):
+        metrics.end_request("chat", "POST /api/chat")
+    assert "Slow request POST /api/chat" in caplog.text
+    assert "find_best_match=" in caplog.text
+
+
+def test_last_observations_of_an_idle_worker_are_flushed(tmp_path):
+    worker = StageMetrics(directory=str(tmp_path), flush_interval=0.2)
+    worker.observe("chatbot_stage_duration_seconds", "find_best_match", 0.002)  # flushed at once
+    worker.observe("chatbot_stage_duration_seconds", "find_best_match", 0.002)  # throttled
+    snapshot = tmp_path / f"metrics-{os.getpid()}.json"
+
+    def flushed_count():
+        return json.loads(snapshot.read_text())["chatbot_stage_duration_seconds|find_best_match"][-1]
+
+    assert flushed_count() == 1
+    # The worker goes idle; the timer writes what is left
+    deadline = time.monotonic() + 2
+    while flushed_count() < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flushed_count() == 2
+
+    worker.flush_interval = 60
+    worker.observe("chatbot_stage_duration_seconds", "find_best_match", 0.002)
+    worker.flush_pending()  # as gunicorn's worker_exit does
+    assert flushed_count() == 3
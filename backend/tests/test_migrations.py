@@ -0,0 +1,82 @@
+"""Schema migrations and query-plan regression checks"""
+
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from app import DatabaseManager, migrate_db_command
+
+LEGACY_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chatbot.db")
+LATEST = DatabaseManager.MIGRATIONS[-1][0]
+
+
+def query_plan(db, sql, params=()):
+    with db.connection() as conn:
+        return " | ".join(row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "fresh.db"))
+
+
+def test_fresh_database_is_at_latest_version(db):
+    assert db.schema_version == LATEST
+
+
+def test_existing_database_is_upgraded_in_place(tmp_path):
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        rows_before = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    db = DatabaseManager(str(path))
+    assert db.schema_version == LATEST
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == rows_before
+        indexes = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_conversations_session_timestamp", "idx_conversations_matched_faq",
+            "idx_analytics_event_timestamp"} <= indexes
+
+
+def test_migrations_are_idempotent(db):
+    db.init_database()
+    DatabaseManager(db.db_path).init_database()
+    assert db.schema_version == LATEST
+
+
+def test_conversation_lookup_uses_session_index(db):
+    db.save_message("s", "user", "hello")
+    first_id = db.get_conversation("s")[0]["id"]
+    # The history query get_conversation runs: from the start, and resuming after a row
+    with db.connection() as conn:
+        queries = [db._conversation_query(conn, "s", None), db._conversation_query(conn, "s", first_id)]
+    for sql, params in queries:
+        plan = query_plan(db, sql, params)
+        assert "USING INDEX idx_conversations_session_timestamp (session_id=?" in plan
+        assert "USING INTEGER PRIMARY KEY" in plan  # the responses join
+        assert "TEMP B-TREE" not in plan
+
+
+def test_top_faq_group_by_uses_index(db):
+    plan = query_plan(db, """
+        SELECT matched_faq, COUNT(*) as count FROM conversations
+        WHERE matched_faq IS NOT NULL GROUP BY matched_faq
+    """)
+    assert "USING COVERING INDEX idx_conversations_matched_faq" in plan
+    assert "TEMP B-TREE FOR GROUP BY" not in plan
+
+
+def test_event_range_scan_uses_index(db):
+    plan = query_plan(db, "SELECT * FROM analytics WHERE event_type = ? AND timestamp >= ?",
+                      ("contact_captured", "2026-01-01"))
+    assert "USING INDEX idx_analytics_event_timestamp (event_type=? AND timestamp>?)" in plan
+
+
+def test_migrate_command(flask_app, chatbot):
+    result = flask_app.test_cli_runner().invoke(migrate_db_command)
+    assert result.exit_code == 0, result.output
+    assert result.output == f"{chatbot.db.db_path} is at schema version {LATEST}\n"
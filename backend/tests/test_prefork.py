@@ -0,0 +1,75 @@
+"""Preloaded app state surviving a gunicorn-style fork"""
+
+import json
+import os
+
+import pytest
+
+from app import BrandsetuChatbot, StageMetrics
+
+
+def test_after_fork_restarts_a_dead_watcher():
+    bot = BrandsetuChatbot(reload_interval=60)
+    try:
+        inherited = bot.watcher
+        inherited.stop()
+        inherited.join()
+        bot.after_fork()
+        assert bot.watcher is not inherited and bot.watcher.is_alive()
+        assert bot.watcher.interval == 60
+
+        running = bot.watcher
+        bot.after_fork()
+        assert bot.watcher is running
+    finally:
+        bot.watcher.stop()
+
+
+def test_before_fork_stops_the_watcher_and_closes_connections(tmp_path):
+    faq_path = tmp_path / "faqs.json"
+    faq_path.write_text(json.dumps({"seo": {"keywords": ["seo"], "response": "SEO"}}))
+    bot = BrandsetuChatbot(str(faq_path), reload_interval=60)
+    try:
+        bot.generate_response("seo", "prefork")
+        assert bot.db._pool
+        bot.before_fork()
+        assert not bot.watcher.is_alive() and bot.db._pool == []
+
+        # An edit made after the master loaded the corpus reaches the forked worker
+        faq_path.write_text(json.dumps({"seo": {"keywords": ["seo"], "response": "SEO, edited"}}))
+        bot.after_fork()
+        assert bot.watcher.is_alive()
+        assert bot.watcher.check() is True
+        assert bot.generate_response("seo", "prefork")["response"] == "SEO, edited"
+    finally:
+        bot.watcher.stop()
+
+
+def test_metrics_after_fork_starts_empty():
+    stage_metrics = StageMetrics(directory=None)
+    stage_metrics.observe('chatbot_stage_duration_seconds', 'keyword_scan', 0.001)
+    stage_metrics.after_fork()
+    assert stage_metrics.snapshot() == {}
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_forked_worker_serves_and_writes():
+    bot = BrandsetuChatbot(reload_interval=60)
+    before = bot.corpus
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            bot.after_fork()
+            reply = bot.generate_response("seo", "forked-session")
+            ok = (bot.corpus is before and bot.watcher.is_alive()
+                  and reply["intent"] == "seo" and bot.db.get_conversation("forked-session"))
+            status = 0 if ok else 1
+        finally:
+            os._exit(status)
+    try:
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert [row["message"] for row in bot.db.get_conversation("forked-session")][0] == "seo"
+    finally:
+        bot.watcher.stop()
@@ -0,0 +1,54 @@
+"""Normalized-message ResponseCache"""
+
+from app import BrandsetuChatbot, ResponseCache
+
+
+def make_bot(**cache_options):
+    bot = BrandsetuChatbot(reload_interval=0)
+    bot.cache = ResponseCache(**cache_options)
+    return bot
+
+
+def test_repeat_messages_hit_the_cache():
+    bot = make_bot(max_size=10, ttl=60)
+    first = bot.generate_response("Which platforms do you manage?", "s1")
+    second = bot.generate_response("  which platforms do you MANAGE?", "s1")
+    assert bot.cache.stats()["hits"] == 1
+    for field in ("response", "intent", "entities", "confidence", "category"):
+        assert first[field] == second[field]
+
+
+def test_contact_messages_bypass_the_cache():
+    bot = make_bot(max_size=10, ttl=60)
+    bot.generate_response("my email is lead@example.com", "s2")
+    bot.generate_response("call me on 9876543210", "s2")
+    stats = bot.cache.stats()
+    assert stats["bypasses"] == 2 and stats["size"] == 0
+    assert not any("example.com" in key[1] for key in bot.cache.entries)
+
+
+def test_reload_invalidates():
+    bot = make_bot(max_size=10, ttl=60)
+    bot.generate_response("seo", "s3")
+    assert bot.reload_faqs()
+    assert bot.cache.stats()["size"] == 0
+    assert bot.cache.stats()["invalidations"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_size=2, ttl=60)
+    for message in ("a", "b", "c"):
+        cache.put(cache.key(message, "v1"), message)
+    assert cache.get(cache.key("a", "v1")) is None
+    assert cache.get(cache.key("c", "v1")) == "c"
+    assert cache.stats()["evictions"] == 1
+
+    expired = ResponseCache(max_size=2, ttl=-1)
+    expired.put(expired.key("a", "v1"), "a")
+    assert expired.get(expired.key("a", "v1")) is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_disabled_cache_never_stores():
+    cache = ResponseCache(max_size=0, ttl=60)
+    assert cache.key("seo", "v1") is None
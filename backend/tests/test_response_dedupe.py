@@ -0,0 +1,102 @@
+"""Bot turns referencing content-addressed response text"""
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+
+from app import BrandsetuChatbot, DatabaseManager, ShardedDatabase
+
+from test_migrations import LEGACY_DB
+
+
+def raw_rows(db):
+    with db.connection() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM conversations ORDER BY id")]
+
+
+def test_bot_text_is_stored_once(tmp_path):
+    db = DatabaseManager(str(tmp_path / "dedupe.db"))
+    answer = "We offer SEO, social media and paid ads. " * 10
+    for n in range(5):
+        db.save_message(f"s{n}", "user", "services?")
+        db.save_message(f"s{n}", "bot", answer, answer, "bsd_services")
+
+    with db.connection() as conn:
+        assert tuple(conn.execute("SELECT COUNT(*), MIN(body) FROM responses").fetchone()) == (1, answer)
+    bot_rows = [row for row in raw_rows(db) if row["message_type"] == "bot"]
+    assert {(row["message"], row["response"]) for row in bot_rows} == {("", None)}
+    assert len({row["response_id"] for row in bot_rows}) == 1
+    assert raw_rows(db)[0]["message"] == "services?"
+
+    history = db.get_conversation("s3")
+    assert [(row["message"], row["response"]) for row in history] == [("services?", None), (answer, answer)]
+    assert "response_id" not in history[0]
+
+
+def test_other_processes_share_response_ids(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first, second = DatabaseManager(path), DatabaseManager(path)
+    assert first.response_id("hello") == second.response_id("hello")
+    assert second.response_id("other") != first.response_id("hello")
+
+
+def test_legacy_rows_are_normalized_by_the_migration(tmp_path):
+    path = tmp_path / "legacy.db"
+    shutil.copy(LEGACY_DB, path)
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        before = [dict(row) for row in conn.execute(
+            "SELECT id, session_id, message_type, message, response, matched_faq, timestamp FROM conversations")]
+        sessions = sorted({row["session_id"] for row in before})
+        distinct = conn.execute("SELECT COUNT(DISTINCT response) FROM conversations WHERE message_type = 'bot'")
+        distinct = distinct.fetchone()[0]
+
+    db = DatabaseManager(str(path))
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == distinct
+        assert conn.execute("SELECT COUNT(*) FROM conversations "
+                            "WHERE message_type = 'bot' AND response_id IS NULL").fetchone()[0] == 0
+        assert [dict(row) for row in conn.execute("SELECT * FROM conversation_history")] == before
+    assert sum(len(db.get_conversation(session_id)) for session_id in sessions) == len(before)
+
+
+def test_mismatched_legacy_bot_rows_keep_their_text(tmp_path):
+    db = DatabaseManager(str(tmp_path / "odd.db"))
+    db.save_message("s", "bot", "shown text", "different stored response", None)
+    assert raw_rows(db)[0]["response_id"] is None
+    assert db.get_conversation("s")[0]["response"] == "different stored response"
+
+
+def test_archive_and_write_behind_keep_full_text(tmp_path):
+    db = DatabaseManager(str(tmp_path / "behind.db"), write_mode="write_behind",
+                         archive_dir=str(tmp_path / "archive"))
+    db.save_message("old", "bot", "archived answer", "archived answer", "seo_overview")
+    db.flush()
+    with db.connection() as conn:
+        conn.execute("UPDATE conversations SET timestamp = datetime(timestamp, '-400 days')")
+        conn.commit()
+    db.rebuild_rollups()
+    db.archive_old_rows(days=90)
+
+    [name] = db.archive.files("conversations")
+    with gzip.open(os.path.join(db.archive.directory, name), "rt", encoding="utf-8") as archive_file:
+        row = json.loads(archive_file.readline())
+    assert (row["message"], row["response"]) == ("archived answer", "archived answer")
+    assert "response_id" not in row
+    assert db.get_conversation("old")[0]["message"] == "archived answer"
+
+
+def test_sharded_turns_reference_their_own_shard(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHATBOT_DB_PATH", str(tmp_path / "bot.db"))
+    bot = BrandsetuChatbot(reload_interval=0)
+    bot.db = ShardedDatabase(str(tmp_path / "bot.db"), shards=3)
+    replies = bot.generate_responses([(f"visitor-{n}", "What services do you offer?") for n in range(9)])
+    for n, reply in enumerate(replies):
+        assert bot.db.get_conversation(f"visitor-{n}")[-1]["message"] == reply["response"]
+    for shard in bot.db.shards:
+        with shard.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM conversations c LEFT JOIN responses r "
+                                "ON r.id = c.response_id WHERE c.response_id IS NOT NULL "
+                                "AND r.id IS NULL").fetchone()[0] == 0
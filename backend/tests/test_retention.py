@@ -0,0 +1,143 @@
+"""Retention: archiving idle sessions and old events, reading them back"""
+
+import gzip
+import json
+import os
+import random
+
+import pytest
+
+from app import DatabaseManager, archive_db_command
+
+
+def populate(db, sessions=30, seed=2):
+    rng = random.Random(seed)
+    for n in range(sessions * 6):
+        session_id = f"s{rng.randint(1, sessions)}"
+        db.save_message(session_id, "user", f"question {n}")
+        db.save_message(session_id, "bot", "answer", "answer", rng.choice(["seo_overview", "fallback", None]))
+        db.save_analytics(session_id, "message_processed", {"n": n})
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "hot.db"), archive_dir=str(tmp_path / "archive"))
+    populate(db)
+    # Spread the history over several months
+    with db.connection() as conn:
+        conn.execute("UPDATE conversations SET timestamp = datetime(timestamp, '-' || (id % 4 * 31 + 200) || ' days')")
+        conn.execute("UPDATE analytics SET timestamp = datetime(timestamp, '-' || (id % 3 * 31 + 200) || ' days')")
+        conn.execute("UPDATE message_events SET timestamp = (SELECT timestamp FROM analytics WHERE analytics.id = message_events.id)")
+        conn.commit()
+    db.rebuild_rollups()
+    return db
+
+
+def histories(db):
+    with db.connection() as conn:
+        sessions = [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM conversations")]
+    return {session_id: db.get_conversation(session_id) for session_id in sessions}
+
+
+def test_archive_moves_idle_sessions_and_reads_them_back(db):
+    before = histories(db)
+    summary = db.get_analytics_summary()
+
+    result = db.archive_old_rows(days=90)
+
+    assert result["sessions"] == len(before)
+    assert result["conversation_rows"] == sum(map(len, before.values()))
+    assert result["analytics_rows"] == 180
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM analytics").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM message_events").fetchone()[0] == 0
+    assert len(db.archive.files("conversations")) == 4
+    assert len(db.archive.files("analytics")) == 3
+
+    for session_id, rows in before.items():
+        assert db.get_conversation(session_id) == rows
+        assert list(db.iter_conversation(session_id)) == rows
+    assert db.get_analytics_summary() == summary
+    assert db.verify_rollups() == []
+
+
+def test_archive_files_are_plain_gzip_ndjson(db):
+    db.archive_old_rows(days=90)
+    ids = set()
+    for name in db.archive.files("conversations"):
+        with gzip.open(os.path.join(db.archive.directory, name), "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                row = json.loads(line)
+                assert name == f"conversations-{row['timestamp'][:7]}.ndjson.gz"
+                ids.add(row["id"])
+    assert len(ids) == 360
+
+
+def test_pages_cross_from_archive_to_hot_rows(db):
+    session_id = "s1"
+    db.archive_old_rows(days=90)
+    # The session comes back after being archived
+    db.save_message(session_id, "user", "I am back")
+    db.save_message(session_id, "bot", "Welcome back", "Welcome back", "fallback")
+    full = db.get_conversation(session_id)
+    assert [row["message"] for row in full[-2:]] == ["I am back", "Welcome back"]
+
+    pages, after_id = [], None
+    while True:
+        page = db.get_conversation(session_id, after_id=after_id, limit=3)
+        if not page:
+            break
+        pages.extend(page)
+        after_id = page[-1]["id"]
+    assert pages == full
+    assert list(db.iter_conversation(session_id, after_id=full[1]["id"])) == full[2:]
+    with pytest.raises(ValueError):
+        db.get_conversation("s2", after_id=full[0]["id"])
+
+
+def test_active_sessions_stay_hot(db):
+    sessions = len(histories(db))
+    db.save_message("s3", "user", "still here")
+    result = db.archive_old_rows(days=90)
+    with db.connection() as conn:
+        hot = {row[0] for row in conn.execute("SELECT DISTINCT session_id FROM conversations")}
+    assert hot == {"s3"}
+    assert result["sessions"] == sessions - 1
+    assert db.get_conversation("s3")[-1]["message"] == "still here"
+    assert db.verify_rollups() == []
+
+
+def test_rebuild_counts_archived_rows(db):
+    summary = db.get_analytics_summary()
+    db.archive_old_rows(days=90)
+    db.rebuild_rollups()
+    assert db.get_analytics_summary() == summary
+    assert db.verify_rollups() == []
+
+
+def test_compact_releases_pages(db):
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db.archive_old_rows(days=90)
+    result = db.compact()
+    assert not result["converted_to_incremental"]
+    assert result["pages_released"] > 0
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_compact_converts_legacy_database(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "legacy.db")
+    sqlite3.connect(path).execute("CREATE TABLE placeholder (x)").connection.commit()
+    db = DatabaseManager(path)
+    assert db.compact()["converted_to_incremental"]
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_archive_command(flask_app):
+    result = flask_app.test_cli_runner().invoke(archive_db_command, ["--days", "36500"])
+    assert result.exit_code == 0, result.output
+    assert "Archived 0 sessions" in result.output
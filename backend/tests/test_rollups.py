@@ -0,0 +1,74 @@
+"""Trigger-maintained analytics rollups"""
+
+import random
+
+from app import DatabaseManager, rebuild_rollups_command
+
+
+def legacy_summary(db):
+    with db.connection() as conn:
+        return {
+            "total_sessions": conn.execute("SELECT COUNT(DISTINCT session_id) FROM conversations").fetchone()[0],
+            "total_messages": conn.execute(
+                "SELECT COUNT(*) FROM conversations WHERE message_type = 'user'").fetchone()[0],
+            "faq_hits": dict(conn.execute(
+                "SELECT matched_faq, COUNT(*) FROM conversations WHERE matched_faq IS NOT NULL "
+                "GROUP BY matched_faq").fetchall()),
+        }
+
+
+def populate(db, messages=300, seed=5):
+    rng = random.Random(seed)
+    faqs = ["seo_overview", "paid_overview", "fallback", "contact_info"]
+    for n in range(messages):
+        session_id = f"s{rng.randint(1, 40)}"
+        db.save_message(session_id, "user", f"question {n}")
+        db.save_message(session_id, "bot", "answer", "answer", rng.choice(faqs))
+
+
+def test_rollups_track_inserts(tmp_path):
+    db = DatabaseManager(str(tmp_path / "rollups.db"))
+    populate(db)
+    summary = db.get_analytics_summary()
+    legacy = legacy_summary(db)
+    assert summary["total_sessions"] == legacy["total_sessions"]
+    assert summary["total_messages"] == legacy["total_messages"] == 300
+    assert {row["matched_faq"]: row["count"] for row in summary["top_faqs"]} == legacy["faq_hits"]
+    assert sum(day["user_messages"] for day in summary["daily"]) == 300
+    assert db.verify_rollups() == []
+
+
+def test_rebuild_repairs_drift(tmp_path):
+    db = DatabaseManager(str(tmp_path / "drift.db"))
+    populate(db, 50)
+    with db.connection() as conn:
+        conn.execute("UPDATE rollup_totals SET value = 0")
+        conn.execute("DELETE FROM rollup_faq_hits WHERE matched_faq = 'fallback'")
+        conn.commit()
+    assert len(db.verify_rollups()) >= 2
+    db.rebuild_rollups()
+    assert db.verify_rollups() == []
+
+
+def test_rebuild_command(flask_app, chatbot):
+    chatbot.generate_response("seo", "rollup_cli")
+    runner = flask_app.test_cli_runner()
+    result = runner.invoke(rebuild_rollups_command, ["--check-only"])
+    assert result.exit_code == 0, result.output
+    assert "0 rollup mismatches" in result.output
+    result = runner.invoke(rebuild_rollups_command)
+    assert result.exit_code == 0
+    assert "0 mismatches after rebuild" in result.output
+
+    with chatbot.db.connection() as conn:
+        conn.execute("UPDATE rollup_totals SET value = value + 1")
+        conn.commit()
+    result = runner.invoke(rebuild_rollups_command, ["--check-only"])
+    assert result.exit_code == 1 and "mismatch:" in result.stderr
+    assert runner.invoke(rebuild_rollups_command).exit_code == 0
+
+
+def test_analytics_endpoint_reads_rollups(client):
+    body = client.get("/api/analytics").get_json()
+    assert body["success"] is True
+    assert {"total_sessions", "total_messages", "top_faqs", "daily"} <= set(body["data"])
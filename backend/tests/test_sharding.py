@@ -0,0 +1,175 @@
+"""Session-sharded storage: routing, fan-out reports and resharding"""
+
+import os
+import random
+
+import pytest
+
+import app
+from app import DatabaseManager, ShardedDatabase, open_database, reshard, reshard_db_command, shard_index
+
+SPAN = ShardedDatabase.SHARD_ID_SPAN
+
+
+def exchanges(count=120, sessions=25, seed=4):
+    rng = random.Random(seed)
+    for n in range(count):
+        session_id = f"visitor-{rng.randint(1, sessions)}"
+        faq = rng.choice(["seo_overview", "social_platforms", "fallback"])
+        entities = {"email": f"v{n}@example.com"} if n % 9 == 0 else {}
+        yield session_id, [
+            DatabaseManager.INSERT_MESSAGE, (session_id, "user", f"message {n}", None, None),
+            DatabaseManager.INSERT_MESSAGE, (session_id, "bot", "reply", "reply", faq),
+            DatabaseManager.INSERT_ANALYTICS, (session_id, "message_processed", app.json.dumps(
+                {"intent": rng.choice(["seo", "greeting"]), "entities": entities,
+                 "matched_faq": faq, "confidence": rng.random()})),
+        ]
+
+
+def load(db, **kwargs):
+    for session_id, flat in exchanges(**kwargs):
+        db.write_many(list(zip(flat[::2], flat[1::2])))
+        if session_id.endswith("7"):
+            db.save_feedback(session_id, 4, "ok")
+
+
+def session_ids(db):
+    return sorted({row["session_id"] for row in db.export_rows("conversations")})
+
+
+@pytest.fixture
+def single(tmp_path):
+    (tmp_path / "single").mkdir()
+    db = DatabaseManager(str(tmp_path / "single" / "chatbot.db"))
+    load(db)
+    return db
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    (tmp_path / "sharded").mkdir()
+    db = ShardedDatabase(str(tmp_path / "sharded" / "chatbot.db"), shards=4)
+    load(db)
+    return db
+
+
+def test_sessions_live_in_exactly_one_shard(sharded):
+    assert [os.path.basename(shard.db_path) for shard in sharded.shards] == [
+        f"chatbot.shard{n}of4.db" for n in range(4)]
+    for n, shard in enumerate(sharded.shards):
+        with shard.connection() as conn:
+            for table in ("conversations", "analytics", "message_events", "feedback"):
+                for (session_id,) in conn.execute(f"SELECT DISTINCT session_id FROM {table}"):
+                    assert shard_index(session_id, 4) == n
+    assert len({shard_index(session_id, 4) for session_id in session_ids(sharded)}) == 4
+
+
+def test_ids_are_unique_and_ranged_per_shard(sharded):
+    for n, shard in enumerate(sharded.shards):
+        ids = [row["id"] for row in shard.export_rows("conversations")]
+        assert all(n * SPAN < row_id < (n + 1) * SPAN for row_id in ids)
+    merged = [row["id"] for row in sharded.export_rows("conversations")]
+    assert merged == sorted(set(merged))
+
+
+def test_per_session_reads_match_an_unsharded_database(single, sharded):
+    def strip(rows):
+        return [{key: value for key, value in row.items() if key not in ("id", "timestamp")} for row in rows]
+
+    assert session_ids(single) == session_ids(sharded)
+    for session_id in session_ids(single):
+        assert strip(sharded.get_conversation(session_id)) == strip(single.get_conversation(session_id))
+        page = sharded.get_conversation(session_id, limit=2)
+        rest = list(sharded.iter_conversation(session_id, after_id=page[-1]["id"]))
+        assert page + rest == sharded.get_conversation(session_id)
+
+
+def test_reports_fan_out_and_merge(single, sharded):
+    assert sharded.get_analytics_summary() == single.get_analytics_summary()
+    window = ("2000-01-01", "2100-01-01")
+    assert sharded.intent_distribution(*window) == single.intent_distribution(*window)
+    assert sharded.confidence_histogram(*window, bins=5) == single.confidence_histogram(*window, bins=5)
+    assert sharded.fallback_rate(*window, bucket="month") == single.fallback_rate(*window, bucket="month")
+    assert len(list(sharded.export_rows("leads"))) == len(list(single.export_rows("leads")))
+    assert sharded.verify_rollups() == []
+
+
+def test_sharded_export_cursor_needs_a_session(sharded):
+    with pytest.raises(ValueError):
+        sharded.export_rows("leads", after_id=1)
+    rows = list(sharded.export_rows("conversations", session_id="visitor-3"))
+    assert list(sharded.export_rows("conversations", session_id="visitor-3", after_id=rows[0]["id"])) == rows[1:]
+
+
+def test_reshard_round_trip(single, tmp_path):
+    with single.connection() as conn:
+        conn.execute("UPDATE conversations SET timestamp = datetime(timestamp, '-400 days') "
+                     "WHERE session_id IN ('visitor-1', 'visitor-2')")
+        conn.commit()
+    single.rebuild_rollups()
+    archive = single.archive_old_rows(days=90)
+    assert archive["sessions"] == 2
+    archived = single.get_conversation("visitor-1")
+    summary = single.get_analytics_summary()
+    histories = {session_id: single.get_conversation(session_id)
+                 for session_id in session_ids(single) + ["visitor-1", "visitor-2"]}
+
+    base = str(tmp_path / "single" / "chatbot.db")
+    four = ShardedDatabase(base, shards=4)
+    copied = reshard(single, four)
+    assert copied["archive_sessions"] == 2 and copied["conversations"] == (
+        sum(map(len, histories.values())) - archive["conversation_rows"])
+
+    three = ShardedDatabase(base, shards=3)
+    reshard(four, three)
+    back = DatabaseManager(str(tmp_path / "single" / "roundtrip.db"))
+    reshard(three, back)
+
+    for db in (four, three, back):
+        assert db.get_analytics_summary() == summary
+        assert db.verify_rollups() == []
+        assert db.get_conversation("visitor-1") == archived
+        for session_id, rows in histories.items():
+            assert db.get_conversation(session_id) == rows
+
+    # New ids never collide with copied ones or across shards
+    for session_id in ("new-a", "new-b", "new-c", "new-d", "new-e"):
+        three.save_message(session_id, "user", "hello")
+    ids = [row["id"] for row in three.export_rows("conversations")]
+    assert len(ids) == len(set(ids))
+
+    with pytest.raises(ValueError):
+        reshard(single, four)
+
+
+def test_open_database_picks_the_mode(tmp_path):
+    assert isinstance(open_database(str(tmp_path / "a.db"), shards=1), DatabaseManager)
+    assert isinstance(open_database(str(tmp_path / "b.db"), shards=2), ShardedDatabase)
+    with pytest.raises(ValueError):
+        ShardedDatabase(str(tmp_path / "c.db"), shards=1)
+
+
+def test_chatbot_writes_through_shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_SHARDS", 3)
+    monkeypatch.setenv("CHATBOT_DB_PATH", str(tmp_path / "bot.db"))
+    bot = app.BrandsetuChatbot(reload_interval=0)
+    replies = bot.generate_responses([(f"chat-{n}", "Tell me about SEO") for n in range(12)])
+    assert len(replies) == 12
+    assert isinstance(bot.db, ShardedDatabase)
+    assert bot.db.get_analytics_summary()["total_messages"] == 12
+    assert all(bot.db.get_conversation(f"chat-{n}") for n in range(12))
+    assert len(bot.db.stats()["shards"]) == 3
+    bot.db.close()
+
+
+def test_reshard_command(single, flask_app):
+    runner = flask_app.test_cli_runner()
+    result = runner.invoke(reshard_db_command, ["--shards", "2", "--from-shards", "1", "--source", single.db_path])
+    assert result.exit_code == 0, result.output
+    assert "chatbot.shard0of2.db" in result.output
+    assert ShardedDatabase(single.db_path, shards=2).get_analytics_summary() == single.get_analytics_summary()
+
+    again = runner.invoke(reshard_db_command, ["--shards", "2", "--from-shards", "1", "--source", single.db_path])
+    assert again.exit_code == 1 and "already holds data" in again.output
+    same = runner.invoke(reshard_db_command, ["--shards", "1", "--from-shards", "1", "--source", single.db_path])
+    assert same.exit_code == 2
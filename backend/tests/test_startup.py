@@ -0,0 +1,207 @@
+"""Cold start: lazy database and corpus, index snapshots, warmup and readiness"""
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import app
+from app import BrandsetuChatbot, DatabaseManager, FAQCorpus, ShardedDatabase, build_index_command
+
+from conftest import BACKEND_DIR
+
+
+def test_import_reads_and_compiles_nothing(tmp_path):
+    probe = (
+        "import os, sys, app\n"
+        "flask_app = app.create_app()\n"
+        "bot, startup = flask_app.extensions['chatbot'], flask_app.extensions['startup']\n"
+        "print(bot._corpus is None, os.path.exists(bot.db.db_path), 'numpy' in sys.modules, startup.ready.is_set())\n"
+    )
+    env = dict(os.environ, CHATBOT_DB_PATH=str(tmp_path / "cold.db"), CHATBOT_MATCHER="additive",
+               CHATBOT_WARMUP="off", CHATBOT_INDEX_SNAPSHOT_DIR=str(tmp_path / "snapshots"))
+    result = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["True", "False", "False", "True"]
+
+
+def test_lazy_database_migrates_once_on_first_use(tmp_path):
+    path = tmp_path / "lazy.db"
+    db = DatabaseManager(str(path), lazy=True)
+    assert not path.exists()
+
+    threads = [threading.Thread(target=db.save_message, args=(f"s{n}", "user", "hi")) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.schema_version == DatabaseManager.MIGRATIONS[-1][0]
+    assert sum(len(db.get_conversation(f"s{n}")) for n in range(8)) == 8
+
+
+def test_lazy_shards_still_reserve_their_id_ranges(tmp_path):
+    db = ShardedDatabase(str(tmp_path / "sharded.db"), shards=2, lazy=True)
+    assert not any(os.path.exists(shard.db_path) for shard in db.shards)
+    for n in range(6):
+        db.save_message(f"visitor-{n}", "user", "hello")
+    for n, shard in enumerate(db.shards):
+        ids = [row["id"] for row in shard.export_rows("conversations")]
+        assert all(n * ShardedDatabase.SHARD_ID_SPAN < row_id < (n + 1) * ShardedDatabase.SHARD_ID_SPAN
+                   for row_id in ids)
+
+
+def snapshot_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".pickle")]
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.mkdir, (os.environ["EXPLOIT_MARKER"],))
+
+
+def test_snapshot_round_trip(tmp_path, chatbot):
+    faq_path = tmp_path / "faqs.json"
+    faq_path.write_text(json.dumps(chatbot.faqs))
+    snapshots = str(tmp_path / "snapshots")
+
+    for matcher in ("additive", "bm25"):
+        compiled = FAQCorpus.load(str(faq_path), matcher, snapshots)
+        loaded = FAQCorpus.load(str(faq_path), matcher, snapshots)
+        assert (compiled.source, loaded.source) == ("compiled", "snapshot")
+        assert loaded.version == compiled.version and loaded.stats()["source"] == "snapshot"
+        for message in ("seo reports", "Which platforms do you manage?", "instagram ads", "hello"):
+            assert loaded.find_best_match(message)[1:] == compiled.find_best_match(message)[1:]
+            assert loaded.rank(message) == compiled.rank(message)
+    assert len(snapshot_files(snapshots)) == 2
+
+    # An edited corpus compiles afresh and replaces its old snapshot
+    faq_path.write_text(json.dumps(dict(chatbot.faqs, extra={"keywords": ["extra"], "response": "Extra"})))
+    edited = FAQCorpus.load(str(faq_path), "additive", snapshots)
+    assert edited.source == "compiled" and "extra" in edited.faqs
+    assert len(snapshot_files(snapshots)) == 2
+
+
+def test_damaged_or_disabled_snapshots_fall_back_to_compiling(tmp_path, chatbot):
+    faq_path = tmp_path / "faqs.json"
+    faq_path.write_text(json.dumps(chatbot.faqs))
+    snapshots = str(tmp_path / "snapshots")
+    corpus = FAQCorpus.load(str(faq_path), "additive", snapshots)
+    snapshot = FAQCorpus.snapshot_path(str(faq_path), corpus.version, "additive", snapshots)
+    with open(snapshot, "wb") as damaged:
+        damaged.write(b"\x80\x05truncated")
+    assert FAQCorpus.load(str(faq_path), "additive", snapshots).source == "compiled"
+    assert FAQCorpus.load(str(faq_path), "additive", snapshots).source == "snapshot"
+
+    assert FAQCorpus.snapshot_path(str(faq_path), corpus.version, "additive", "off") is None
+    assert FAQCorpus.load(str(faq_path), "additive", "off").source == "compiled"
+
+
+def test_unsigned_or_foreign_snapshots_are_never_unpickled(tmp_path, chatbot, monkeypatch):
+    faq_path = tmp_path / "faqs.json"
+    faq_path.write_text(json.dumps(chatbot.faqs))
+    snapshots = str(tmp_path / "snapshots")
+    corpus = FAQCorpus.load(str(faq_path), "additive", snapshots)
+    snapshot = FAQCorpus.snapshot_path(str(faq_path), corpus.version, "additive", snapshots)
+    assert oct(os.stat(os.path.join(snapshots, "snapshot.key")).st_mode & 0o777) == "0o600"
+
+    marker = tmp_path / "exploited"
+    monkeypatch.setenv("EXPLOIT_MARKER", str(marker))
+    with open(snapshot, "wb") as forged:
+        forged.write(os.urandom(32) + pickle.dumps(Exploit()))
+    assert FAQCorpus.load(str(faq_path), "additive", snapshots).source == "compiled"
+    assert not marker.exists()
+
+    # A snapshot signed with another key is as good as unsigned
+    monkeypatch.setattr(app, "INDEX_SNAPSHOT_KEY", "another key")
+    assert FAQCorpus.load(str(faq_path), "additive", snapshots).source == "compiled"
+    assert FAQCorpus.load(str(faq_path), "additive", snapshots).source == "snapshot"
+
+
+def test_snapshots_default_to_the_service_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    snapshot = FAQCorpus.snapshot_path(str(tmp_path / "tenant" / "faqs.json"), "v1", "additive", "")
+    assert os.path.dirname(snapshot) == str(tmp_path / "cache" / "brandsetu-chatbot" / "index")
+
+
+def test_snapshots_of_corpora_sharing_a_directory_do_not_collide(tmp_path):
+    snapshots = str(tmp_path / "snapshots")
+    for brand in ("acme", "globex"):
+        (tmp_path / brand).mkdir()
+        (tmp_path / brand / "faqs.json").write_text(json.dumps({brand: {"keywords": [brand], "response": brand}}))
+        FAQCorpus.load(str(tmp_path / brand / "faqs.json"), "additive", snapshots)
+    for brand in ("acme", "globex"):
+        corpus = FAQCorpus.load(str(tmp_path / brand / "faqs.json"), "additive", snapshots)
+        assert corpus.source == "snapshot" and list(corpus.faqs) == [brand]
+
+
+def test_chatbot_loads_its_corpus_once_across_threads(monkeypatch):
+    loads = []
+    original = FAQCorpus.load
+    monkeypatch.setattr(FAQCorpus, "load", classmethod(lambda cls, *args: loads.append(1) or original(*args)))
+    bot = BrandsetuChatbot(reload_interval=0)
+    threads = [threading.Thread(target=lambda: bot.corpus) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    with pytest.raises(ValueError):
+        BrandsetuChatbot(reload_interval=0, matcher="cosine")
+
+
+def test_background_warmup_gates_health(monkeypatch):
+    release = threading.Event()
+    original = FAQCorpus.load
+
+    def slow_load(cls, *args):
+        release.wait(5)
+        return original(*args)
+
+    monkeypatch.setattr(FAQCorpus, "load", classmethod(slow_load))
+    flask_app = app.create_app({"CHATBOT_WARMUP": "background"})
+    bot, startup = flask_app.extensions["chatbot"], flask_app.extensions["startup"]
+    client = flask_app.test_client()
+
+    starting = client.get("/api/health")
+    assert starting.status_code == 503 and starting.get_json()["startup"]["ready"] is False
+    release.set()
+    startup.thread.join(5)
+
+    health = client.get("/api/health").get_json()
+    assert health["status"] == "healthy"
+    assert set(health["startup"]["timings_ms"]) == {"import", "corpus", "database", "queries", "ready"}
+    assert bot._corpus is not None and bot.cache.stats()["size"] == 0
+    with pytest.raises(ValueError):
+        app.create_app({"CHATBOT_WARMUP": "eventually"})
+
+
+def test_apps_are_independent_and_configurable(tmp_path):
+    faq_path = tmp_path / "faqs.json"
+    faq_path.write_text(json.dumps({"seo": {"keywords": ["seo"], "response": "Configured SEO"}}))
+    first = app.create_app({"CHATBOT_WARMUP": "sync"})
+    second = app.create_app({"CHATBOT_WARMUP": "sync", "CHATBOT_DB_PATH": str(tmp_path / "second.db"),
+                             "CHATBOT_FAQ_PATH": str(faq_path)})
+    bot, other = first.extensions["chatbot"], second.extensions["chatbot"]
+    assert bot is not other and first.extensions["startup"] is not second.extensions["startup"]
+    assert bot._corpus is not None and first.extensions["startup"].ready.is_set()
+
+    reply = second.test_client().post("/api/chat", json={"message": "Tell me about SEO", "session_id": "w"})
+    assert reply.get_json()["data"]["response"] == "Configured SEO"
+    assert other.db.db_path == str(tmp_path / "second.db") and other.db.get_conversation("w")
+    assert bot.db.get_conversation("w") == []
+
+
+def test_build_index_command(tmp_path):
+    flask_app = app.create_app({"CHATBOT_INDEX_SNAPSHOT_DIR": str(tmp_path)})
+    result = flask_app.test_cli_runner().invoke(build_index_command)
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("Compiled corpus ")
+    bot = flask_app.extensions["chatbot"]
+    assert FAQCorpus.load(bot.faq_path, bot.matcher_name, str(tmp_path)).source == "snapshot"
+
+    disabled = app.create_app({"CHATBOT_INDEX_SNAPSHOT_DIR": "off"})
+    assert disabled.test_cli_runner().invoke(build_index_command).exit_code == 2
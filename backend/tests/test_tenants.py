@@ -0,0 +1,223 @@
+"""Tenant routing, lazy loading and memory-bounded eviction"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app import FAQ_PATH, CorpusWatcher, TenantRegistry, approximate_size
+
+
+def write_tenant(directory, tenant_id, faqs):
+    tenant_dir = directory / tenant_id
+    tenant_dir.mkdir(exist_ok=True)
+    (tenant_dir / "faqs.json").write_text(json.dumps(faqs))
+
+
+def branded(brand):
+    """The default corpus with every response signed by ``brand``"""
+    with open(FAQ_PATH, encoding="utf-8") as corpus_file:
+        faqs = json.load(corpus_file)
+    return {key: dict(faq, response=f"[{brand}] {faq['response']}") for key, faq in faqs.items()}
+
+
+@pytest.fixture
+def tenants_dir(tmp_path):
+    for brand in ("acme", "globex", "initech"):
+        write_tenant(tmp_path, brand, branded(brand))
+    return tmp_path
+
+
+@pytest.fixture
+def app_config(tenants_dir):
+    return {"CHATBOT_TENANTS_DIR": str(tenants_dir), "CHATBOT_FAQ_RELOAD_INTERVAL": 0}
+
+
+@pytest.fixture
+def registry(flask_app):
+    return flask_app.extensions["tenants"]
+
+
+def test_approximate_size_counts_shared_objects_once(chatbot):
+    payload = ["x" * 1000 for _ in range(10)]
+    assert approximate_size([payload, payload]) < approximate_size([payload, list(map(str.upper, payload))])
+    assert chatbot.corpus.memory_bytes > approximate_size(chatbot.faqs)
+
+
+def test_requests_reach_their_tenant(registry, client):
+    by_prefix = client.post("/t/acme/api/chat", json={"message": "Tell me about SEO", "session_id": "t1"})
+    by_header = client.post("/api/chat", json={"message": "Tell me about SEO", "session_id": "t1"},
+                            headers={"X-Tenant-ID": "globex"})
+    default = client.post("/api/chat", json={"message": "Tell me about SEO", "session_id": "t1"})
+    assert by_prefix.get_json()["data"]["response"].startswith("[acme] ")
+    assert by_header.get_json()["data"]["response"].startswith("[globex] ")
+    assert not default.get_json()["data"]["response"].startswith("[")
+
+    history = client.get("/t/acme/api/conversation/t1").get_json()["data"]["history"]
+    assert [row["message_type"] for row in history] == ["user", "bot"]
+    assert history[1]["message"].startswith("[acme] ")
+    assert os.path.exists(registry.path("acme") + "/chatbot.db")
+    assert registry.get("initech").db.get_conversation("t1") == []
+
+    health = client.get("/t/globex/api/health").get_json()
+    assert health["tenants"]["loaded"] == 3 and health["corpus"]["memory_bytes"] > 0
+
+
+@pytest.mark.parametrize("path,headers", [
+    ("/t/umbrella/api/health", {}),
+    ("/api/health", {"X-Tenant-ID": "../acme"}),
+    ("/api/health", {"X-Tenant-ID": "ACME"}),
+])
+def test_unknown_tenants_get_404(registry, path, headers, client):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 404 and "Unknown tenant" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("app_config", [{}])
+def test_tenant_header_without_a_registry_is_rejected(flask_app, client):
+    assert flask_app.extensions["tenants"] is None
+    assert client.get("/t/acme/api/health").status_code == 404
+
+
+def test_idle_tenants_are_evicted_under_the_budget(registry):
+    acme = registry.get("acme")
+    acme.db.save_message("s", "user", "kept across eviction")
+    registry.release(acme)
+    registry.memory_budget = int(registry.footprint(acme) * 1.5)
+
+    registry.get("globex")
+    assert registry.stats()["tenants"] == ["globex"]
+    registry.get("initech")
+    registry.get("initech")
+    stats = registry.stats()
+    assert stats["tenants"] == ["initech"] and stats["evictions"] == 2
+    assert stats["loads"] == 3 and stats["hits"] == 1
+    assert stats["memory_bytes"] <= registry.memory_budget
+
+    reloaded = registry.get("acme")
+    assert reloaded is not acme
+    assert reloaded.db.get_conversation("s")[0]["message"] == "kept across eviction"
+
+
+def test_evicted_tenants_close_after_their_last_checkout(registry, monkeypatch):
+    closed = []
+    monkeypatch.setattr(TenantRegistry, "_release", staticmethod(closed.append))
+    acme = registry.get("acme")
+    registry.get("acme")
+    registry.memory_budget = 1
+
+    registry.get("globex")
+    assert registry.stats()["tenants"] == ["globex"] and closed == []
+    registry.release(acme)
+    assert closed == []
+    assert acme.generate_response("Tell me about SEO", "held")["intent"] == "seo"
+    registry.release(acme)
+    assert closed == [acme]
+
+
+def test_requests_hand_their_checkout_back(registry, client):
+    with client.post("/t/acme/api/chat", json={"message": "Tell me about SEO", "session_id": "lease"}):
+        pass
+    with client.get("/t/acme/api/nowhere"):
+        pass
+    assert not +registry._leases
+
+    # A streamed reply keeps reading the tenant's database after the view returns
+    streamed = client.get("/t/acme/api/conversation/lease?stream=1")
+    assert list((+registry._leases).values()) == [1]
+    assert len(json.loads(streamed.get_data())["data"]["history"]) == 2
+    streamed.close()
+    assert not +registry._leases
+
+
+def test_footprint_counts_database_and_response_caches(registry):
+    acme = registry.get("acme")
+    overhead = registry.pool_size * registry.cache_kb * 1024 + registry.cache_size * 1024
+    assert registry.footprint(acme) == acme.corpus.memory_bytes + overhead
+    assert registry.stats()["memory_bytes"] == registry.footprint(acme)
+    with acme.db.connection() as conn:
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -registry.cache_kb
+    assert acme.cache.max_size == registry.cache_size
+
+
+def test_loaded_tenants_are_capped(registry):
+    registry.max_loaded = 2
+    for tenant_id in ("acme", "globex", "initech"):
+        registry.release(registry.get(tenant_id))
+    stats = registry.stats()
+    assert stats["tenants"] == ["globex", "initech"] and stats["evictions"] == 1
+
+
+def test_the_requested_tenant_stays_even_over_budget(registry):
+    registry.memory_budget = 1
+    assert registry.get("acme") is registry.get("acme")
+    assert registry.stats()["tenants"] == ["acme"]
+
+
+def test_concurrent_first_requests_load_once(registry):
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(registry.get("globex"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(bot) for bot in loaded}) == 1
+    assert registry.stats()["loads"] == 1
+
+
+def test_corpus_edits_are_picked_up_on_use(tenants_dir, registry):
+    registry.reload_interval = 0.01
+    version = registry.get("acme").corpus.version
+    write_tenant(tenants_dir, "acme", branded("acme-2"))
+    time.sleep(0.02)
+    bot = registry.get("acme")
+    assert bot.corpus.version != version
+    assert bot.generate_response("Tell me about SEO", "s")["response"].startswith("[acme-2] ")
+    assert registry.stats()["reloads"] == 1
+
+
+def test_one_of_many_due_requests_checks_the_corpus(tenants_dir, registry, monkeypatch):
+    registry.reload_interval = 0.01
+    registry.get("acme")
+    write_tenant(tenants_dir, "acme", branded("acme-2"))
+    time.sleep(0.02)
+    checks, started = [], threading.Barrier(8)
+    original = CorpusWatcher.check
+
+    def slow_check(watcher):
+        checks.append(watcher)
+        time.sleep(0.05)
+        return original(watcher)
+
+    monkeypatch.setattr(CorpusWatcher, "check", slow_check)
+
+    def request():
+        started.wait()
+        registry.get("acme")
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(checks) == 1 and registry.stats()["reloads"] == 1
+
+
+def test_a_grown_corpus_is_evicted_back_under_the_budget(tenants_dir, registry):
+    registry.reload_interval = 0.01
+    acme = registry.get("acme")
+    registry.release(acme)
+    globex = registry.get("globex")
+    registry.memory_budget = registry.footprint(acme) + registry.footprint(globex) + 1024
+    assert registry.stats()["tenants"] == ["acme", "globex"]
+
+    version = globex.corpus.version
+    grown = {f"{key}_{n}": dict(faq, keywords=[f"{keyword} {n}" for keyword in faq["keywords"]])
+             for n in range(2) for key, faq in branded("globex-2").items()}
+    write_tenant(tenants_dir, "globex", grown)
+    time.sleep(0.02)
+    assert registry.get("globex") is globex and globex.corpus.version != version
+    stats = registry.stats()
+    assert stats["reloads"] == 1 and stats["tenants"] == ["globex"] and stats["evictions"] == 1
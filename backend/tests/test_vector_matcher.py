@@ -0,0 +1,50 @@
+"""TF-IDF / BM25 VectorMatcher"""
+
+import pytest
+
+from app import BrandsetuChatbot, VectorMatcher, sparse
+
+QUERIES = [
+    "local seo for my shop", "seo reports", "which platforms do you manage",
+    "who creates content", "google ads and facebook ads", "free consultation",
+    "are your plans flexible", "what is your phone number", "xyzzy", "",
+]
+
+BACKENDS = ["python"] + (["scipy"] if sparse is not None else [])
+
+
+@pytest.mark.parametrize("weighting", ["tfidf", "bm25"])
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_keyword_queries_find_their_faq(weighting, backend, chatbot):
+    matcher = VectorMatcher(chatbot.faqs, weighting, backend)
+    assert matcher.find_best_match("free consultation")[2] == "free_consultation"
+    assert matcher.find_best_match("What is your phone number?")[2] == "phone_contact"
+    faq, confidence, key = matcher.find_best_match("xyzzy")
+    assert (faq, confidence, key) == (None, 0.0, None)
+    for query in QUERIES:
+        confidence = matcher.find_best_match(query)[1]
+        assert 0.0 <= confidence <= 1.0
+
+
+@pytest.mark.skipif(sparse is None, reason="scipy not installed")
+@pytest.mark.parametrize("weighting", ["tfidf", "bm25"])
+def test_scipy_and_python_backends_agree(weighting, chatbot):
+    python = VectorMatcher(chatbot.faqs, weighting, "python")
+    scipy = VectorMatcher(chatbot.faqs, weighting, "scipy")
+    for expected, actual in zip(python.rank_batch(QUERIES, 5), scipy.rank_batch(QUERIES, 5)):
+        assert [key for key, _ in actual] == [key for key, _ in expected]
+        assert [score for _, score in actual] == pytest.approx([score for _, score in expected])
+
+
+def test_batch_matches_single_queries(chatbot):
+    matcher = VectorMatcher(chatbot.faqs, "bm25")
+    assert matcher.rank_batch(QUERIES, 3) == [matcher.rank(query, 3) for query in QUERIES]
+
+
+def test_matcher_selected_by_config():
+    bot = BrandsetuChatbot(reload_interval=0, matcher="bm25")
+    assert isinstance(bot.corpus.matcher, VectorMatcher)
+    assert bot.corpus.stats()["matcher"] == "bm25"
+    assert bot.find_best_match("seo reports")[2] == "seo_reports"
+    with pytest.raises(ValueError):
+        BrandsetuChatbot(reload_interval=0, matcher="nope")
@@ -0,0 +1,151 @@
+"""Write-behind batching in DatabaseManager"""
+
+import gc
+import queue
+import threading
+import weakref
+
+import pytest
+
+import app
+from app import DatabaseManager, WriteBehindWriter
+
+
+def count_rows(db, table):
+    with db.connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_writes_are_batched_and_visible_after_flush(tmp_path):
+    db = DatabaseManager(str(tmp_path / "wb.db"), write_mode="write_behind")
+    db.writer.flush_interval = 0.2
+    for n in range(50):
+        assert db.save_message("s1", "user", f"hello {n}") is None
+        db.save_analytics("s1", "message_processed", {"n": n})
+    assert len(db.get_conversation("s1")) == 50  # reads flush first
+    stats = db.writer.stats()
+    assert stats["committed"] == 100 and stats["pending"] == 0
+    assert stats["batches"] < 100
+
+
+def test_stop_flushes_pending_writes(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stop.db"), write_mode="write_behind")
+    db.writer.flush_interval = 10  # would sit in memory without the shutdown flush
+    for n in range(10):
+        db.save_message("s2", "user", f"m{n}")
+    db.writer.stop()
+    assert count_rows(db, "conversations") == 10
+
+
+def test_exit_hook_flushes_live_writers_and_holds_no_stopped_ones(tmp_path):
+    db = DatabaseManager(str(tmp_path / "exit.db"), write_mode="write_behind")
+    db.writer.flush_interval = 10
+    db.save_message("s7", "user", "pending at exit")
+    app._stop_writers()
+    assert count_rows(db, "conversations") == 1
+
+    # A stopped writer (an evicted tenant's, say) is not kept alive until exit
+    database = weakref.ref(db)
+    del db
+    gc.collect()
+    assert database() is None
+
+
+@pytest.mark.parametrize("policy,expected_rows", [("drop", 2), ("inline", 3)])
+def test_backpressure_when_queue_is_full(tmp_path, policy, expected_rows):
+    db = DatabaseManager(str(tmp_path / f"{policy}.db"))
+    writer = WriteBehindWriter(db, batch_size=10, flush_ms=10, queue_size=1, backpressure=policy)
+    release = threading.Event()
+    original_commit = writer._commit
+
+    def slow_commit(batch):
+        release.wait()
+        original_commit(batch)
+
+    writer._commit = slow_commit
+    writer.submit(db.INSERT_MESSAGE, ("s3", "user", "first", None, None))
+    while writer._queue.qsize():  # writer thread picked up the first write
+        pass
+    writer.submit(db.INSERT_MESSAGE, ("s3", "user", "second", None, None))  # fills the queue
+    # The writer thread is parked inside slow_commit; let the inline write through
+    writer._commit = original_commit
+    writer.submit(db.INSERT_MESSAGE, ("s3", "user", "third", None, None))
+    release.set()
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["dropped" if policy == "drop" else "inline"] == 1
+    assert count_rows(db, "conversations") == expected_rows
+
+
+def test_unknown_modes_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        DatabaseManager(str(tmp_path / "x.db"), write_mode="eventually")
+    with pytest.raises(ValueError):
+        WriteBehindWriter(None, backpressure="panic")  # type: ignore
+
+
+class UnbindableParams:
+    """Parameters whose binding raises a non-SQLite error"""
+
+    def __len__(self):
+        return 5
+
+    def __getitem__(self, index):
+        raise TypeError("bad payload")
+
+
+def test_a_bad_write_is_dropped_alone_and_the_writer_survives(tmp_path):
+    db = DatabaseManager(str(tmp_path / "bad.db"), write_mode="write_behind")
+    db.writer.flush_interval = 0.2
+    db.save_message("s4", "user", "before")
+    db.writer.submit(db.INSERT_MESSAGE, UnbindableParams())
+    db.save_message("s4", "user", "after")
+    assert [row["message"] for row in db.get_conversation("s4")] == ["before", "after"]
+
+    db.save_message("s4", "user", "later")
+    assert len(db.get_conversation("s4")) == 3
+    stats = db.writer.stats()
+    assert stats["failed"] == 1 and stats["committed"] == 3
+
+
+def test_submit_fails_fast_once_the_writer_is_gone(tmp_path):
+    db = DatabaseManager(str(tmp_path / "dead.db"))
+    writer = WriteBehindWriter(db, backpressure="block", queue_size=1)
+    writer.submit(db.INSERT_MESSAGE, ("s5", "user", "hello", None, None))
+    writer._queue.put(writer._STOP)  # the thread exits without clearing its pid
+    writer._thread.join()
+    with pytest.raises(RuntimeError):
+        writer.submit(db.INSERT_MESSAGE, ("s5", "user", "lost", None, None))
+    assert count_rows(db, "conversations") == 1
+
+
+def test_a_new_response_and_its_turn_are_dropped_or_failed_together(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / "group.db"))
+    writer = db.writer = WriteBehindWriter(db, flush_ms=10, backpressure="drop")
+    writer.submit(db.INSERT_MESSAGE, ("s6", "user", "started", None, None))
+    writer.flush()
+
+    put_nowait = writer._queue.put_nowait
+
+    def full_for_responses(item):
+        if any(sql == db.INSERT_RESPONSE for sql, _ in item):
+            raise queue.Full
+        put_nowait(item)
+
+    monkeypatch.setattr(writer._queue, "put_nowait", full_for_responses)
+    db.save_message("s6", "bot", "A dropped answer", "A dropped answer", "seo")
+    monkeypatch.setattr(writer._queue, "put_nowait", put_nowait)
+    assert writer.stats()["dropped"] == 2
+
+    # In a batch that fails, a group whose response insert fails alone is lost whole
+    writer.flush_interval = 0.2
+    lost = db.message_writes("s6", "bot", "A failed answer", "A failed answer", "seo")
+    lost[0] = ("INSERT INTO no_such_table VALUES (?)", ("s6",))
+    db.write_many(lost)
+    db.save_message("s6", "bot", "A kept answer", "A kept answer", "seo")
+    writer.flush()
+    assert [(row["message"], row["response"]) for row in db.get_conversation("s6")] == [
+        ("started", None), ("A kept answer", "A kept answer")]
+    assert writer.stats()["failed"] == 2
+    writer.stop()